@@ -20,9 +20,16 @@ const Message = ({ message, isStreaming }) => {
   }
 
   let imageUrl = null
+  let thumbnailUrl = null
 
   if (imageData) {
-    imageUrl = `data:${mimeType};base64,${imageData}`
+    if (/^https?:\/\//.test(imageData)) {
+      imageUrl = imageData
+      thumbnailUrl = `${imageData}?width=512&format=webp`
+    } else {
+      imageUrl = `data:${mimeType};base64,${imageData}`
+      thumbnailUrl = imageUrl
+    }
   }
 
   return (
@@ -78,7 +85,7 @@ const Message = ({ message, isStreaming }) => {
                 onKeyPress={(e) => e.key === 'Enter' && setIsLightboxOpen(true)}
               >
                 <img 
-                  src={imageUrl} 
+                  src={thumbnailUrl} 
                   alt="Attached image" 
                   className="thumbnail-image"
                 />
@@ -106,8 +106,8 @@ const useStreamingAPI = () => {
             try {
               const data = JSON.parse(lineBuffer)
               if (data.role && data.role === 'assistant' && data.content) {
-                if (data.mimeType === 'image/png') {
-                  onStreamUpdate('', data.content, data.mimeType)
+                if (data.mimeType?.startsWith('image/')) {
+                  onStreamUpdate('', API_BASE_URL + data.content, data.mimeType)
                 } else if (data.content !== 'START' && data.content !== 'END') {
                   buffer += data.content
                 }
@@ -137,9 +137,9 @@ const useStreamingAPI = () => {
                 && data.content 
                 && (data.content !== 'START' && data.content !== 'END')) {
 
-              //TODO: Remove hardcoding png
-              if (data.mimeType == 'image/png') {
-                onStreamUpdate('', data.content, data.mimeType)
+              // Images arrive as a path to the content addressed /images endpoint
+              if (data.mimeType?.startsWith('image/')) {
+                onStreamUpdate('', API_BASE_URL + data.content, data.mimeType)
                 continue
               }
 
@@ -0,0 +1,204 @@
+import heapq
+import json
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.cache import CacheStats
+
+# Stored agent state together with the time it was last written
+SessionEntry = Tuple[Dict[str, Any], datetime]
+
+
+class SessionStore(ABC):
+    """Backend holding agent state per session for StateManager"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        pass
+
+    @abstractmethod
+    def put(self, session_id: str, state: Dict[str, Any], timestamp: datetime):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        pass
+
+    @abstractmethod
+    def expire(self, ttl: timedelta) -> int:
+        """Remove sessions not written within `ttl`, returns how many were removed"""
+        pass
+
+    @abstractmethod
+    def edited_images(self) -> Set[str]:
+        """Digests of the edited images stored sessions point at"""
+        pass
+
+    # Async variants for callers on the event loop. Stores doing I/O override these to
+    # keep it off the loop, in-memory stores are fast enough to answer inline.
+    async def aget(self, session_id: str) -> Optional[SessionEntry]:
+        return self.get(session_id)
+
+    async def aput(self, session_id: str, state: Dict[str, Any], timestamp: datetime):
+        self.put(session_id, state, timestamp)
+
+    async def adelete(self, session_id: str):
+        self.delete(session_id)
+
+    async def aexpire(self, ttl: timedelta) -> int:
+        return self.expire(ttl)
+
+    async def aedited_images(self) -> Set[str]:
+        return self.edited_images()
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: Dict[str, Any]
+    timestamp: datetime
+    written_at: float
+    size: int
+
+
+class _Stripe:
+    __slots__ = ('entries', 'heap', 'lock', 'bytes', 'stats')
+
+    def __init__(self):
+        # Insertion order doubles as LRU order, most recently used last
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        # (monotonic write time, session id), stale pairs are skipped when popped
+        self.heap: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.stats = CacheStats()
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process local store. Sessions are spread over `stripes` independently locked shards so
+    concurrent requests for different sessions rarely contend on the same lock.
+
+    Every shard keeps an expiry heap ordered by monotonic write time, so expiring sessions
+    only touches the ones that are due. Optional `max_sessions` / `max_bytes` budgets are
+    split evenly across shards and enforced on write by evicting least recently used sessions.
+    """
+
+    def __init__(self, stripes: int = 64, max_sessions: int = 0, max_bytes: int = 0):
+        if stripes <= 0:
+            raise ValueError('stripes must be positive')
+
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._stripe_max_sessions = -(-max_sessions // stripes) if max_sessions else 0
+        self._stripe_max_bytes = -(-max_bytes // stripes) if max_bytes else 0
+
+    def _stripe(self, session_id: str) -> _Stripe:
+        return self._stripes[hash(session_id) % len(self._stripes)]
+
+    def _size_of(self, state: Dict[str, Any]) -> int:
+        # Serialized size is a stable, cheap enough proxy for the memory a session pins
+        return len(json.dumps(state, default=str))
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            entry = stripe.entries.get(session_id)
+            if entry is None:
+                stripe.stats.misses += 1
+                return None
+
+            stripe.entries.move_to_end(session_id)
+            stripe.stats.hits += 1
+            return entry.state, entry.timestamp
+
+    def put(self, session_id: str, state: Dict[str, Any], timestamp: datetime):
+        written_at = time.monotonic()
+        size = self._size_of(state) if self.max_bytes else 0
+
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            previous = stripe.entries.pop(session_id, None)
+            if previous is not None:
+                stripe.bytes -= previous.size
+
+            stripe.entries[session_id] = _Entry(state, timestamp, written_at, size)
+            stripe.bytes += size
+            heapq.heappush(stripe.heap, (written_at, session_id))
+
+            self._enforce_budget(stripe)
+
+            if len(stripe.heap) > 2 * len(stripe.entries) + 64:
+                stripe.heap = [(e.written_at, sid) for sid, e in stripe.entries.items()]
+                heapq.heapify(stripe.heap)
+
+    def _enforce_budget(self, stripe: _Stripe):
+        while len(stripe.entries) > 1 and (
+            (self._stripe_max_sessions and len(stripe.entries) > self._stripe_max_sessions)
+            or (self._stripe_max_bytes and stripe.bytes > self._stripe_max_bytes)
+        ):
+            _, evicted = stripe.entries.popitem(last=False)
+            stripe.bytes -= evicted.size
+            stripe.stats.evictions += 1
+
+    def delete(self, session_id: str):
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            entry = stripe.entries.pop(session_id, None)
+            if entry is not None:
+                stripe.bytes -= entry.size
+
+    def expire(self, ttl: timedelta) -> int:
+        cutoff = time.monotonic() - ttl.total_seconds()
+        removed = 0
+
+        for stripe in self._stripes:
+            with stripe.lock:
+                while stripe.heap and stripe.heap[0][0] <= cutoff:
+                    written_at, session_id = heapq.heappop(stripe.heap)
+
+                    entry = stripe.entries.get(session_id)
+                    if entry is not None and entry.written_at == written_at:
+                        del stripe.entries[session_id]
+                        stripe.bytes -= entry.size
+                        stripe.stats.expirations += 1
+                        removed += 1
+
+        return removed
+
+    def edited_images(self) -> Set[str]:
+        digests = set()
+        for stripe in self._stripes:
+            with stripe.lock:
+                digests.update(e.state.get('edited_img') for e in stripe.entries.values())
+
+        digests.discard(None)
+        return digests
+
+    def stats(self) -> Dict[str, Any]:
+        totals = CacheStats()
+        sessions = 0
+        size = 0
+
+        for stripe in self._stripes:
+            with stripe.lock:
+                totals.hits += stripe.stats.hits
+                totals.misses += stripe.stats.misses
+                totals.evictions += stripe.stats.evictions
+                totals.expirations += stripe.stats.expirations
+                sessions += len(stripe.entries)
+                size += stripe.bytes
+
+        return {**totals.as_dict(), 'sessions': sessions, 'bytes': size}
+
+    def __len__(self) -> int:
+        return sum(len(stripe.entries) for stripe in self._stripes)
@@ -1,9 +1,11 @@
+import asyncio
+
 from datetime import datetime, timedelta
-import threading
 
-from typing import Dict, Optional, Tuple, List, TypedDict
+from typing import NotRequired, Optional, List, TypedDict
 from uuid import uuid4
 
+from app.agents.session_store import InMemorySessionStore, SessionStore
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
@@ -11,6 +13,9 @@ logger = get_logger(__name__)
 class SearchResult(TypedDict):
     content: str
     img_urls: List[str]
+    screen_id: NotRequired[int]
+    summary: NotRequired[Optional[str]]
+    sections: NotRequired[List[str]]
 
 class Message(TypedDict):
     role: str
@@ -31,56 +36,96 @@ class AgentState(TypedDict):
     agent_query: Optional[str]
     redo_edit: bool
 
+def new_state() -> AgentState:
+    return {
+        'search_results': [], 
+        'messages': [], 
+        'task': '', 
+        'user_input': '',
+        'summary': None, 
+        'view_summary': None,
+        'original_img': None,
+        'edited_img': None,
+        'image_mime': None,
+        'redo_edit': False, 
+        'need_user_clarification': False,
+        'error': None,
+        'agent_query': None
+    }
+
 class StateManager:
-    def __init__(self, ttl: int = 30):
-        self._states: Dict[str, Tuple[AgentState, datetime]] = {}
-        self._lock = threading.Lock()
+    def __init__(self, ttl: int = 30, store: Optional[SessionStore] = None):
+        self.store = store if store is not None else InMemorySessionStore()
         self.ttl = timedelta(minutes=ttl)
 
     def create_session(self) -> str:
         session_id = str(uuid4())
 
-        with self._lock:
-            self._states[session_id] = (
-                {
-                    'search_results': [], 
-                    'messages': [], 
-                    'task': '', 
-                    'user_input': '',
-                    'summary': None, 
-                    'view_summary': None,
-                    'original_img': None,
-                    'edited_img': None,
-                    'image_mime': None,
-                    'redo_edit': False, 
-                    'need_user_clarification': False,
-                    'error': None,
-                    'agent_query': None
-                }, datetime.now())
+        self.store.put(session_id, new_state(), datetime.now())
+
+        return session_id
+
+    async def acreate_session(self) -> str:
+        session_id = str(uuid4())
+
+        await self.store.aput(session_id, new_state(), datetime.now())
 
         return session_id
 
+    def _is_live(self, timestamp: datetime) -> bool:
+        return datetime.now() - timestamp < self.ttl
+
     def get_state(self, session_id: str) -> Optional[AgentState]:
-        with self._lock:
-            if session_id in self._states:
-                state, timestamp = self._states.get(session_id)
-                if datetime.now() - timestamp < self.ttl:
-                    return state
-                else:
-                    del self._states[session_id]
+        entry = self.store.get(session_id)
+        if entry is None:
+            return None
 
+        state, timestamp = entry
+        if self._is_live(timestamp):
+            return state
+
+        self.store.delete(session_id)
         return None
 
+    async def aget_state(self, session_id: str) -> Optional[AgentState]:
+        entry = await self.store.aget(session_id)
+        if entry is None:
+            return None
 
-    def update_state(self, session_id: str, n_state: AgentState):
-        logger.info(f'Updating session_id {session_id} with {n_state.get('messages') is not None}')
-        with self._lock:
-            self._states[session_id] = (n_state, datetime.now())
+        state, timestamp = entry
+        if self._is_live(timestamp):
+            return state
+
+        await self.store.adelete(session_id)
+        return None
 
 
-    def clear_expired(self):
-        with self._lock:
-            expired = [sid for sid, (_, ttl) in self._states.items() if datetime.now() - ttl >= self.ttl]
+    def update_state(self, session_id: str, n_state: AgentState):
+        logger.info(f'Updating session_id {session_id} with {n_state.get('messages') is not None}')
+        self.store.put(session_id, n_state, datetime.now())
 
-            for sid in expired:
-                del self._states[sid]
\ No newline at end of file
+    async def aupdate_state(self, session_id: str, n_state: AgentState):
+        logger.info(f'Updating session_id {session_id} with {n_state.get('messages') is not None}')
+        await self.store.aput(session_id, n_state, datetime.now())
+
+
+    def clear_expired(self) -> int:
+        removed = self.store.expire(self.ttl)
+        logger.debug(f'Cleared {removed} expired sessions')
+        return removed
+
+    async def aclear_expired(self) -> int:
+        removed = await self.store.aexpire(self.ttl)
+        logger.debug(f'Cleared {removed} expired sessions')
+        return removed
+
+    async def run_reaper(self, interval: float):
+        """Expire sessions every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.store.aexpire(self.ttl)
+                if removed:
+                    logger.debug(f'Reaped {removed} expired sessions')
+            except Exception as e:
+                logger.error(f'Error expiring sessions: {e}')
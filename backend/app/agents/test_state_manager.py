@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from app.agents import session_store
+from app.agents.session_store import InMemorySessionStore
+from app.agents.state_manager import StateManager
+
+
+def test_sessions_round_trip_through_store():
+    store = InMemorySessionStore(stripes=4)
+    manager = StateManager(store=store)
+
+    session_id = manager.create_session()
+    state = manager.get_state(session_id)
+    state['task'] = 'Add a dashboard'
+    state['edited_img'] = 'ab' * 32
+    manager.update_state(session_id, state)
+    manager.create_session()
+
+    assert manager.get_state(session_id)['task'] == 'Add a dashboard'
+    assert manager.get_state('unknown') is None
+    assert len(store) == 2
+    assert store.edited_images() == {'ab' * 32}
+
+
+def test_expired_sessions_are_dropped(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(session_store.time, 'monotonic', lambda: clock[0])
+
+    store = InMemorySessionStore(stripes=4)
+    manager = StateManager(ttl=30, store=store)
+
+    stale = manager.create_session()
+    clock[0] += 20 * 60
+    fresh = manager.create_session()
+    clock[0] += 11 * 60
+
+    assert manager.clear_expired() == 1
+    assert store.get(stale) is None
+    assert manager.get_state(fresh) is not None
+    assert store.stats()['expirations'] == 1
+
+
+def test_rewritten_session_is_not_expired_by_stale_heap_entry(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(session_store.time, 'monotonic', lambda: clock[0])
+
+    store = InMemorySessionStore(stripes=1)
+    store.put('a', {'task': 'old'}, None)
+    clock[0] += 60
+    store.put('a', {'task': 'new'}, None)
+    clock[0] += 30
+
+    assert store.expire(timedelta(seconds=45)) == 0
+    assert store.get('a')[0]['task'] == 'new'
+
+
+def test_least_recently_used_sessions_are_evicted_over_budget():
+    store = InMemorySessionStore(stripes=1, max_sessions=2)
+    store.put('a', {}, None)
+    store.put('b', {}, None)
+    store.get('a')
+    store.put('c', {}, None)
+
+    assert store.get('b') is None
+    assert store.get('a') is not None and store.get('c') is not None
+    assert store.stats()['evictions'] == 1
+
+
+def test_byte_budget_evicts_sessions():
+    store = InMemorySessionStore(stripes=1, max_bytes=100)
+    for i in range(10):
+        store.put(str(i), {'messages': ['x' * 30]}, None)
+
+    stats = store.stats()
+    assert stats['bytes'] <= 100
+    assert stats['evictions'] == 10 - len(store)
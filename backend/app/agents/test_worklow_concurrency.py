@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.agents.state_manager import StateManager
+from app.agents.tools.conversation_memory import ConversationMemory
+from app.agents.worklow import AgentWorklow
+
+LATENCY = 0.2
+
+
+class SlowLLM:
+    """Stand-in for ChatOpenAI, sync calls block the thread like the real client does"""
+
+    def invoke(self, messages):
+        time.sleep(LATENCY)
+        return AIMessage(content='Add a dashboard to OrderSys')
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LATENCY)
+        return AIMessage(content='Add a dashboard to OrderSys')
+
+    async def astream(self, messages):
+        for token in ('Spec', ' for', ' dashboard'):
+            await asyncio.sleep(LATENCY / 3)
+            yield AIMessageChunk(content=token)
+
+
+class SlowKnowledgeBase:
+    def search_screens(self, query):
+        time.sleep(LATENCY)
+        return []
+
+    async def asearch_screens(self, query):
+        await asyncio.sleep(LATENCY)
+        return []
+
+
+async def _run_turn(workflow: AgentWorklow, message: str) -> str:
+    session_id = await workflow.astart_session()
+    tokens = [json.loads(t)['content'] async for t in workflow.stream_process_message(session_id, message)]
+    return ''.join(tokens)
+
+
+def test_parallel_streams_do_not_block_each_other():
+    workflow = AgentWorklow(SlowKnowledgeBase(), StateManager())
+    workflow.general_llm = SlowLLM()
+
+    async def scenario(n: int) -> float:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[_run_turn(workflow, 'add a dashboard') for _ in range(n)])
+        elapsed = time.perf_counter() - start
+
+        assert all(r == 'Spec for dashboard' for r in responses)
+        return elapsed
+
+    single = asyncio.run(scenario(1))
+    parallel = asyncio.run(scenario(10))
+
+    assert parallel < single * 2
+
+
+def test_concurrent_summaries_of_one_screen_share_the_llm_call():
+    calls = []
+    saved = []
+
+    class CountingLLM(SlowLLM):
+        async def ainvoke(self, messages):
+            calls.append(messages)
+            return await super().ainvoke(messages)
+
+    class SummaryKnowledgeBase(SlowKnowledgeBase):
+        async def asave_summary(self, screen_id, details, summary):
+            saved.append(screen_id)
+
+    workflow = AgentWorklow(SummaryKnowledgeBase(), StateManager())
+    workflow.general_llm = CountingLLM()
+
+    def state():
+        return {'search_results': [{'screen_id': 7, 'content': 'Dashboard widgets', 'img_urls': [], 'summary': None, 'sections': []}]}
+
+    async def burst():
+        return await asyncio.gather(*[workflow._summarise_view(state()) for _ in range(5)])
+
+    states = asyncio.run(burst())
+
+    assert len(calls) == 1 and saved == [7]
+    assert all(s['view_summary'] == 'Add a dashboard to OrderSys' for s in states)
+
+
+def test_history_is_compacted_after_the_stream_ends():
+    workflow = AgentWorklow(SlowKnowledgeBase(), StateManager())
+    workflow.general_llm = SlowLLM()
+    workflow.memory = ConversationMemory(budget=12, count_tokens=lambda text: len(text.split()))
+
+    async def scenario():
+        session_id = await workflow.astart_session()
+        for message in ('add a dashboard', 'make it blue'):
+            [t async for t in workflow.stream_process_message(session_id, message)]
+
+        # The turn is saved and the stream done while the summary is still being written
+        saved = await workflow.sm.aget_state(session_id)
+        assert saved['summary'] is None and len(saved['messages']) == 4
+        assert workflow._compactions
+
+        await asyncio.gather(*workflow._compactions)
+        return await workflow.sm.aget_state(session_id)
+
+    state = asyncio.run(scenario())
+
+    assert state['summary'] == 'Add a dashboard to OrderSys'
+    assert [m['content'] for m in state['messages']] == ['Spec\n for\n dashboard']
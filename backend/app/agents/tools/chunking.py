@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import mistune
+
+from mistune.core import BlockState
+from mistune.renderers.markdown import MarkdownRenderer
+
+_parse = mistune.create_markdown(renderer=None)
+
+# Tokens that only separate blocks, a section made of these alone is empty
+_SEPARATORS = {'blank_line', 'thematic_break'}
+
+
+@dataclass
+class DocumentSection:
+    ordinal: int
+    # Headings from the document root down to this section, e.g. ['Home Dashboard', 'Key Features', 'Total Payables']
+    path: List[str]
+    content: str
+
+    @property
+    def title(self) -> str:
+        return ' > '.join(self.path)
+
+
+def _plain_text(tokens: List[Dict[str, Any]]) -> str:
+    parts = []
+    for token in tokens:
+        if 'raw' in token:
+            parts.append(token['raw'])
+        if token.get('children'):
+            parts.append(_plain_text(token['children']))
+    return ''.join(parts).strip()
+
+
+def split_sections(markdown: str, max_level: int = 4) -> List[DocumentSection]:
+    """
+    Split a markdown document at its headings. Headings deeper than `max_level` stay inside
+    their parent section. Sections holding nothing but their heading (e.g. a "Key Features"
+    heading directly followed by sub headings) are dropped, their title lives on in the path
+    of the sections below them. A document without headings is a single section.
+    """
+    renderer = MarkdownRenderer()
+    sections: List[DocumentSection] = []
+    stack: List[Tuple[int, str]] = []
+    current: List[Dict[str, Any]] = []
+
+    def close():
+        if any(t['type'] not in _SEPARATORS and t['type'] != 'heading' for t in current):
+            body = [t for t in current if t['type'] != 'thematic_break']
+            sections.append(DocumentSection(
+                ordinal=len(sections),
+                path=[title for _, title in stack],
+                content=renderer(body, BlockState()).strip()
+            ))
+        current.clear()
+
+    for token in _parse(markdown):
+        level = token.get('attrs', {}).get('level') if token['type'] == 'heading' else None
+
+        if level is not None and level <= max_level:
+            close()
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, _plain_text(token.get('children', []))))
+
+        current.append(token)
+
+    close()
+    return sections
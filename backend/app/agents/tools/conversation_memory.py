@@ -0,0 +1,110 @@
+import math
+
+from typing import Callable, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+
+from app.agents.state_manager import AgentState, Message
+from app.agents.tools.summaries import history_summary_messages
+from app.core.config import config
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+TokenCounter = Callable[[str], int]
+
+
+def tiktoken_counter(model: str) -> TokenCounter:
+    """Token counter for an OpenAI model, estimates ~4 characters per token when the encoding can't be loaded"""
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        logger.warning(f'Falling back to estimated token counts for {model}: {e}')
+        return lambda text: math.ceil(len(text) / 4)
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def format_message(message: Message) -> str:
+    return f'{message["role"]} : {message["content"]}'
+
+
+class ConversationMemory:
+    """
+    Token budgeted conversation history for prompts.
+
+    The newest messages are kept verbatim in `state['messages']`. Once they outgrow `budget`
+    tokens the oldest ones are folded into the rolling `state['summary']` and dropped, so each
+    compaction only summarises what newly fell out of the window and the prompt stays bounded.
+    """
+
+    def __init__(self, budget: Optional[int] = None, count_tokens: Optional[TokenCounter] = None, model: str = 'gpt-4o-mini'):
+        self.budget = budget or config.HISTORY_TOKEN_BUDGET
+        self.model = model
+        # Loading the encoding may fetch the BPE ranks, it happens here rather than on the event loop of a request
+        self._count_tokens = count_tokens or tiktoken_counter(model)
+
+    def count_tokens(self, text: str) -> int:
+        return self._count_tokens(text)
+
+    def _window_start(self, messages: List[Message], budget: int) -> int:
+        """Index of the oldest message such that it and everything after fits in `budget` tokens"""
+        used = 0
+        for i in range(len(messages) - 1, -1, -1):
+            used += self.count_tokens(format_message(messages[i]))
+            if used > budget:
+                return i + 1
+        return 0
+
+    def render(self, state: AgentState) -> str:
+        """History for the prompt: the rolling summary followed by the newest messages that fit the budget"""
+        summary = state.get('summary')
+        messages = state.get('messages') or []
+
+        budget = self.budget
+        parts = []
+        if summary:
+            budget -= self.count_tokens(summary)
+            parts.append(f'summary of earlier conversation : {summary}')
+
+        start = self._window_start(messages, max(budget, 0))
+        parts.extend(format_message(m) for m in messages[start:])
+
+        return '\n'.join(parts)
+
+    def needs_compaction(self, state: AgentState) -> bool:
+        summary = state.get('summary')
+        used = self.count_tokens(summary) if summary else 0
+        for message in reversed(state.get('messages') or []):
+            used += self.count_tokens(format_message(message))
+            if used > self.budget:
+                return True
+        return False
+
+    async def acompact(self, state: AgentState, llm: BaseChatModel) -> bool:
+        """
+        Fold the oldest messages into the summary until the newest ones fit in half the budget,
+        leaving headroom so the next few turns don't trigger another summarisation.
+        Returns whether the state was changed.
+        """
+        if not self.needs_compaction(state):
+            return False
+
+        messages = state['messages']
+        keep_from = self._window_start(messages, self.budget // 2)
+        if keep_from == 0:
+            return False
+
+        folded = [format_message(m) for m in messages[:keep_from]]
+        response = await llm.ainvoke(history_summary_messages(state.get('summary'), folded))
+
+        state['summary'] = response.content
+        del messages[:keep_from]
+
+        logger.debug(f'Folded {keep_from} messages into the conversation summary')
+        return True
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from app.core.cache import CacheStats
+from app.core.config import ROOT, config
+from app.core.logging import get_logger
+from services.image_store import ImageStore, StoredImage
+
+logger = get_logger(__name__)
+
+
+class EditCache:
+    """
+    Content addressed cache of Gemini image edits keyed by (original image hash, view summary, task).
+
+    Entries are small files on disk pointing at the edited image in the ImageStore. Access order is
+    kept in memory and mirrored to the entry file mtime so the LRU order survives restarts; entries
+    are garbage collected once the cache exceeds its byte or entry budget. Evicting an entry leaves
+    its blob in place, a session or a client may still use it, the ImageStore collector removes
+    blobs nothing references any more.
+    """
+
+    def __init__(self, image_store: ImageStore, root: Optional[str] = None, max_bytes: Optional[int] = None, max_entries: Optional[int] = None):
+        self.images = image_store
+        self.root = Path(root or config.EDIT_CACHE_PATH or ROOT / 'data' / 'edit-cache')
+        self.max_bytes = max_bytes or config.EDIT_CACHE_MAX_BYTES
+        self.max_entries = max_entries or config.EDIT_CACHE_MAX_ENTRIES
+        self.stats = CacheStats()
+
+        self._entries: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+        self._bytes = 0
+        # Entries per blob digest
+        self._refs: Dict[str, int] = {}
+        self._source_digests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        entries = []
+        for path in self.root.iterdir():
+            if path.name.startswith('.'):
+                continue
+            try:
+                entry = json.loads(path.read_text())
+                entries.append((path.stat().st_mtime, path.name, entry['digest'], entry['size']))
+            except (OSError, ValueError, KeyError):
+                logger.warning(f'Dropping unreadable edit cache entry {path.name}')
+                path.unlink(missing_ok=True)
+
+        for _, key, digest, size in sorted(entries):
+            self._add(key, digest, size)
+
+    def _source_digest(self, path: str) -> str:
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+        digest = self._source_digests.get(memo_key)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.file_digest(f, 'sha256').hexdigest()
+            self._source_digests[memo_key] = digest
+
+        return digest
+
+    def key_for(self, original_img: str, view_summary: Optional[str], task: Optional[str], model: str = '') -> str:
+        payload = json.dumps([model, self._source_digest(original_img), view_summary or '', task or ''])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[StoredImage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            stored = self.images.get(entry[0])
+            if stored is None:
+                # Blob removed behind our back, forget the entry
+                self._remove(key)
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+
+        try:
+            os.utime(self.root / key)
+        except OSError:
+            pass
+
+        return stored
+
+    def put(self, key: str, stored: StoredImage):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'digest': stored.digest, 'size': stored.size}, f)
+            os.replace(tmp, self.root / key)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        with self._lock:
+            if key in self._entries:
+                # The entry file was just replaced, keep it
+                self._remove(key, unlink=False)
+            self._add(key, stored.digest, stored.size)
+
+            self._collect_garbage()
+
+    def _collect_garbage(self):
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.stats.evictions += 1
+
+    def _add(self, key: str, digest: str, size: int):
+        self._entries[key] = (digest, size)
+        self._bytes += size
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+
+    def _remove(self, key: str, unlink: bool = True):
+        digest, size = self._entries.pop(key)
+        self._bytes -= size
+        if unlink:
+            (self.root / key).unlink(missing_ok=True)
+
+        refs = self._refs[digest] - 1
+        if refs:
+            self._refs[digest] = refs
+        else:
+            del self._refs[digest]
+
+    def digests(self) -> Set[str]:
+        """Blobs referenced by cache entries"""
+        with self._lock:
+            return set(self._refs)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import CacheStats, LRUCache
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """Collapse case, whitespace and trailing punctuation so near-verbatim tasks share a key"""
+    return _WHITESPACE.sub(' ', text).strip().rstrip('.!?').strip().casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f'{model}\x00{normalize_query(text)}'.encode('utf-8')).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    SQLite backed embedding store so cached vectors survive restarts and are shared across workers.
+    Calls block on disk I/O, async callers go through `EmbeddingCache.aget` / `aput`.
+
+    The store is trimmed back to `max_entries` every `trim_every` inserts rather than counted on
+    each one, so it can briefly hold up to `trim_every` extra rows per writing process.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl: Optional[float] = None, trim_every: Optional[int] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.trim_every = trim_every or max(1, max_entries // 100)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('pragma journal_mode=wal')
+        self._conn.execute('''
+            create table if not exists embeddings (
+                key text primary key,
+                model text not null,
+                embedding blob not null,
+                created_at real not null
+            )
+        ''')
+        self._conn.execute('create index if not exists idx_embeddings_created_at on embeddings(created_at)')
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute('select embedding, created_at from embeddings where key = ?', (key,)).fetchone()
+
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            blob, created_at = row
+            if self.ttl is not None and time.time() - created_at >= self.ttl:
+                self._conn.execute('delete from embeddings where key = ?', (key,))
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+
+            self.stats.hits += 1
+            return array('f', blob).tolist()
+
+    def put(self, key: str, model: str, embedding: List[float]):
+        with self._lock:
+            self._conn.execute(
+                'insert or replace into embeddings (key, model, embedding, created_at) values (?, ?, ?, ?)',
+                (key, model, array('f', embedding).tobytes(), time.time())
+            )
+
+            self._inserts += 1
+            if self._inserts % self.trim_every:
+                return
+
+            (count,) = self._conn.execute('select count(*) from embeddings').fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    'delete from embeddings where key in (select key from embeddings order by created_at limit ?)',
+                    (overflow,)
+                )
+                self.stats.evictions += overflow
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Two level query-embedding cache: an in-process LRU in front of an optional on-disk store.
+    Entries are keyed by embedding model and normalized query text.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, disk_path: Optional[str] = None, disk_max_entries: int = 100_000):
+        self.memory: LRUCache[List[float]] = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk = DiskEmbeddingStore(disk_path, max_entries=disk_max_entries, ttl=ttl) if disk_path else None
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = cache_key(model, text)
+
+        embedding = self.memory.get(key)
+        if embedding is not None or self.disk is None:
+            return embedding
+
+        return self.__disk_get(key)
+
+    async def aget(self, model: str, text: str) -> Optional[List[float]]:
+        """`get` for async callers, a memory miss reads the disk tier off the event loop"""
+        key = cache_key(model, text)
+
+        embedding = self.memory.get(key)
+        if embedding is not None or self.disk is None:
+            return embedding
+
+        return await asyncio.to_thread(self.__disk_get, key)
+
+    def __disk_get(self, key: str) -> Optional[List[float]]:
+        try:
+            embedding = self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f'Embedding disk cache read failed : {e}')
+            return None
+
+        if embedding is not None:
+            self.memory.put(key, embedding)
+        return embedding
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        key = cache_key(model, text)
+        self.memory.put(key, embedding)
+
+        if self.disk is not None:
+            self.__disk_put(key, model, embedding)
+
+    async def aput(self, model: str, text: str, embedding: List[float]):
+        key = cache_key(model, text)
+        self.memory.put(key, embedding)
+
+        if self.disk is not None:
+            await asyncio.to_thread(self.__disk_put, key, model, embedding)
+
+    def __disk_put(self, key: str, model: str, embedding: List[float]):
+        try:
+            self.disk.put(key, model, embedding)
+        except sqlite3.Error as e:
+            logger.warning(f'Embedding disk cache write failed : {e}')
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'memory': self.memory.stats.as_dict(),
+            'disk': self.disk.stats.as_dict() if self.disk is not None else None,
+        }
@@ -1,19 +1,63 @@
 import os
-import numpy
+import threading
+import time
 
-from dataclasses import dataclass
-from typing import List
-
-from openai import OpenAI
-
-from sklearn.preprocessing import normalize
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from app.agents.tools.chunking import DocumentSection, split_sections
+from app.agents.tools.embedding_cache import EmbeddingCache, normalize_query
+from app.agents.tools.models import embedding_clients
+from app.agents.tools.summaries import ScreenSummariser, summary_hash
 from app.core.logging import get_logger
+from app.core.singleflight import SingleFlight
 from app.core.config import config
-from services.screen_service import ImageModel, ScreenModel, ScreenService
+from app.core.vectors import l2_normalize
+from services.screen_service import ImageModel, ScreenModel, ScreenProjection, ScreenService, SectionModel
+
+if TYPE_CHECKING:
+    from services.screen_index import ScreenVectorIndex
 
 logger = get_logger(__name__)
 
+EMBEDDING_MODEL = 'text-embedding-3-small'
+
+# Damping constant of reciprocal rank fusion, 60 is the value from the original RRF paper
+RRF_K = 60
+
+_TITLE_PREFIXES = ('the',)
+_TITLE_SUFFIXES = ('screen', 'page', 'view')
+
+
+def section_text(screen_title: str, section_path: str, content: str) -> str:
+    """Text a section is embedded from, its content under the screen title and heading path"""
+    heading = f'{screen_title} > {section_path}' if section_path else screen_title
+    return f'{heading}\n{content}'
+
+
+def title_query(query: str) -> str:
+    """Query reduced to what a screen title would look like, e.g. 'The Product List screen' -> 'product list'"""
+    words = normalize_query(query).split()
+    while words and words[0] in _TITLE_PREFIXES:
+        words.pop(0)
+    while words and words[-1] in _TITLE_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def reciprocal_rank_fusion(rankings: List[List[ScreenProjection]], k: int = RRF_K) -> List[ScreenProjection]:
+    """Merge ranked result lists by sum of 1 / (k + rank), the first list's projection of a screen wins"""
+    scores: Dict[int, float] = {}
+    projections: Dict[int, ScreenProjection] = {}
+
+    for ranking in rankings:
+        for rank, projection in enumerate(ranking, start=1):
+            scores[projection.id] = scores.get(projection.id, 0.0) + 1.0 / (k + rank)
+            projections.setdefault(projection.id, projection)
+
+    return [projections[i] for i in sorted(scores, key=scores.get, reverse=True)]
+
 @dataclass
 class ImageInfo:
     url: str
@@ -24,82 +68,383 @@ class Screen:
     name: str
     content: str
     imgs: List[ImageInfo]
+    summary: Optional[str] = None
+    # Sections matching the query, empty when the whole screen matched
+    sections: List[str] = field(default_factory=list)
+
+@dataclass
+class ScreenInput:
+    title: str
+    chunk: str
+    imgs: List[str] = field(default_factory=list)
+
+@dataclass
+class SearchStats:
+    queries: int = 0
+    title_hits: int = 0
+    embedding_cache_hits: int = 0
+    embedding_calls: int = 0
+
+    @property
+    def served_without_embedding_call(self) -> float:
+        """Share of searches answered by the title fast path or a cached query embedding"""
+        return (self.title_hits + self.embedding_cache_hits) / self.queries if self.queries else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'queries': self.queries,
+            'title_hits': self.title_hits,
+            'embedding_cache_hits': self.embedding_cache_hits,
+            'embedding_calls': self.embedding_calls,
+            'served_without_embedding_call': self.served_without_embedding_call,
+        }
+
+@dataclass
+class IngestReport:
+    screens: int = 0
+    sections: int = 0
+    batches: int = 0
+    summarise_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    write_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    @property
+    def embed_throughput(self) -> float:
+        """Screens embedded per second of embedding time"""
+        return self.screens / self.embed_seconds if self.embed_seconds else 0.0
+
+    @property
+    def write_throughput(self) -> float:
+        """Screens written per second of DB time"""
+        return self.screens / self.write_seconds if self.write_seconds else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """End to end screens per second"""
+        return self.screens / self.total_seconds if self.total_seconds else 0.0
 
 class KnowledgeBase:
-    def __init__(self, screen_svc: ScreenService):
+    def __init__(self, screen_svc: ScreenService, embedding_cache: Optional[EmbeddingCache] = None, vector_index: Optional['ScreenVectorIndex'] = None):
         self.service = screen_svc
-        self.openai = OpenAI(api_key=config.OPEN_AI_KEY)
+        # In-process mirror of the embeddings answering vector search without a DB round trip
+        self.vector_index = vector_index
+        self.vectors = vector_index if vector_index is not None else screen_svc
+        self.openai, self.aopenai = embedding_clients()
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            max_size=config.EMBEDDING_CACHE_SIZE,
+            ttl=config.EMBEDDING_CACHE_TTL,
+            disk_path=config.EMBEDDING_CACHE_PATH
+        )
+        self.search_stats = SearchStats()
+        self.search_flight = SingleFlight('search')
+        self._stats_lock = threading.Lock()
 
 
-    def __normalize(self, vector: List[float]) -> List[float]:
-        vector_np = numpy.array(vector, dtype=numpy.float32)
+    @property
+    def dimensions(self) -> int:
+        """Size of the stored embeddings, documents and queries are embedded at the same size"""
+        return self.service.dimensions
 
-        normalized = normalize(vector_np.reshape(1, -1), 'l2')
+    def __embedding_key(self) -> str:
+        return f'{EMBEDDING_MODEL}:{self.dimensions}'
 
-        return normalized[0].tolist()
+    def __normalize(self, vector: List[float]) -> List[float]:
+        return l2_normalize(vector)
 
     def ingest_screen(self, title:str, chunk: str, imgs: List[str]):
         try:
-            resp = self.openai.embeddings.create(
-                model='text-embedding-3-small',
-                input=chunk
-            )
+            self.ingest_screens([ScreenInput(title=title, chunk=chunk, imgs=imgs)])
+        except Exception as e:
+            logger.error(f'Error occurred while ingesting: {e}')
+            
 
-            logger.debug(f'OpenAI embedding response success? : {resp.data is not None}')
+    def ingest_screens(self, batch: List[ScreenInput], batch_size: int = 64, summariser: Optional[ScreenSummariser] = None, summary_workers: int = 8) -> IngestReport:
+        """
+        Bulk ingest screens, embedding `batch_size` chunks per OpenAI request and writing
+        each embedded batch in one transaction. Embedding of batch N+1 overlaps the DB
+        write of batch N. With a `summariser` the view summary of every screen is
+        generated up front and stored with it.
 
-            if resp.data:
-                logger.debug(f'No of embeddings in openai resp : {len(resp.data)}')
+        Every screen is also split at its headings into sections, embedded separately
+        so search can return only the parts of a screen relevant to a task.
+        """
+        report = IngestReport()
+        started = time.perf_counter()
 
-                embeddings = resp.data.pop().embedding
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='kb-ingest-writer') as writer, \
+                ThreadPoolExecutor(max_workers=summary_workers, thread_name_prefix='kb-ingest-summary') as summary_pool:
+            pending: Optional[Future] = None
 
-                n_embeddings = self.__normalize(embeddings)
+            for offset in range(0, len(batch), batch_size):
+                inputs = batch[offset:offset + batch_size]
 
-                screen = ScreenModel(
-                    name=title,
-                    details=chunk,
-                    imgs=[ImageModel(img_url=img) for img in imgs],
-                    embedding=n_embeddings
-                )
+                summarise_started = time.perf_counter()
+                summaries = [summary_pool.submit(summariser.summarise, i.chunk) for i in inputs] if summariser else []
 
-                self.service.save(screen)
-                
-        except Exception as e:
-            logger.error(f'Error occurred while ingesting', e)
-            
+                sections = [split_sections(i.chunk) for i in inputs]
+
+                embed_started = time.perf_counter()
+                embeddings = self.__embed_chunks([i.chunk for i in inputs])
+                section_embeddings = self.__embed_sections(inputs, sections, embeddings, batch_size)
+                report.embed_seconds += time.perf_counter() - embed_started
+
+                summaries = [f.result() for f in summaries]
+                report.summarise_seconds += time.perf_counter() - summarise_started
+
+                screens = [
+                    ScreenModel(
+                        name=i.title,
+                        details=i.chunk,
+                        imgs=[ImageModel(img_url=img) for img in i.imgs],
+                        sections=[
+                            SectionModel(ordinal=section.ordinal, path=section.title, content=section.content, embedding=section_embedding)
+                            for section, section_embedding in zip(screen_sections, screen_section_embeddings)
+                        ],
+                        embedding=embedding
+                    )
+                    for i, embedding, screen_sections, screen_section_embeddings in zip(inputs, embeddings, sections, section_embeddings)
+                ]
+
+                for screen, summary in zip(screens, summaries):
+                    screen.summary = summary
+                    screen.summary_hash = summary_hash(screen.details)
+
+                if pending is not None:
+                    report.write_seconds += pending.result()
+
+                pending = writer.submit(self.__write_screens, screens)
+                report.screens += len(screens)
+                report.sections += sum(len(screen_sections) for screen_sections in sections)
+                report.batches += 1
+
+            if pending is not None:
+                report.write_seconds += pending.result()
+
+        if self.vector_index is not None:
+            self.vector_index.refresh()
+
+        report.total_seconds = time.perf_counter() - started
+
+        logger.info(
+            f'Ingested {report.screens} screens ({report.sections} sections) in {report.batches} batches, '
+            f'{report.total_seconds:.2f}s total ({report.throughput:.1f} screens/s), '
+            f'summarise {report.summarise_seconds:.2f}s, '
+            f'embed {report.embed_seconds:.2f}s ({report.embed_throughput:.1f} screens/s), '
+            f'write {report.write_seconds:.2f}s ({report.write_throughput:.1f} screens/s)'
+        )
+
+        return report
+
+    def __embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+        resp = self.openai.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=chunks,
+            dimensions=self.dimensions
+        )
+
+        if len(resp.data) != len(chunks):
+            raise ValueError(f'Expected {len(chunks)} embeddings from OpenAI, got {len(resp.data)}')
+
+        return [self.__normalize(d.embedding) for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def __embed_sections(self, inputs: List[ScreenInput], sections: List[List[DocumentSection]], embeddings: List[List[float]], batch_size: int) -> List[List[List[float]]]:
+        """
+        Embeddings per section of every screen. A section is embedded with its screen title and heading
+        path for context, a screen that is a single section reuses the embedding of the whole screen.
+        """
+        texts = []
+        for i, screen_sections in zip(inputs, sections):
+            if len(screen_sections) > 1:
+                for section in screen_sections:
+                    texts.append(section_text(i.title, section.title, section.content))
+
+        embedded = iter([e for offset in range(0, len(texts), batch_size) for e in self.__embed_chunks(texts[offset:offset + batch_size])])
+
+        return [
+            [next(embedded) for _ in screen_sections] if len(screen_sections) > 1 else [embedding] * len(screen_sections)
+            for screen_sections, embedding in zip(sections, embeddings)
+        ]
+
+    def __write_screens(self, screens: List[ScreenModel]) -> float:
+        write_started = time.perf_counter()
+        self.service.save_all(screens)
+        return time.perf_counter() - write_started
+
+    def save_summary(self, screen_id: int, details: str, summary: str):
+        self.service.save_summary(screen_id, summary, summary_hash(details))
+
+        if self.vector_index is not None:
+            self.vector_index.update_summary(screen_id, summary, summary_hash(details))
+
+    async def asave_summary(self, screen_id: int, details: str, summary: str):
+        await self.service.asave_summary(screen_id, summary, summary_hash(details))
+
+        if self.vector_index is not None:
+            self.vector_index.update_summary(screen_id, summary, summary_hash(details))
 
     def search_screens(self, query: str) -> List[Screen]:
+        """
+        Hybrid search. A query naming a screen title is answered from the text index alone, or from the
+        vector mirror's titles without a DB round trip when the mirror is enabled. Otherwise vector and
+        full text results are merged with reciprocal rank fusion.
+
+        Identical (after `normalize_query`) searches in flight at the same time share one execution.
+        """
+        return list(self.search_flight.do(normalize_query(query), lambda: self.__search_screens(query)))
+
+    async def asearch_screens(self, query: str) -> List[Screen]:
+        """Non-blocking variant of `search_screens` for use inside the event loop"""
+        return list(await self.search_flight.ado(normalize_query(query), lambda: self.__asearch_screens(query)))
+
+    def __search_screens(self, query: str) -> List[Screen]:
         try:
-            resp = self.openai.embeddings.create(
-                model='text-embedding-3-small',
-                input=query
-            )
+            text_results = self.__mirrored_titles(query) or self.service.find_by_text(query, title_query(query))
 
-            logger.debug(f'OpenAI embedding response success? : {resp.data is not None}')
+            title_hits = self.__title_hits(text_results)
+            if title_hits:
+                return self.__to_screens(title_hits)
 
-            if resp.data:
-                logger.debug(f'Embedding result from OpenAI length : {len(resp.data)}')
+            query_embedding = None
+            try:
+                query_embedding = self.__embed_query(query)
+            except Exception as e:
+                logger.warning(f'Embedding query failed, using text results only: {e}')
 
-                query_embedding = self.__normalize(resp.data.pop().embedding)
+            vector_results = self.vectors.find_by_similarity(query_embedding, k=config.SEARCH_HYBRID_CANDIDATES) if query_embedding else []
+
+            return self.__to_screens(self.__fuse(vector_results, text_results))
+        except Exception as e:
+            logger.error(f'Exception occurred while searching : {e}')
+        
+        return []
 
-                db_results = self.service.find_by_similarity(query_embedding)
+    async def __asearch_screens(self, query: str) -> List[Screen]:
+        try:
+            text_results = self.__mirrored_titles(query) or await self.service.afind_by_text(query, title_query(query))
 
-                #TODO: tweak distance if results are not satisfactory
-                filtered_results = [r for r in db_results if r.distance < 0.50]
+            title_hits = self.__title_hits(text_results)
+            if title_hits:
+                return self.__to_screens(title_hits)
 
-                filtered_results.sort(key=lambda x: x.distance)
+            query_embedding = None
+            try:
+                query_embedding = await self.__aembed_query(query)
+            except Exception as e:
+                logger.warning(f'Embedding query failed, using text results only: {e}')
 
-                results = []
-                for r in filtered_results:
-                    results.append(Screen(
-                        id=r.id,
-                        name=r.name,
-                        content=r.details,
-                        imgs=[ImageInfo(url=url) for url in r.imgs],
-                    ))
+            vector_results = await self.vectors.afind_by_similarity(query_embedding, k=config.SEARCH_HYBRID_CANDIDATES) if query_embedding else []
 
-                logger.debug(f'Results from DB : {len(results)}')
-                return results
+            return self.__to_screens(self.__fuse(vector_results, text_results))
         except Exception as e:
-            logger.error('Exception occurred while searching', e)
-        
-        return []
\ No newline at end of file
+            logger.error(f'Exception occurred while searching : {e}')
+
+        return []
+
+    def __mirrored_titles(self, query: str) -> List[ScreenProjection]:
+        """Exact title hits from the in-process mirror, sparing the text query its DB round trip"""
+        if self.vector_index is None:
+            return []
+        return self.vector_index.find_by_title(title_query(query))
+
+    def __title_hits(self, text_results: List[ScreenProjection]) -> List[ScreenProjection]:
+        hits = sorted(
+            [r for r in text_results if r.title_similarity >= config.SEARCH_TITLE_SIMILARITY],
+            key=lambda r: r.title_similarity,
+            reverse=True
+        )
+
+        with self._stats_lock:
+            self.search_stats.queries += 1
+            if hits:
+                self.search_stats.title_hits += 1
+
+        if hits:
+            logger.debug(f'Title fast path matched {hits[0].name} ({hits[0].title_similarity:.2f})')
+        return hits[:config.SEARCH_TOP_K]
+
+    def __fuse(self, vector_results: List[ScreenProjection], text_results: List[ScreenProjection]) -> List[ScreenProjection]:
+        # Vector results first so their matched sections are kept for screens found by both
+        text_ranking = sorted([r for r in text_results if r.text_rank > 0], key=lambda r: r.text_rank, reverse=True)
+        return reciprocal_rank_fusion([vector_results, text_ranking])[:config.SEARCH_TOP_K]
+
+    async def acached_query_embedding(self, query: str) -> Optional[List[float]]:
+        """
+        Normalized embedding of a query an earlier search embedded, without calling the API. None when
+        the search did not need one, e.g. it was answered by the title fast path.
+        """
+        return await self.embedding_cache.aget(self.__embedding_key(), query)
+
+    def __embed_query(self, query: str) -> Optional[List[float]]:
+        cached = self.embedding_cache.get(self.__embedding_key(), query)
+        if cached is not None:
+            logger.debug('Query embedding served from cache')
+            self.__count_embedding(cached=True)
+            return cached
+
+        self.__count_embedding(cached=False)
+
+        resp = self.openai.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=query,
+            dimensions=self.dimensions
+        )
+
+        query_embedding = self.__query_embedding(resp)
+        if query_embedding is not None:
+            self.embedding_cache.put(self.__embedding_key(), query, query_embedding)
+        return query_embedding
+
+    async def __aembed_query(self, query: str) -> Optional[List[float]]:
+        cached = await self.embedding_cache.aget(self.__embedding_key(), query)
+        if cached is not None:
+            logger.debug('Query embedding served from cache')
+            self.__count_embedding(cached=True)
+            return cached
+
+        self.__count_embedding(cached=False)
+
+        resp = await self.aopenai.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=query,
+            dimensions=self.dimensions
+        )
+
+        query_embedding = self.__query_embedding(resp)
+        if query_embedding is not None:
+            await self.embedding_cache.aput(self.__embedding_key(), query, query_embedding)
+        return query_embedding
+
+    def __count_embedding(self, cached: bool):
+        with self._stats_lock:
+            if cached:
+                self.search_stats.embedding_cache_hits += 1
+            else:
+                self.search_stats.embedding_calls += 1
+
+    def __query_embedding(self, resp) -> Optional[List[float]]:
+        logger.debug(f'OpenAI embedding response success? : {resp.data is not None}')
+
+        if not resp.data:
+            return None
+
+        logger.debug(f'Embedding result from OpenAI length : {len(resp.data)}')
+
+        return self.__normalize(resp.data.pop().embedding)
+
+    def __to_screens(self, db_results: List[ScreenProjection]) -> List[Screen]:
+        # Distance cutoff (SEARCH_MAX_DISTANCE) and ordering are applied by the DB query
+        results = []
+        for r in db_results:
+            results.append(Screen(
+                id=r.id,
+                name=r.name,
+                content=r.details,
+                imgs=[ImageInfo(url=url) for url in r.imgs],
+                # A summary generated for older details (or an older prompt) is stale
+                summary=r.summary if r.summary_hash == summary_hash(r.details) else None,
+                sections=r.sections,
+            ))
+
+        logger.debug(f'Results from DB : {len(results)}')
+        return results
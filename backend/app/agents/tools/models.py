@@ -0,0 +1,356 @@
+import threading
+import time
+
+from contextlib import aclosing
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core import metrics
+from app.core.config import config
+from app.core.hedging import CallPolicy
+from app.core.scheduler import Priority, scheduler
+
+MODEL_BACKENDS = ('live', 'offline')
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, time to first token and token usage of every chat model run"""
+
+    # Only bookkeeping, no need for langchain to hop to an executor for async runs
+    run_inline = True
+
+    def __init__(self):
+        # run id -> (model, started, first token seen)
+        self._runs: Dict[UUID, list] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        if not metrics.registry.enabled:
+            return
+
+        model = (metadata or {}).get('ls_model_name') or 'unknown'
+        with self._lock:
+            self._runs[run_id] = [model, time.perf_counter(), False]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is None or run[2] or not token:
+            return
+
+        run[2] = True
+        metrics.LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - run[1], run[0])
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+
+        model, started, _ = run
+        metrics.LLM_SECONDS.observe(time.perf_counter() - started, model)
+
+        usage = _usage(response)
+        if usage:
+            metrics.LLM_PROMPT_TOKENS.observe(usage.get('input_tokens', 0), model)
+            metrics.LLM_COMPLETION_TOKENS.observe(usage.get('output_tokens', 0), model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            metrics.LLM_ERRORS.inc(1, run[0])
+
+
+def _usage(response: LLMResult) -> Optional[Dict[str, int]]:
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage
+
+    token_usage = (response.llm_output or {}).get('token_usage')
+    if token_usage:
+        return {'input_tokens': token_usage.get('prompt_tokens', 0), 'output_tokens': token_usage.get('completion_tokens', 0)}
+
+    return None
+
+
+llm_metrics = LLMMetricsCallback()
+
+
+class _MeteredEmbeddings:
+    def __init__(self, embeddings):
+        self._embeddings = embeddings
+
+    def create(self, model: str, **kwargs):
+        with metrics.EMBEDDING_SECONDS.time(model):
+            resp = self._embeddings.create(model=model, **kwargs)
+        _observe_embedding_usage(model, resp)
+        return resp
+
+
+class _AsyncMeteredEmbeddings(_MeteredEmbeddings):
+    async def create(self, model: str, **kwargs):
+        with metrics.EMBEDDING_SECONDS.time(model):
+            resp = await self._embeddings.create(model=model, **kwargs)
+        _observe_embedding_usage(model, resp)
+        return resp
+
+
+def _observe_embedding_usage(model: str, resp):
+    usage = getattr(resp, 'usage', None)
+    if usage is not None:
+        metrics.EMBEDDING_TOKENS.observe(usage.prompt_tokens, model)
+
+
+class MeteredEmbeddingClient:
+    """Wraps an OpenAI client (or its stand-in), `embeddings.create` is timed and its usage recorded"""
+
+    def __init__(self, client, asynchronous: bool = False):
+        self.embeddings = (_AsyncMeteredEmbeddings if asynchronous else _MeteredEmbeddings)(client.embeddings)
+
+
+class _MeteredImageModels:
+    def __init__(self, models):
+        self._models = models
+
+    async def generate_content(self, model: str, **kwargs):
+        # Image edits are too expensive to send twice, they are only retried
+        return await CallPolicy('gemini', model, hedge=False).acall(lambda: self._generate_once(model, **kwargs))
+
+    async def _generate_once(self, model: str, **kwargs):
+        try:
+            async with scheduler.aslot('gemini', model, Priority.INTERACTIVE):
+                with metrics.LLM_SECONDS.time(model):
+                    resp = await self._models.generate_content(model=model, **kwargs)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(1, model)
+            _throttle_on_rate_limit('gemini', model, e)
+            raise
+
+        usage = getattr(resp, 'usage_metadata', None)
+        if usage is not None:
+            metrics.LLM_PROMPT_TOKENS.observe(usage.prompt_token_count or 0, model)
+            metrics.LLM_COMPLETION_TOKENS.observe(usage.candidates_token_count or 0, model)
+
+        return resp
+
+
+class _MeteredAio:
+    def __init__(self, aio):
+        self.models = _MeteredImageModels(aio.models)
+
+
+class MeteredImageClient:
+    """
+    Wraps a `genai.Client` (or its stand-in), `aio.models.generate_content` waits for a slot in the
+    scheduler, is retried, timed and its usage recorded
+    """
+
+    def __init__(self, client):
+        self.aio = _MeteredAio(client.aio)
+
+
+def _estimate_tokens(payload) -> int:
+    """Rough prompt size for the token bucket, about four characters per token"""
+    if isinstance(payload, str):
+        return len(payload) // 4
+    return sum(len(str(getattr(item, 'content', item))) for item in payload) // 4
+
+
+def _throttle_on_rate_limit(provider: str, model: str, error: Exception):
+    # OpenAI errors carry status_code (its responses already paused the lane), genai errors carry code
+    if (getattr(error, 'status_code', None) or getattr(error, 'code', None)) == 429:
+        scheduler.throttled(provider, model)
+
+
+class ScheduledChatModel:
+    """
+    Chat model whose calls wait for a slot of their lane in the shared scheduler. Streams hold
+    the slot until their last token. Calls are retried and, when enabled, hedged by the lane's
+    `CallPolicy`, every attempt takes its own slot. Everything else is delegated to the wrapped model.
+    """
+
+    def __init__(self, llm, model: str, priority: Priority, provider: str = 'openai'):
+        self.llm = llm
+        self.model = model
+        self.priority = priority
+        self.provider = provider
+        self.policy = CallPolicy(provider, model)
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def invoke(self, messages, *args, **kwargs):
+        return self.policy.call(lambda: self._invoke_once(messages, *args, **kwargs))
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return await self.policy.acall(lambda: self._ainvoke_once(messages, *args, **kwargs))
+
+    async def astream(self, messages, *args, **kwargs):
+        async with aclosing(self.policy.astream(lambda: self._astream_once(messages, *args, **kwargs))) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    def _invoke_once(self, messages, *args, **kwargs):
+        try:
+            with scheduler.slot(self.provider, self.model, self.priority, _estimate_tokens(messages)):
+                return self.llm.invoke(messages, *args, **kwargs)
+        except Exception as e:
+            _throttle_on_rate_limit(self.provider, self.model, e)
+            raise
+
+    async def _ainvoke_once(self, messages, *args, **kwargs):
+        try:
+            async with scheduler.aslot(self.provider, self.model, self.priority, _estimate_tokens(messages)):
+                return await self.llm.ainvoke(messages, *args, **kwargs)
+        except Exception as e:
+            _throttle_on_rate_limit(self.provider, self.model, e)
+            raise
+
+    async def _astream_once(self, messages, *args, **kwargs):
+        try:
+            async with scheduler.aslot(self.provider, self.model, self.priority, _estimate_tokens(messages)):
+                async for chunk in self.llm.astream(messages, *args, **kwargs):
+                    yield chunk
+        except Exception as e:
+            _throttle_on_rate_limit(self.provider, self.model, e)
+            raise
+
+
+class _ScheduledEmbeddings:
+    def __init__(self, embeddings, priority: Priority):
+        self._embeddings = embeddings
+        self.priority = priority
+
+    def create(self, model: str, input, **kwargs):
+        return CallPolicy('openai', model).call(lambda: self._create_once(model, input, **kwargs))
+
+    def _create_once(self, model: str, input, **kwargs):
+        try:
+            with scheduler.slot('openai', model, self.priority, _estimate_tokens(input)):
+                return self._embeddings.create(model=model, input=input, **kwargs)
+        except Exception as e:
+            _throttle_on_rate_limit('openai', model, e)
+            raise
+
+
+class _AsyncScheduledEmbeddings(_ScheduledEmbeddings):
+    async def create(self, model: str, input, **kwargs):
+        return await CallPolicy('openai', model).acall(lambda: self._create_once(model, input, **kwargs))
+
+    async def _create_once(self, model: str, input, **kwargs):
+        try:
+            async with scheduler.aslot('openai', model, self.priority, _estimate_tokens(input)):
+                return await self._embeddings.create(model=model, input=input, **kwargs)
+        except Exception as e:
+            _throttle_on_rate_limit('openai', model, e)
+            raise
+
+
+class ScheduledEmbeddingClient:
+    """
+    Embedding calls through the shared scheduler. Sync calls come from ingestion and migrations and
+    queue behind async ones, which serve chat requests. Both are retried, only async calls are hedged.
+    """
+
+    def __init__(self, client, asynchronous: bool = False):
+        if asynchronous:
+            self.embeddings = _AsyncScheduledEmbeddings(client.embeddings, Priority.INTERACTIVE)
+        else:
+            self.embeddings = _ScheduledEmbeddings(client.embeddings, Priority.BATCH)
+
+
+def _openai_http_clients():
+    """httpx clients with OpenAI's defaults whose responses feed the scheduler's rate limits"""
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+    async def observe(response):
+        scheduler.observe_openai_response(response)
+
+    return (
+        DefaultHttpxClient(event_hooks={'response': [scheduler.observe_openai_response]}),
+        DefaultAsyncHttpxClient(event_hooks={'response': [observe]})
+    )
+
+
+def _backend() -> str:
+    if config.MODEL_BACKEND not in MODEL_BACKENDS:
+        raise ValueError(f'Unsupported model backend {config.MODEL_BACKEND}, expected one of {", ".join(MODEL_BACKENDS)}')
+    return config.MODEL_BACKEND
+
+
+def _offline_profile(latency_ms: float):
+    from app.agents.tools.offline_models import OfflineProfile
+    return OfflineProfile(
+        latency_ms=latency_ms,
+        tokens_per_second=config.OFFLINE_TOKENS_PER_SECOND,
+        failure_rate=config.OFFLINE_FAILURE_RATE,
+        failure_status=config.OFFLINE_FAILURE_STATUS,
+        seed=config.OFFLINE_SEED
+    )
+
+
+def chat_model(model: str, priority: Priority = Priority.INTERACTIVE, **kwargs) -> ScheduledChatModel:
+    """`ChatOpenAI`, or its deterministic stand-in when MODEL_BACKEND is offline, behind the scheduler"""
+    if _backend() == 'offline':
+        from app.agents.tools.offline_models import OfflineChatModel
+        llm = OfflineChatModel(
+            model_name=model,
+            completion_tokens=config.OFFLINE_COMPLETION_TOKENS,
+            profile=_offline_profile(config.OFFLINE_LATENCY_MS),
+            callbacks=[llm_metrics]
+        )
+    else:
+        from langchain_openai import ChatOpenAI
+        http_client, http_async_client = _openai_http_clients()
+        llm = ChatOpenAI(
+            model=model,
+            api_key=lambda: config.OPEN_AI_KEY if config.OPEN_AI_KEY else 'default-value',
+            # Token usage of streamed completions, only sent when asked for
+            stream_usage=True,
+            # Retries are made by the scheduled model, within the request's deadline
+            max_retries=0,
+            callbacks=[llm_metrics],
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **kwargs
+        )
+
+    return ScheduledChatModel(llm, model, priority)
+
+
+def embedding_clients() -> Tuple:
+    """Sync and async OpenAI clients used for embeddings"""
+    if _backend() == 'offline':
+        from app.agents.tools.offline_models import OfflineEmbeddingClient
+        profile = _offline_profile(config.OFFLINE_EMBEDDING_LATENCY_MS)
+        clients = (
+            OfflineEmbeddingClient(profile, dimensions=config.EMBEDDING_DIMENSIONS),
+            OfflineEmbeddingClient(profile, dimensions=config.EMBEDDING_DIMENSIONS, asynchronous=True)
+        )
+    else:
+        from openai import AsyncOpenAI, OpenAI
+        http_client, http_async_client = _openai_http_clients()
+        clients = (
+            OpenAI(api_key=config.OPEN_AI_KEY, http_client=http_client, max_retries=0),
+            AsyncOpenAI(api_key=config.OPEN_AI_KEY, http_client=http_async_client, max_retries=0)
+        )
+
+    return (
+        ScheduledEmbeddingClient(MeteredEmbeddingClient(clients[0])),
+        ScheduledEmbeddingClient(MeteredEmbeddingClient(clients[1], asynchronous=True), asynchronous=True)
+    )
+
+
+def image_client():
+    """`genai.Client` used for image edits"""
+    if _backend() == 'offline':
+        from app.agents.tools.offline_models import OfflineImageClient
+        return MeteredImageClient(OfflineImageClient(_offline_profile(config.OFFLINE_IMAGE_LATENCY_MS)))
+
+    from google import genai
+    return MeteredImageClient(genai.Client(api_key=config.GOOGLE_AI_KEY))
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import io
+import random
+import re
+import threading
+import time
+
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy
+
+from google.genai import types as genai_types
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from openai.types import CreateEmbeddingResponse, Embedding
+from openai.types.create_embedding_response import Usage
+from PIL import Image, ImageDraw
+from pydantic import Field
+
+_WORDS = (
+    'screen', 'layout', 'filter', 'table', 'column', 'header', 'sidebar', 'button', 'order', 'product',
+    'invoice', 'dashboard', 'widget', 'chart', 'total', 'status', 'form', 'field', 'search', 'vendor',
+    'the', 'a', 'with', 'and', 'to', 'for', 'shows', 'adds', 'moves', 'keeps', 'next', 'above', 'below'
+)
+
+_TOKEN = re.compile(r'\w+')
+
+# Replies the workflow parses, keyed by a field name its prompt asks for
+_STRUCTURED_REPLIES = {
+    'yes_no': '{"yes_no": true, "refined_query": null}',
+}
+
+
+class OfflineModelError(Exception):
+    """Injected failure, carries the HTTP status a provider would have answered with"""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class OfflineProfile:
+    """Latency and failure behaviour shared by the offline stand-ins"""
+    latency_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 503
+    seed: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def token_interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def maybe_fail(self, what: str):
+        with self._lock:
+            failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+
+        if failed:
+            raise OfflineModelError(f'Injected {self.failure_status} from offline {what}', status_code=self.failure_status)
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return ' '.join(part.get('text', '') if isinstance(part, dict) else str(part) for part in content)
+
+
+class OfflineChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for `ChatOpenAI`. The reply depends only on the prompt: a structured
+    reply when the prompt asks for one of the fields in `_STRUCTURED_REPLIES`, otherwise
+    `completion_tokens` words drawn from a fixed vocabulary seeded by the prompt hash.
+
+    The first token arrives after `profile.latency_ms`, the following ones at `profile.tokens_per_second`,
+    and a call fails with `OfflineModelError` with probability `profile.failure_rate`.
+    """
+
+    model_name: str = 'offline'
+    completion_tokens: int = 60
+    profile: OfflineProfile = Field(default_factory=OfflineProfile)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'offline-chat'
+
+    def _reply_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = '\n'.join(_message_text(m) for m in messages)
+
+        for field, reply in _STRUCTURED_REPLIES.items():
+            if field in prompt:
+                return [reply]
+
+        rng = random.Random(_digest(prompt))
+        words = [rng.choice(_WORDS) for _ in range(self.completion_tokens)]
+        return [words[0].capitalize()] + [f' {w}' for w in words[1:]]
+
+    def _usage(self, messages: List[BaseMessage], tokens: List[str]) -> dict:
+        input_tokens = sum(len(_TOKEN.findall(_message_text(m))) for m in messages)
+        return {'input_tokens': input_tokens, 'output_tokens': len(tokens), 'total_tokens': input_tokens + len(tokens)}
+
+    def _result(self, messages: List[BaseMessage], tokens: List[str]) -> ChatResult:
+        message = AIMessage(content=''.join(tokens), usage_metadata=self._usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self.profile.maybe_fail(self.model_name)
+        tokens = self._reply_tokens(messages)
+        time.sleep(self.profile.latency_ms / 1000 + self.profile.token_interval * (len(tokens) - 1))
+        return self._result(messages, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self.profile.maybe_fail(self.model_name)
+        tokens = self._reply_tokens(messages)
+        await asyncio.sleep(self.profile.latency_ms / 1000 + self.profile.token_interval * (len(tokens) - 1))
+        return self._result(messages, tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.profile.maybe_fail(self.model_name)
+        tokens = self._reply_tokens(messages)
+        time.sleep(self.profile.latency_ms / 1000)
+
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.profile.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+        # Usage arrives on a final empty chunk, like OpenAI streams with stream_usage
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages, tokens)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.profile.maybe_fail(self.model_name)
+        tokens = self._reply_tokens(messages)
+        await asyncio.sleep(self.profile.latency_ms / 1000)
+
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.profile.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+        # Usage arrives on a final empty chunk, like OpenAI streams with stream_usage
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages, tokens)))
+
+
+@lru_cache(maxsize=16384)
+def _word_vector(word: str, dimensions: int) -> numpy.ndarray:
+    return numpy.random.default_rng(_digest(word)).standard_normal(dimensions).astype(numpy.float32)
+
+
+def offline_embedding(text: str, dimensions: int) -> List[float]:
+    """
+    Unit length sum of a fixed random vector per word, texts sharing words land close together so
+    search and the response cache behave like they do on real embeddings
+    """
+    vector = numpy.zeros(dimensions, dtype=numpy.float32)
+    for word in _TOKEN.findall(text.lower()) or [text]:
+        vector += _word_vector(word, dimensions)
+
+    norm = numpy.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class _OfflineEmbeddingsApi:
+    def __init__(self, profile: OfflineProfile, default_dimensions: int):
+        self.profile = profile
+        self.default_dimensions = default_dimensions
+
+    def _response(self, model: str, input, dimensions: Optional[int]) -> CreateEmbeddingResponse:
+        self.profile.maybe_fail(model)
+        texts = [input] if isinstance(input, str) else list(input)
+        dims = dimensions or self.default_dimensions
+        tokens = sum(len(_TOKEN.findall(t)) for t in texts)
+
+        return CreateEmbeddingResponse(
+            data=[Embedding(embedding=offline_embedding(t, dims), index=i, object='embedding') for i, t in enumerate(texts)],
+            model=model,
+            object='list',
+            usage=Usage(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+
+class _SyncEmbeddings(_OfflineEmbeddingsApi):
+    def create(self, model: str, input, dimensions: Optional[int] = None, **kwargs) -> CreateEmbeddingResponse:
+        time.sleep(self.profile.latency_ms / 1000)
+        return self._response(model, input, dimensions)
+
+
+class _AsyncEmbeddings(_OfflineEmbeddingsApi):
+    async def create(self, model: str, input, dimensions: Optional[int] = None, **kwargs) -> CreateEmbeddingResponse:
+        await asyncio.sleep(self.profile.latency_ms / 1000)
+        return self._response(model, input, dimensions)
+
+
+class OfflineEmbeddingClient:
+    """Stand-in for `OpenAI` / `AsyncOpenAI`, only `embeddings.create` is provided"""
+
+    def __init__(self, profile: Optional[OfflineProfile] = None, dimensions: int = 1536, asynchronous: bool = False):
+        profile = profile or OfflineProfile()
+        self.embeddings = (_AsyncEmbeddings if asynchronous else _SyncEmbeddings)(profile, dimensions)
+
+
+def _edited_png(contents) -> bytes:
+    """The input image with a band whose colour is derived from the prompt, so every edit differs"""
+    prompt = ' '.join(str(part) for part in contents if not isinstance(part, Image.Image))
+    source = next((part for part in contents if isinstance(part, Image.Image)), None)
+
+    image = source.convert('RGB') if source is not None else Image.new('RGB', (256, 256), 'white')
+    seed = _digest(prompt)
+    colour = (seed & 0xff, (seed >> 8) & 0xff, (seed >> 16) & 0xff)
+
+    ImageDraw.Draw(image).rectangle((0, 0, image.width, max(1, image.height // 12)), fill=colour)
+
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return out.getvalue()
+
+
+class _OfflineImageModels:
+    def __init__(self, profile: OfflineProfile):
+        self.profile = profile
+
+    async def generate_content(self, model: str, contents, config=None) -> genai_types.GenerateContentResponse:
+        self.profile.maybe_fail(model)
+        await asyncio.sleep(self.profile.latency_ms / 1000)
+
+        if not isinstance(contents, list):
+            contents = [contents]
+        data = await asyncio.to_thread(_edited_png, contents)
+
+        return genai_types.GenerateContentResponse(candidates=[genai_types.Candidate(
+            content=genai_types.Content(role='model', parts=[
+                genai_types.Part(inline_data=genai_types.Blob(data=data, mime_type='image/png'))
+            ])
+        )])
+
+
+class OfflineImageClient:
+    """Stand-in for `genai.Client`, only `aio.models.generate_content` is provided"""
+
+    def __init__(self, profile: Optional[OfflineProfile] = None):
+        self.aio = SimpleNamespace(models=_OfflineImageModels(profile or OfflineProfile()))
@@ -0,0 +1,215 @@
+import hashlib
+import itertools
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+from app.core.cache import CacheStats
+from app.core.config import config
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def content_hash(details: str) -> str:
+    return hashlib.sha256(details.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    id: int
+    task: str
+    embedding: List[float]
+    screen_id: int
+    screen_hash: str
+    history_hash: str
+    model: str
+    chunks: List[str]
+    created_at: float
+    hits: int = 0
+    last_hit_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'task': self.task,
+            'screen_id': self.screen_id,
+            'model': self.model,
+            'hits': self.hits,
+            'age_seconds': time.monotonic() - self.created_at,
+        }
+
+
+# (screen id, model, conversation history hash)
+BucketKey = Tuple[int, str, str]
+
+
+@dataclass
+class _Bucket:
+    screen_hash: str
+    dimensions: int
+    entries: Dict[int, CachedResponse] = field(default_factory=dict)
+    # Embeddings of `entries` in insertion order, rebuilt on the first lookup after a change
+    _matrix: Optional[numpy.ndarray] = field(default=None, init=False, repr=False)
+    _ordered: List[CachedResponse] = field(default_factory=list, init=False, repr=False)
+
+    def add(self, entry: CachedResponse):
+        self.entries[entry.id] = entry
+        self._matrix = None
+
+    def discard(self, entry_id: int):
+        if self.entries.pop(entry_id, None) is not None:
+            self._matrix = None
+
+    def vectors(self) -> Tuple[numpy.ndarray, List[CachedResponse]]:
+        if self._matrix is None:
+            self._ordered = list(self.entries.values())
+            self._matrix = numpy.asarray([e.embedding for e in self._ordered], dtype=numpy.float32)
+        return self._matrix, self._ordered
+
+
+class ResponseCache:
+    """
+    Semantic cache of generated specs keyed by (task embedding, top screen id, model, conversation
+    history). The prompt includes the session's history, an answer is only reused for the same one.
+
+    A lookup compares the task embedding against the answers cached for the same screen, model and
+    history and hits when the best cosine similarity reaches `threshold`. Embeddings are L2
+    normalized by the knowledge base, so cosine similarity is a dot product, computed with numpy
+    outside the lock over at most `bucket_size` answers. Answers for a screen are dropped as soon
+    as a lookup sees different screen content, i.e. after it was re-ingested.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None, bucket_size: Optional[int] = None):
+        self.threshold = threshold or config.RESPONSE_CACHE_THRESHOLD
+        self.ttl = ttl or config.RESPONSE_CACHE_TTL
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self.bucket_size = bucket_size or config.RESPONSE_CACHE_BUCKET_SIZE
+        self.stats = CacheStats()
+
+        self._buckets: Dict[BucketKey, _Bucket] = {}
+        self._lru: OrderedDict[int, CachedResponse] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, embedding: List[float], screen_id: int, screen_details: str, model: str, history: str = '') -> Optional[CachedResponse]:
+        now = time.monotonic()
+        key = (screen_id, model, content_hash(history))
+        screen_hash = content_hash(screen_details)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.screen_hash != screen_hash:
+                self._invalidate(screen_id)
+                bucket = None
+
+            if bucket is not None:
+                for entry in [e for e in bucket.entries.values() if now - e.created_at >= self.ttl]:
+                    self._remove(entry)
+                    self.stats.expirations += 1
+                bucket = self._buckets.get(key)
+
+            # Answers embedded before the catalog moved to another embedding size are not comparable
+            if bucket is None or bucket.dimensions != len(embedding):
+                self.stats.misses += 1
+                return None
+
+            matrix, entries = bucket.vectors()
+
+        scores = matrix @ numpy.asarray(embedding, dtype=numpy.float32)
+        index = int(scores.argmax())
+        best, best_score = entries[index], float(scores[index])
+
+        with self._lock:
+            # Evicted while scoring
+            if best_score < self.threshold or best.id not in self._lru:
+                self.stats.misses += 1
+                return None
+
+            best.hits += 1
+            best.last_hit_at = now
+            self._lru.move_to_end(best.id)
+            self.stats.hits += 1
+
+        logger.debug(f'Response cache hit for screen {screen_id} with similarity {best_score:.3f}')
+        return best
+
+    def put(self, task: str, embedding: List[float], screen_id: int, screen_details: str, model: str, chunks: List[str], history: str = '') -> CachedResponse:
+        entry = CachedResponse(
+            id=next(self._ids),
+            task=task,
+            embedding=embedding,
+            screen_id=screen_id,
+            screen_hash=content_hash(screen_details),
+            history_hash=content_hash(history),
+            model=model,
+            chunks=chunks,
+            created_at=time.monotonic(),
+        )
+        key = (screen_id, model, entry.history_hash)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.screen_hash != entry.screen_hash:
+                self._invalidate(screen_id)
+                bucket = None
+            elif bucket is not None and bucket.dimensions != len(embedding):
+                self._drop_bucket(key)
+                bucket = None
+
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(entry.screen_hash, len(embedding))
+
+            bucket.add(entry)
+            self._lru[entry.id] = entry
+
+            # Bounds the scoring work of a lookup, oldest answers of the bucket go first
+            while len(bucket.entries) > self.bucket_size:
+                self._remove(next(iter(bucket.entries.values())))
+                self.stats.evictions += 1
+
+            while len(self._lru) > self.max_entries:
+                _, evicted = self._lru.popitem(last=False)
+                self._remove(evicted)
+                self.stats.evictions += 1
+
+        return entry
+
+    def invalidate_screen(self, screen_id: int):
+        """Drop every answer generated against `screen_id`"""
+        with self._lock:
+            self._invalidate(screen_id)
+
+    def _invalidate(self, screen_id: int):
+        # Under self._lock
+        for key in [k for k in self._buckets if k[0] == screen_id]:
+            self._drop_bucket(key)
+
+    def _drop_bucket(self, key: BucketKey):
+        bucket = self._buckets.pop(key)
+        for entry_id in bucket.entries:
+            self._lru.pop(entry_id, None)
+
+    def _remove(self, entry: CachedResponse):
+        self._lru.pop(entry.id, None)
+
+        key = (entry.screen_id, entry.model, entry.history_hash)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.discard(entry.id)
+            if not bucket.entries:
+                del self._buckets[key]
+
+    def entry_stats(self) -> List[Dict[str, Any]]:
+        """Per entry hit counts, most hit first"""
+        with self._lock:
+            entries = sorted(self._lru.values(), key=lambda e: e.hits, reverse=True)
+            return [e.as_dict() for e in entries]
+
+    def __len__(self) -> int:
+        return len(self._lru)
@@ -0,0 +1,57 @@
+import hashlib
+
+from typing import List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Bump when the prompt below changes so stored summaries are regenerated
+SUMMARY_VERSION = 1
+
+
+def summary_hash(details: str) -> str:
+    """Content hash a stored summary is valid for"""
+    return hashlib.sha256(f'{SUMMARY_VERSION}\x00{details}'.encode('utf-8')).hexdigest()
+
+
+def summary_messages(details: str) -> List[BaseMessage]:
+    system_prompt = f"""You are a helpful assistant, who can summarise the screen given its features and details.
+Given below the screen details. Provide suggestion for user query.
+
+Screen Details:
+{details}
+"""
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content='Provide summary for the screen in such a way that one can visualise as it might be in reality. Summary must be under 200 words')
+    ]
+
+
+def history_summary_messages(previous_summary: Optional[str], turns: List[str]) -> List[BaseMessage]:
+    conversation = '\n'.join(turns)
+    system_prompt = f"""You are a helpful assistant, who keeps a running summary of a conversation between a user and an assistant working on software specs.
+Update the summary with the new turns below. Keep decisions, requirements, screen and application names, drop pleasantries.
+
+Current Summary:
+{previous_summary or 'None'}
+
+New Turns:
+{conversation}
+"""
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content='Provide the updated summary. Summary must be under 150 words')
+    ]
+
+
+class ScreenSummariser:
+    """Produces the view summary used to prompt image edits for a screen"""
+
+    def __init__(self, llm: BaseChatModel):
+        self.llm = llm
+
+    def summarise(self, details: str) -> str:
+        return self.llm.invoke(summary_messages(details)).content
+
+    async def asummarise(self, details: str) -> str:
+        return (await self.llm.ainvoke(summary_messages(details))).content
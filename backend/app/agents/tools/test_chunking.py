@@ -0,0 +1,49 @@
+from app.agents.tools.chunking import split_sections
+
+DOC = '''**Screen Title:** Home Dashboard
+
+---
+
+### **Key Features**
+
+#### **Total Receivables**
+
+Amounts owed to the business.
+
+##### Breakdown
+
+On-time and overdue.
+
+---
+
+#### **Total Payables**
+
+Amounts owed by the business.
+
+### Design Highlights
+
+Card based layout.
+'''
+
+
+def test_sections_follow_headings_up_to_max_level():
+    sections = split_sections(DOC)
+
+    assert [s.path for s in sections] == [
+        [],
+        ['Key Features', 'Total Receivables'],
+        ['Key Features', 'Total Payables'],
+        ['Design Highlights'],
+    ]
+    assert [s.ordinal for s in sections] == [0, 1, 2, 3]
+    # Deeper headings stay in their parent section, thematic breaks are dropped
+    assert '##### Breakdown' in sections[1].content
+    assert '***' not in sections[1].content and '---' not in sections[1].content
+    assert sections[2].content.startswith('#### **Total Payables**')
+
+
+def test_document_without_headings_is_one_section():
+    sections = split_sections('Just a paragraph.')
+
+    assert len(sections) == 1
+    assert sections[0].path == [] and sections[0].content == 'Just a paragraph.'
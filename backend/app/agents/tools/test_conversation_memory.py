@@ -0,0 +1,63 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from app.agents.state_manager import new_state
+from app.agents.tools.conversation_memory import ConversationMemory
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+class FakeSummaryLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content=f'summary {len(self.calls)}')
+
+
+def _conversation(turns: int, start: int = 0):
+    state = new_state()
+    for i in range(start, start + turns):
+        state['messages'].append({'role': 'user', 'content': f'question {i}'})
+        state['messages'].append({'role': 'assistant', 'content': f'answer {i}'})
+    return state
+
+
+def test_render_keeps_newest_messages_within_budget():
+    memory = ConversationMemory(budget=12, count_tokens=count_words)
+    state = _conversation(5)
+
+    history = memory.render(state)
+
+    # 4 words per message, only the last 3 fit
+    assert history.splitlines() == ['assistant : answer 3', 'user : question 4', 'assistant : answer 4']
+
+
+def test_compaction_folds_old_turns_into_summary_incrementally():
+    memory = ConversationMemory(budget=30, count_tokens=count_words)
+    llm = FakeSummaryLLM()
+    state = _conversation(3)
+
+    assert not asyncio.run(memory.acompact(state, llm))
+    assert llm.calls == []
+
+    state['messages'].extend(_conversation(3, start=3)['messages'])
+    assert asyncio.run(memory.acompact(state, llm))
+
+    # Newest messages kept verbatim within half the budget, the rest replaced by the summary
+    assert state['summary'] == 'summary 1'
+    assert [m['content'] for m in state['messages']] == ['answer 4', 'question 5', 'answer 5']
+    assert memory.render(state).startswith('summary of earlier conversation : summary 1')
+
+    # The next compaction only sends the previous summary and the messages added since
+    state['messages'].extend(_conversation(3, start=6)['messages'])
+    assert asyncio.run(memory.acompact(state, llm))
+
+    prompt = llm.calls[1][0].content
+    assert 'summary 1' in prompt
+    assert 'answer 4' in prompt
+    assert 'question 3' not in prompt
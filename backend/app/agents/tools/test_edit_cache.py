@@ -0,0 +1,57 @@
+from io import BytesIO
+
+from PIL import Image
+
+from app.agents.tools.edit_cache import EditCache
+from services.image_store import ImageStore
+
+
+def _png(color) -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_edit_cache_hits_and_survives_restart(tmp_path):
+    original = tmp_path / 'dashboard.png'
+    original.write_bytes(_png('white'))
+
+    store = ImageStore(str(tmp_path / 'blobs'))
+    cache = EditCache(store, root=str(tmp_path / 'edits'))
+
+    key = cache.key_for(str(original), 'A dashboard', 'Add a chart')
+    assert cache.get(key) is None
+
+    edited = store.put_bytes(_png('red'))
+    cache.put(key, edited)
+
+    assert cache.key_for(str(original), 'A dashboard', 'Add a table') != key
+    assert cache.get(key) == edited
+    assert cache.stats.hit_rate == 0.5
+
+    restarted = EditCache(ImageStore(str(tmp_path / 'blobs')), root=str(tmp_path / 'edits'))
+    assert restarted.get(key) == edited
+
+
+def test_edit_cache_evicts_least_recently_used_and_keeps_blobs(tmp_path):
+    store = ImageStore(str(tmp_path / 'blobs'))
+    cache = EditCache(store, root=str(tmp_path / 'edits'), max_entries=2)
+
+    images = [store.put_bytes(_png(color)) for color in ('red', 'green', 'blue')]
+    cache.put('a', images[0])
+    cache.put('b', images[1])
+    cache.get('a')
+    cache.put('c', images[2])
+
+    assert cache.get('b') is None
+    # A session or client may still show the evicted edit
+    assert store.get(images[1].digest) == images[1]
+    assert cache.digests() == {images[0].digest, images[2].digest}
+    assert cache.get('a') == images[0]
+    assert cache.stats.evictions == 1
+    assert len(cache) == 2
+
+    # Two entries sharing a blob keep it referenced until both are gone
+    cache.put('d', images[0])
+    cache.put('e', images[0])
+    assert cache.digests() == {images[0].digest}
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from app.agents.tools.embedding_cache import DiskEmbeddingStore, EmbeddingCache, normalize_query
+from app.core.cache import LRUCache
+
+
+def test_normalize_query_collapses_near_verbatim_tasks():
+    assert normalize_query('  Add a   Dashboard\n for OrderSys. ') == normalize_query('add a dashboard for ordersys')
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats.evictions == 1
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(max_size=2, ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
+    assert cache.stats.expirations == 1
+
+
+def test_embedding_cache_is_keyed_by_model_and_persists_to_disk(tmp_path):
+    path = str(tmp_path / 'embeddings.db')
+    cache = EmbeddingCache(max_size=8, disk_path=path)
+    cache.put('text-embedding-3-small', 'Add a dashboard', [0.5, 0.25])
+
+    assert cache.get('text-embedding-3-large', 'Add a dashboard') is None
+    assert cache.get('text-embedding-3-small', 'add a dashboard') == [0.5, 0.25]
+
+    restarted = EmbeddingCache(max_size=8, disk_path=path)
+
+    assert restarted.get('text-embedding-3-small', 'Add a dashboard!') == [0.5, 0.25]
+    assert restarted.stats()['disk']['hits'] == 1
+
+
+def test_async_lookups_fall_through_to_disk(tmp_path):
+    path = str(tmp_path / 'embeddings.db')
+
+    async def scenario():
+        await EmbeddingCache(max_size=8, disk_path=path).aput('text-embedding-3-small', 'Add a dashboard', [0.5, 0.25])
+
+        restarted = EmbeddingCache(max_size=8, disk_path=path)
+        first = await restarted.aget('text-embedding-3-small', 'add a dashboard')
+        second = await restarted.aget('text-embedding-3-small', 'add a dashboard')
+        return restarted, first, second
+
+    restarted, first, second = asyncio.run(scenario())
+
+    assert first == second == [0.5, 0.25]
+    assert restarted.stats()['disk']['hits'] == 1
+    assert restarted.stats()['memory']['hits'] == 1
+
+
+def test_disk_store_is_trimmed_every_few_inserts(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path / 'embeddings.db'), max_entries=4, trim_every=3)
+    for i in range(5):
+        store.put(f'key-{i}', 'text-embedding-3-small', [float(i)])
+
+    # Over the limit until the next check, at the sixth insert
+    assert store.stats.evictions == 0
+    store.put('key-5', 'text-embedding-3-small', [5.0])
+
+    assert store.stats.evictions == 2
+    assert store._conn.execute('select count(*) from embeddings').fetchone() == (4,)
@@ -0,0 +1,180 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from app.agents.tools.knowledgebase import KnowledgeBase, ScreenInput, title_query
+from app.agents.tools.summaries import summary_hash
+from services.screen_service import ScreenProjection
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.requests = []
+        self.dimensions = []
+
+    def create(self, model, input, dimensions=None):
+        self.requests.append(input)
+        self.dimensions.append(dimensions)
+        # Returned out of order on purpose, OpenAI only guarantees `index`
+        data = [SimpleNamespace(index=i, embedding=[float(i + 1), 0.0]) for i in range(len(input))]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+class FakeScreenService:
+    dimensions = 2
+
+    def __init__(self):
+        self.saved = []
+
+    def save_all(self, screens):
+        self.saved.append(screens)
+
+
+def test_ingest_screens_embeds_and_writes_in_batches():
+    service = FakeScreenService()
+    kb = KnowledgeBase(service)
+    embeddings = FakeEmbeddings()
+    kb.openai = SimpleNamespace(embeddings=embeddings)
+
+    batch = [ScreenInput(title=f'Screen {i}', chunk=f'chunk {i}', imgs=[f'data/raw/{i}.png']) for i in range(5)]
+
+    report = kb.ingest_screens(batch, batch_size=2)
+
+    assert [len(r) for r in embeddings.requests] == [2, 2, 1]
+    # Embedded at the size of the stored catalog
+    assert embeddings.dimensions == [2, 2, 2]
+    assert [len(s) for s in service.saved] == [2, 2, 1]
+    assert [s.name for s in service.saved[0]] == ['Screen 0', 'Screen 1']
+    assert service.saved[0][1].embedding == [1.0, 0.0]
+    assert service.saved[2][0].imgs[0].img_url == 'data/raw/4.png'
+    assert report.screens == 5
+    assert report.batches == 3
+
+
+class FakeSummariser:
+    def summarise(self, details):
+        return f'summary of {details}'
+
+
+def test_ingest_screens_stores_versioned_summaries():
+    service = FakeScreenService()
+    kb = KnowledgeBase(service)
+    kb.openai = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    kb.ingest_screens([ScreenInput(title='Dashboard', chunk='widgets')], summariser=FakeSummariser())
+
+    screen = service.saved[0][0]
+    assert screen.summary == 'summary of widgets'
+    assert screen.summary_hash == summary_hash('widgets')
+
+
+def test_search_screens_drops_summaries_of_outdated_details():
+    fresh = ScreenProjection(id=1, name='A', details='new', distance=0.1, imgs=[], summary='fresh', summary_hash=summary_hash('new'))
+    stale = ScreenProjection(id=2, name='B', details='changed', distance=0.2, imgs=[], summary='stale', summary_hash=summary_hash('old'))
+
+    service = SimpleNamespace(dimensions=2, find_by_text=lambda query, title: [], find_by_similarity=lambda embedding, k=None: [fresh, stale])
+    kb = KnowledgeBase(service)
+    kb.openai = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    results = kb.search_screens('dashboard')
+
+    assert [r.summary for r in results] == ['fresh', None]
+
+
+def test_ingest_screens_embeds_sections_with_their_heading_path():
+    service = FakeScreenService()
+    kb = KnowledgeBase(service)
+    embeddings = FakeEmbeddings()
+    kb.openai = SimpleNamespace(embeddings=embeddings)
+
+    doc = '## Home Dashboard\n\nOverview.\n\n### Key Features\n\n#### Total Payables\n\nOutstanding bills.\n'
+    report = kb.ingest_screens([ScreenInput(title='Dashboard', chunk=doc), ScreenInput(title='Plain', chunk='no headings')])
+
+    dashboard, plain = service.saved[0]
+    assert [s.path for s in dashboard.sections] == ['Home Dashboard', 'Home Dashboard > Key Features > Total Payables']
+    assert embeddings.requests[1][1].startswith('Dashboard > Home Dashboard > Key Features > Total Payables\n')
+    # A screen without headings is one section sharing the screen embedding
+    assert len(plain.sections) == 1 and plain.sections[0].embedding == plain.embedding
+    assert report.sections == 3
+
+
+def test_title_query_strips_filler_words():
+    assert title_query('The  Product List screen') == 'product list'
+    assert title_query('Orders page view') == 'orders'
+
+
+def test_search_screens_answers_exact_titles_without_embedding():
+    hit = ScreenProjection(id=1, name='Product List', details='', distance=0.0, imgs=[], title_similarity=1.0)
+    embeddings = FakeEmbeddings()
+
+    service = SimpleNamespace(dimensions=2, find_by_text=lambda query, title: [hit], find_by_similarity=lambda embedding, k=None: [])
+    kb = KnowledgeBase(service)
+    kb.openai = SimpleNamespace(embeddings=embeddings)
+
+    results = kb.search_screens('product list screen')
+
+    assert [r.id for r in results] == [1]
+    assert embeddings.requests == []
+    assert kb.search_stats.title_hits == 1 and kb.search_stats.served_without_embedding_call == 1.0
+
+
+def test_search_screens_answers_titles_held_by_the_mirror_without_the_db():
+    hit = ScreenProjection(id=1, name='Product List', details='', distance=0.0, imgs=[], title_similarity=1.0)
+    text_queries = []
+
+    def find_by_text(query, title):
+        text_queries.append(title)
+        return []
+
+    mirror = SimpleNamespace(find_by_title=lambda title: [hit] if title == 'product list' else [], find_by_similarity=lambda embedding, k=None: [])
+    service = SimpleNamespace(dimensions=2, find_by_text=find_by_text)
+    kb = KnowledgeBase(service, vector_index=mirror)
+    kb.openai = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    assert [r.id for r in kb.search_screens('The product list screen')] == [1]
+    assert text_queries == []
+
+    kb.search_screens('where are unpaid bills')
+    assert text_queries == ['where are unpaid bills']
+
+
+def test_search_screens_fuses_vector_and_text_rankings():
+    def projection(id, **kwargs):
+        return ScreenProjection(id=id, name=f'S{id}', details='', distance=0.5, imgs=[], **kwargs)
+
+    vector = [projection(1, sections=['## Matched']), projection(2), projection(3)]
+    text = [projection(4, text_rank=0.1), projection(3, text_rank=0.9), projection(5, title_similarity=0.4)]
+
+    service = SimpleNamespace(dimensions=2, find_by_text=lambda query, title: text, find_by_similarity=lambda embedding, k=None: vector)
+    kb = KnowledgeBase(service)
+    kb.openai = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    results = kb.search_screens('where are unpaid bills')
+
+    # Screen 3 is found by both, screen 5 has no text match and only a weak title match
+    assert [r.id for r in results][:2] == [3, 1]
+    assert results[1].sections == ['## Matched']
+    assert 5 not in [r.id for r in results]
+    assert kb.search_stats.embedding_calls == 1
+
+
+def test_identical_searches_in_flight_share_one_execution():
+    hit = ScreenProjection(id=1, name='Dashboard', details='', distance=0.0, imgs=[], title_similarity=1.0)
+    calls = []
+
+    async def afind_by_text(query, title):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return [hit]
+
+    kb = KnowledgeBase(SimpleNamespace(dimensions=2, afind_by_text=afind_by_text))
+
+    async def burst():
+        return await asyncio.gather(*[kb.asearch_screens(q) for q in ['Add a dashboard', 'add a  dashboard.'] * 3])
+
+    results = asyncio.run(burst())
+
+    assert len(calls) == 1
+    assert all([r.id for r in result] == [1] for result in results)
+    assert results[0] is not results[1]
+    assert kb.search_flight.stats.coalesced == 5 and kb.search_flight.stats.ratio == 5 / 6
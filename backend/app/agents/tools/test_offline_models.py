@@ -0,0 +1,113 @@
+import asyncio
+import io
+
+import numpy
+import pytest
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from PIL import Image
+
+from app.agents.tools import models
+from app.agents.tools.offline_models import (
+    OfflineChatModel, OfflineEmbeddingClient, OfflineImageClient, OfflineModelError, OfflineProfile, offline_embedding
+)
+from app.core import metrics
+from app.core.config import config
+
+
+def test_chat_stream_is_deterministic_and_token_by_token():
+    llm = OfflineChatModel(completion_tokens=12)
+    messages = [HumanMessage(content='Add a filter to the product list')]
+
+    async def collect():
+        # langchain closes the stream with an empty chunk
+        return [chunk.content async for chunk in llm.astream(messages) if chunk.content]
+
+    first, second = asyncio.run(collect()), asyncio.run(collect())
+
+    assert first == second and len(first) == 12
+    assert asyncio.run(llm.ainvoke(messages)).content == ''.join(first)
+
+
+def test_chat_answers_the_feedback_schema_with_json():
+    llm = OfflineChatModel()
+    reply = llm.invoke([SystemMessage(content='Return JSON with fields yes_no and refined_query'), HumanMessage(content='yes')])
+
+    assert reply.content == '{"yes_no": true, "refined_query": null}'
+
+
+def test_failures_are_injected_at_the_configured_rate():
+    llm = OfflineChatModel(profile=OfflineProfile(failure_rate=0.5, failure_status=429, seed=7))
+    outcomes = []
+    for _ in range(200):
+        try:
+            llm.invoke([HumanMessage(content='hi')])
+            outcomes.append(True)
+        except OfflineModelError as e:
+            assert e.status_code == 429
+            outcomes.append(False)
+
+    assert 60 < outcomes.count(False) < 140
+
+
+def test_first_token_latency_and_token_rate():
+    llm = OfflineChatModel(completion_tokens=5, profile=OfflineProfile(latency_ms=50, tokens_per_second=100))
+
+    async def timings():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        arrivals = [loop.time() - started async for _ in llm.astream([HumanMessage(content='hi')])]
+        return arrivals
+
+    arrivals = asyncio.run(timings())
+
+    assert arrivals[0] >= 0.05
+    assert arrivals[-1] - arrivals[0] >= 0.04
+
+
+def test_embeddings_are_unit_length_and_closer_for_shared_words():
+    client = OfflineEmbeddingClient(dimensions=64)
+    resp = client.embeddings.create(model='m', input=['product list filter', 'filter the product list', 'cash flow chart'], dimensions=32)
+
+    vectors = numpy.asarray([d.embedding for d in resp.data])
+
+    assert vectors.shape == (3, 32)
+    assert numpy.allclose(numpy.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert offline_embedding('product list filter', 32) == resp.data[0].embedding
+
+
+def test_image_edit_returns_a_png_of_the_input_size():
+    client = OfflineImageClient()
+    source = Image.new('RGB', (40, 30), 'white')
+
+    resp = asyncio.run(client.aio.models.generate_content(model='m', contents=[('summary', 'task'), source]))
+    edited = Image.open(io.BytesIO(resp.parts[0].inline_data.data))
+
+    assert edited.format == 'PNG' and edited.size == (40, 30)
+
+
+def test_backend_is_selected_by_config(monkeypatch):
+    monkeypatch.setattr(config, 'MODEL_BACKEND', 'offline')
+    assert isinstance(models.chat_model('gpt-4o-mini', streaming=True).llm, OfflineChatModel)
+    assert isinstance(models.image_client().aio.models._models.profile, OfflineProfile)
+
+    monkeypatch.setattr(config, 'MODEL_BACKEND', 'mock')
+    with pytest.raises(ValueError):
+        models.embedding_clients()
+
+
+def test_chat_model_calls_are_metered(monkeypatch):
+    monkeypatch.setattr(config, 'MODEL_BACKEND', 'offline')
+    monkeypatch.setattr(config, 'OFFLINE_LATENCY_MS', 0)
+    monkeypatch.setattr(config, 'OFFLINE_COMPLETION_TOKENS', 8)
+    llm = models.chat_model('metered-model')
+    before = metrics.LLM_TIME_TO_FIRST_TOKEN.count('metered-model'), metrics.LLM_COMPLETION_TOKENS.count('metered-model')
+
+    async def stream():
+        return [chunk async for chunk in llm.astream([HumanMessage(content='hi')])]
+
+    asyncio.run(stream())
+
+    assert metrics.LLM_TIME_TO_FIRST_TOKEN.count('metered-model') == before[0] + 1
+    assert metrics.LLM_COMPLETION_TOKENS.count('metered-model') == before[1] + 1
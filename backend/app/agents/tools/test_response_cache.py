@@ -0,0 +1,75 @@
+import math
+
+from app.agents.tools import response_cache
+from app.agents.tools.response_cache import ResponseCache
+
+MODEL = 'gpt-4o-mini'
+
+
+def unit(*values):
+    norm = math.sqrt(sum(v * v for v in values))
+    return [v / norm for v in values]
+
+
+def test_similar_task_on_same_screen_hits():
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=10)
+    cache.put('Add a dashboard', unit(1, 0), 7, 'orders screen', MODEL, ['Spec', ' body'])
+
+    hit = cache.get(unit(1, 0.1), 7, 'orders screen', MODEL)
+
+    assert hit is not None and hit.chunks == ['Spec', ' body']
+    assert hit.hits == 1
+    assert cache.get(unit(1, 1), 7, 'orders screen', MODEL) is None
+    assert cache.get(unit(1, 0), 8, 'orders screen', MODEL) is None
+    assert cache.get(unit(1, 0), 7, 'orders screen', 'gpt-4o') is None
+    assert cache.stats.hits == 1 and cache.stats.misses == 3
+
+
+def test_reingested_screen_invalidates_its_answers():
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=10)
+    cache.put('Add a dashboard', unit(1, 0), 7, 'orders screen', MODEL, ['Spec'])
+
+    assert cache.get(unit(1, 0), 7, 'orders screen v2', MODEL) is None
+    assert cache.get(unit(1, 0), 7, 'orders screen', MODEL) is None
+    assert len(cache) == 0
+
+
+def test_expired_and_evicted_entries_miss(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: clock[0])
+
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=2)
+    cache.put('a', unit(1, 0), 1, 'screen 1', MODEL, ['a'])
+    cache.put('b', unit(1, 0), 2, 'screen 2', MODEL, ['b'])
+    cache.put('c', unit(1, 0), 3, 'screen 3', MODEL, ['c'])
+
+    assert cache.get(unit(1, 0), 1, 'screen 1', MODEL) is None
+    assert cache.stats.evictions == 1
+
+    clock[0] += 61
+    assert cache.get(unit(1, 0), 3, 'screen 3', MODEL) is None
+    assert cache.stats.expirations == 1
+
+
+def test_answers_are_only_reused_for_the_same_history():
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=10)
+    cache.put('Add a dashboard', unit(1, 0), 7, 'orders screen', MODEL, ['Generic spec'])
+    cache.put('Add a dashboard', unit(1, 0), 7, 'orders screen', MODEL, ['Follow-up spec'], history='user: make it dark')
+
+    assert cache.get(unit(1, 0), 7, 'orders screen', MODEL).chunks == ['Generic spec']
+    assert cache.get(unit(1, 0), 7, 'orders screen', MODEL, history='user: make it dark').chunks == ['Follow-up spec']
+    assert cache.get(unit(1, 0), 7, 'orders screen', MODEL, history='user: another session') is None
+
+    # New screen content drops the answers of every history
+    assert cache.get(unit(1, 0), 7, 'orders screen v2', MODEL) is None
+    assert len(cache) == 0
+
+
+def test_bucket_size_bounds_the_answers_scored_per_lookup():
+    cache = ResponseCache(threshold=0.95, ttl=60, max_entries=10, bucket_size=2)
+    for i, task in enumerate(('a', 'b', 'c')):
+        cache.put(task, unit(1, i), 7, 'orders screen', MODEL, [task])
+
+    assert cache.get(unit(1, 0), 7, 'orders screen', MODEL) is None
+    assert cache.get(unit(1, 2), 7, 'orders screen', MODEL).chunks == ['c']
+    assert cache.stats.evictions == 1 and len(cache) == 2
@@ -1,24 +1,31 @@
-import base64
-from io import BytesIO
+import asyncio
 import json
-from pathlib import Path
-from typing import Optional, TypedDict, List, Annotated, AsyncIterator
+from typing import Optional, List, AsyncIterator, Set
 from pydantic import BaseModel, Field, ValidationError
 
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from google import genai
+from langchain_core.messages import HumanMessage, SystemMessage
 
 from PIL import Image
 
 from app.agents.state_manager import AgentState, SearchResult, StateManager
-from app.agents.tools.knowledgebase import KnowledgeBase, Screen
+from app.agents.tools.knowledgebase import KnowledgeBase
+from app.agents.tools.conversation_memory import ConversationMemory
+from app.agents.tools.edit_cache import EditCache
+from app.agents.tools.models import chat_model, image_client
+from app.agents.tools.response_cache import ResponseCache
+from app.agents.tools.summaries import summary_hash, summary_messages
 from app.core.logging import get_logger
-from app.core.config import config
+from app.core.metrics import NODE_SECONDS, timed
+from app.core.singleflight import SingleFlight
+from services.conversation_writer import ConversationWriter
+from services.image_store import ImageStore, StoredImage
 
 logger = get_logger(__name__)
 
+GENERAL_MODEL = 'gpt-4o-mini'
+IMAGE_EDIT_MODEL = 'gemini-2.5-flash-image'
+
 
 class IntentSchema(BaseModel):
     task: str = Field(description="The task user wants agent to perform")
@@ -32,21 +39,29 @@ class FeedbackSchema(BaseModel):
 
 
 class AgentWorklow:
-    def __init__(self, kb: KnowledgeBase, state_manager: StateManager):
+    def __init__(self, kb: KnowledgeBase, state_manager: StateManager, image_store: Optional[ImageStore] = None, edit_cache: Optional[EditCache] = None,
+                 conversation_log: Optional[ConversationWriter] = None, response_cache: Optional[ResponseCache] = None):
         self.kb = kb
         self.sm = state_manager
-
-        self.general_llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=lambda: config.OPEN_AI_KEY if config.OPEN_AI_KEY else 'default-value',
+        self.images = image_store or ImageStore()
+        self.edit_cache = edit_cache
+        self.conversation_log = conversation_log
+        self.response_cache = response_cache
+        self.memory = ConversationMemory(model=GENERAL_MODEL)
+        # Background history compactions, referenced until done so they aren't garbage collected
+        self._compactions: Set[asyncio.Task] = set()
+
+        self.general_llm = chat_model(
+            GENERAL_MODEL,
             streaming=True,
             temperature=0.7,
             timeout=60.0
         )
 
-        self.image_llm = genai.Client(
-            api_key=config.GOOGLE_AI_KEY
-        )
+        self.image_llm = image_client()
+
+        self.summarise_flight = SingleFlight('summarise')
+        self.edit_flight = SingleFlight('image_edit')
 
         self.workflow = None
         self._initialize()
@@ -55,13 +70,17 @@ class AgentWorklow:
         """Initialize langgraph workflow to be used over chat API"""
         workflow = StateGraph(AgentState)
         
-        workflow.add_node("analyze_intent", self._analyze_intent_node)
-        workflow.add_node("search_knowledge_base", self._search_kb_node)
-        workflow.add_node("summarise_view", self._summarise_view)
-        workflow.add_node("edit_image", self._edit_image_node)
-        workflow.add_node("generate_response", self._generate_response_node)
-        workflow.add_node("send_response", self._send_response_node)
-        workflow.add_node("feedback_loop", self._feedback_loop_node)
+        nodes = {
+            "analyze_intent": self._analyze_intent_node,
+            "search_knowledge_base": self._search_kb_node,
+            "summarise_view": self._summarise_view,
+            "edit_image": self._edit_image_node,
+            "generate_response": self._generate_response_node,
+            "send_response": self._send_response_node,
+            "feedback_loop": self._feedback_loop_node,
+        }
+        for name, node in nodes.items():
+            workflow.add_node(name, timed(NODE_SECONDS, name)(node))
         
         workflow.set_entry_point("analyze_intent")
         
@@ -85,30 +104,42 @@ class AgentWorklow:
         logger.info("LangGraph workflow initialized successfully")
 
     
-    def _summarise_view(self, state: AgentState) -> AgentState:
+    async def _summarise_view(self, state: AgentState) -> AgentState:
         logger.debug('Inside _summarise_view')
         try:
             if not state['search_results']:
                 return state
 
+            # The view summary describes the top result, the screen whose image is edited
+            top_result = state['search_results'][0]
+
+            if top_result.get('summary'):
+                logger.debug('Using stored view summary')
+                state['view_summary'] = top_result['summary']
+                return state
+
+            # Not summarised at ingest time, or details changed since. Summarise once and store it.
             context = self._build_kb_context(state.get('search_results'))
 
-            system_prompt = f"""You are a helpful assistant, who can summarise the screen given its features and details.
-Given below the screen details. Provide suggestion for user query.
+            async def summarise() -> str:
+                response = await self.general_llm.ainvoke(summary_messages(context))
 
-Screen Details:
-{context}
-"""
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content='Provide summary for the screen in such a way that one can visualise as it might be in reality. Summary must be under 200 words')
-            ]
-            response = self.general_llm.invoke(messages)
+                if top_result.get('screen_id') is not None:
+                    try:
+                        await self.kb.asave_summary(top_result['screen_id'], top_result['content'], response.content)
+                    except Exception as e:
+                        logger.error(f'Error occurred while storing the screen summary : {e}')
+
+                return response.content
+
+            # Users landing on the same unsummarised screen at once share one LLM call and one write
+            summary = await self.summarise_flight.ado((top_result.get('screen_id'), summary_hash(context)), summarise)
 
-            state['view_summary'] = response.content
+            state['view_summary'] = summary
+            top_result['summary'] = summary
 
         except Exception as e:
-            logger.error('Error occurred while summarising the screen : ', e)
+            logger.error(f'Error occurred while summarising the screen : {e}')
         
         return state
 
@@ -123,7 +154,7 @@ Screen Details:
         return 'generate_response'
 
 
-    def _feedback_loop_node(self, state: AgentState) -> AgentState:
+    async def _feedback_loop_node(self, state: AgentState) -> AgentState:
         try:
             # Since, must have reached here only when user feedback is already asked!
             state['need_user_clarification'] = False
@@ -141,7 +172,7 @@ Return your response as a valid JSON object with these exact fields:
                 HumanMessage(content=user_input)
             ]
 
-            resp = self.general_llm.invoke(instructions)
+            resp = await self.general_llm.ainvoke(instructions)
 
             try:
                 feedback_dict = json.loads(resp.content)
@@ -160,15 +191,15 @@ Return your response as a valid JSON object with these exact fields:
 
                 return state
             except Exception as ex:
-                logger.error('Error occurred while parsing feedback', ex)
+                logger.error(f'Error occurred while parsing feedback : {ex}')
                 state['error'] = str(ex)
         except Exception as e:
-            logger.error('Error occurred while providing feedback', e)
+            logger.error(f'Error occurred while providing feedback : {e}')
             state['error'] = str(e)
         return state
 
 
-    def _edit_image_node(self, state:  AgentState) -> AgentState:
+    async def _edit_image_node(self, state:  AgentState) -> AgentState:
         logger.debug('Inside _edit_image_node')
         try:
             if not state['original_img']:
@@ -181,40 +212,60 @@ Return your response as a valid JSON object with these exact fields:
                 state.get('task')
             )
 
-            root_folder = Path(__file__).parent.parent.parent
-
             original_image_path = state['original_img']
-            image_name = original_image_path.split('/')[2]
-            image = Image.open(state['original_img'])
 
-            resp = self.image_llm.models.generate_content(
-                model='gemini-2.5-flash-image',
-                contents=[prompts, image],
-            )
+            cache_key = None
+            if self.edit_cache is not None:
+                cache_key = await asyncio.to_thread(self.edit_cache.key_for, original_image_path, view_summary, state.get('task'), IMAGE_EDIT_MODEL)
 
-            edited_img_path =f'data/edited/{image_name}'
+                # User rejected the previous edit, a cached result would only repeat it
+                cached = None if state.get('redo_edit') else await asyncio.to_thread(self.edit_cache.get, cache_key)
+                if cached is not None:
+                    logger.debug(f'Edited image served from cache : {cached.digest}')
 
-            final_location = str(root_folder / edited_img_path)
+                    state['edited_img'] = cached.digest
+                    state['image_mime'] = cached.mime_type
+                    state['need_user_clarification'] = True
+                    state['redo_edit'] = False
+                    return state
 
-            logger.debug(f'Edited image is being saved to folder : {final_location}')
+            async def edit() -> Optional[StoredImage]:
+                image = await asyncio.to_thread(self._load_image, original_image_path)
 
-            for part in resp.parts:
-                if part.inline_data is not None:
-                    image_mime = part.inline_data.mime_type
-                    image_part = part.as_image()
-                    image_part.save(final_location)
-                    
-                    state['edited_img'] = final_location
-                    state['image_mime'] = image_mime
-                    state['need_user_clarification'] = True
+                resp = await self.image_llm.aio.models.generate_content(
+                    model=IMAGE_EDIT_MODEL,
+                    contents=[prompts, image],
+                )
+
+                stored = None
+                for part in resp.parts:
+                    if part.inline_data is not None:
+                        # Gemini already returns encoded image bytes, store them as is under their digest
+                        stored = await asyncio.to_thread(self.images.put_bytes, part.inline_data.data)
+
+                        logger.debug(f'Edited image stored as : {stored.digest}')
+
+                        if cache_key is not None:
+                            await asyncio.to_thread(self.edit_cache.put, cache_key, stored)
+
+                return stored
+
+            # Identical edits requested at once share one Gemini call
+            flight_key = cache_key or json.dumps([IMAGE_EDIT_MODEL, original_image_path, view_summary or '', state.get('task') or ''])
+            stored = await self.edit_flight.ado(flight_key, edit)
+
+            if stored is not None:
+                state['edited_img'] = stored.digest
+                state['image_mime'] = stored.mime_type
+                state['need_user_clarification'] = True
 
             state['redo_edit'] = False
         except Exception as e:
-            logger.error('Error while editing image', e)
+            logger.error(f'Error while editing image : {e}')
 
         return state
 
-    def _analyze_intent_node(self, state: AgentState) -> AgentState:
+    async def _analyze_intent_node(self, state: AgentState) -> AgentState:
         try:
             if state.get('need_user_clarification'):
                     return state
@@ -235,7 +286,7 @@ Return your response as a valid JSON object with these exact fields:
                     HumanMessage(content=state['user_input'])
                 ]
 
-                resp = self.general_llm.invoke(messages)
+                resp = await self.general_llm.ainvoke(messages)
 
                 state['task'] = resp.content
             except (json.JSONDecodeError, ValidationError) as e:
@@ -256,16 +307,19 @@ Return your response as a valid JSON object with these exact fields:
             return 'feedback_loop'
         return 'search_knowledge_base'
 
-    def _search_kb_node(self, state: AgentState) -> AgentState:
+    async def _search_kb_node(self, state: AgentState) -> AgentState:
         logger.info(f"Searching knowledge base for task: {state['task']}")
         
         try:
-            results = self.kb.search_screens(state['task'])
+            results = await self.kb.asearch_screens(state['task'])
 
             if not results:
                 return state
             
-            state['search_results'] = [SearchResult(content=s.content, img_urls=[img.url for img in s.imgs]) for s in results]
+            state['search_results'] = [
+                SearchResult(screen_id=s.id, content=s.content, img_urls=[img.url for img in s.imgs], summary=s.summary, sections=s.sections)
+                for s in results
+            ]
 
             # TODO: Check how to pick multiple results instead of 1
             state['original_img'] = results[0].imgs[0].url
@@ -277,7 +331,7 @@ Return your response as a valid JSON object with these exact fields:
         
         return state
 
-    def _generate_response_node(self, state: AgentState) -> AgentState:
+    async def _generate_response_node(self, state: AgentState) -> AgentState:
         logger.info("Generating response with LLM")
 
         if state.get('need_user_clarification'):
@@ -287,7 +341,7 @@ Return your response as a valid JSON object with these exact fields:
 
         return state
 
-    def _send_response_node(self, state: AgentState) -> AgentState:
+    async def _send_response_node(self, state: AgentState) -> AgentState:
         logger.debug(f'Inside _send_response_node with state {state}')
 
         if state.get('error'):
@@ -302,9 +356,13 @@ Return your response as a valid JSON object with these exact fields:
         """Create a new session and return session ID"""
         return self.sm.create_session()
 
+    async def astart_session(self) -> str:
+        """Create a new session without blocking the event loop and return session ID"""
+        return await self.sm.acreate_session()
+
     
-    def process_message(self, session_id: str, user_input: str) -> str:
-        state = self.sm.get_state(session_id)
+    async def process_message(self, session_id: str, user_input: str) -> str:
+        state = await self.sm.aget_state(session_id)
         
         if not state:
             raise ValueError(f'Session with {session_id} not found')
@@ -318,17 +376,17 @@ Return your response as a valid JSON object with these exact fields:
         })
         
         try:
-            final_state = self.workflow.invoke(workflow_state)
+            final_state = await self.workflow.ainvoke(workflow_state)
             
             if final_state.get('error'):
                 return final_state['error']
             
-            response = self._generate_final_response(final_state)
+            response = await self._generate_final_response(final_state)
             
             state.messages.append(user_input)
             state.task = final_state.get('task', '')
             state.search_results = [s.name for s in final_state.get('kb_results', [])]
-            self.sm.update_state(session_id, state)
+            await self.sm.aupdate_state(session_id, state)
             
             return response
             
@@ -342,7 +400,7 @@ Return your response as a valid JSON object with these exact fields:
         Process a message through the workflow with streaming support
         This method yields tokens as they arrive from OpenAI
         """
-        state = self.sm.get_state(session_id)
+        state = await self.sm.aget_state(session_id)
         
         if not state:
             yield "Error: Session not found"
@@ -374,11 +432,12 @@ Return your response as a valid JSON object with these exact fields:
                 current_state = node_state
 
                 if node_name == 'generate_response':
-                    async for token in self._stream_generate_response(node_state):
-                        logger.debug(f'returning token : {token}')
-                        full_response.append(token)
+                    with NODE_SECONDS.time('stream_response'):
+                        async for token in self._stream_generate_response(node_state):
+                            logger.debug(f'returning token : {token}')
+                            full_response.append(token)
 
-                        yield token
+                            yield token
 
                 if node_state.get('error'):
                     yield f"\nError: {node_state['error']}"
@@ -389,12 +448,21 @@ Return your response as a valid JSON object with these exact fields:
                 state['messages'].append({'role': 'user', 'content': user_input})
                 assistant_msgs = [json.loads(r) for r in full_response]
 
+                if self.conversation_log is not None:
+                    self.conversation_log.record(session_id, 'user', user_input)
+
                 if assistant_msgs:
+                    images = []
                     for m in assistant_msgs:
-                        if m.get('mime') == 'image/png':
+                        if m.get('mime', '').startswith('image/'):
+                            images.append(m['content'])
                             m['content'] = '[image-data-noout]'
                     
-                    state['messages'].append({'role': 'assistant', 'content': '\n'.join([m['content'] for m in assistant_msgs])})
+                    assistant_content = '\n'.join([m['content'] for m in assistant_msgs])
+                    state['messages'].append({'role': 'assistant', 'content': assistant_content})
+
+                    if self.conversation_log is not None:
+                        self.conversation_log.record(session_id, 'assistant', assistant_content, {'images': images} if images else None)
 
                 state['task'] = current_state.get('task', '')
                 state['search_results'] = [s for s in current_state.get('search_results', [])]
@@ -407,32 +475,45 @@ Return your response as a valid JSON object with these exact fields:
                 state['error'] = current_state.get('error')
                 state['redo_edit'] = current_state.get('redo_edit')
 
-                self.sm.update_state(session_id, state)
+                await self.sm.aupdate_state(session_id, state)
+
+                # Summarising is another LLM round trip, it runs after the stream ends instead of holding it open
+                if self.memory.needs_compaction(state):
+                    task = asyncio.create_task(self._compact_history(session_id))
+                    self._compactions.add(task)
+                    task.add_done_callback(self._compactions.discard)
 
         except Exception as e:
             logger.error(f"Error in streaming message processing: {e}")
             yield f"\n\nError: {str(e)}"
 
-    def _image_to_base64_with_details(self, img_loc: str) -> dict:
+    async def _compact_history(self, session_id: str):
+        """Fold the oldest messages of a session into its summary, unless a newer turn rewrote them meanwhile"""
         try:
-            root_folder = Path(__file__).parent.parent.parent
-
-            with Image.open(root_folder / img_loc) as img:
-                bufferred = BytesIO()
-                img.save(bufferred, format=img.format or 'PNG')
-                img_bytes = bufferred.getvalue()
-
-                img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-
-                return {
-                    'content': img_base64,
-                    'mime_type': f'image/{(img.format or 'png').lower()}',
-                    'height': img.width,
-                    'width': img.width,
-                }
-
+            state = await self.sm.aget_state(session_id)
+            if not state:
+                return
+
+            messages = list(state['messages'])
+            compacted: AgentState = {**state, 'messages': list(messages)}
+            if not await self.memory.acompact(compacted, self.general_llm):
+                return
+
+            current = await self.sm.aget_state(session_id)
+            if not current or current.get('summary') != state.get('summary') or current['messages'][:len(messages)] != messages:
+                logger.debug(f'Session {session_id} changed while summarising, compaction left to the next turn')
+                return
+
+            current['summary'] = compacted['summary']
+            del current['messages'][:len(messages) - len(compacted['messages'])]
+            await self.sm.aupdate_state(session_id, current)
         except Exception as e:
-            raise e
+            logger.error(f"Error summarising conversation history: {e}")
+
+    def _load_image(self, img_loc: str) -> Image.Image:
+        with Image.open(img_loc) as img:
+            img.load()
+            return img
 
     async def _stream_generate_response(self, state: AgentState) -> AsyncIterator[str]:
         """
@@ -443,9 +524,11 @@ Return your response as a valid JSON object with these exact fields:
         if state.get('edited_img') and state.get('need_user_clarification'):
             try:
                 yield json.dumps({"content": state.get('agent_query'), "mime": "text/plain"})
-                img_loc = state.get('edited_img')
-                img_b64_details = self._image_to_base64_with_details(img_loc)
-                yield json.dumps({"content": img_b64_details.get('content'), "mime": img_b64_details.get('mime_type')})
+                stored = await asyncio.to_thread(self.images.get, state.get('edited_img'))
+                if stored is None:
+                    raise FileNotFoundError(f"Edited image {state.get('edited_img')} not found")
+
+                yield json.dumps({"content": stored.url, "mime": stored.mime_type, "width": stored.width, "height": stored.height})
             except Exception as e:
                 yield json.dumps({"content": f"Error generating response: {str(e)}", "mime": "text/plain"})
             
@@ -453,7 +536,7 @@ Return your response as a valid JSON object with these exact fields:
         else:
             kb_context = self._build_kb_context(state['search_results'])
 
-            conversations = '\n'.join([f'{m["role"]} : {m["content"]}' for m in state.get('messages')])
+            conversations = self.memory.render(state)
             
             system_prompt = (
                 "You are an AI assistant helping user with ideation, develop, evaluate & learning in Software Development lifecycle (SDLC)."
@@ -473,11 +556,32 @@ Return your response as a valid JSON object with these exact fields:
                 SystemMessage(content=system_prompt),
                 HumanMessage(content=state['task'])
             ]
+
+            top_result = state['search_results'][0] if state['search_results'] else None
+            task_embedding = None
+            if self.response_cache is not None and top_result and top_result.get('screen_id') is not None:
+                try:
+                    # The search already embedded the task, unless it was answered without an embedding
+                    task_embedding = await self.kb.acached_query_embedding(state['task'])
+                    cached = self.response_cache.get(task_embedding, top_result['screen_id'], top_result['content'], GENERAL_MODEL, conversations) if task_embedding else None
+                    if cached is not None:
+                        # Replay through the same token path, without pacing
+                        for content in cached.chunks:
+                            yield json.dumps({"content": content, "mime": "text/plain"})
+                        return
+                except Exception as e:
+                    logger.warning(f"Response cache lookup failed, generating instead: {e}")
+                    task_embedding = None
         
             try:
+                chunks = []
                 async for chunk in self.general_llm.astream(messages):
                     if hasattr(chunk, 'content') and chunk.content:
+                        chunks.append(chunk.content)
                         yield json.dumps({"content": chunk.content, "mime": "text/plain"})
+
+                if task_embedding and chunks:
+                    self.response_cache.put(state['task'], task_embedding, top_result['screen_id'], top_result['content'], GENERAL_MODEL, chunks, conversations)
                         
                 logger.debug('Completed _stream_generate_response')
             except Exception as e:
@@ -485,7 +589,7 @@ Return your response as a valid JSON object with these exact fields:
                 yield json.dumps({"content": f"Error generating response: {str(e)}", "mime": "text/plain"})
 
 
-    def _generate_final_response(self, state: AgentState) -> str:
+    async def _generate_final_response(self, state: AgentState) -> str:
         """Generate final response using LLM (non-streaming)"""
         logger.debug('Inside _generate_final_response...')
         kb_context = self._build_kb_context(state['search_results'])
@@ -503,7 +607,7 @@ Suggest specific changes or improvements that align with the user's requirements
             HumanMessage(content=state['user_input'])
         ]
         
-        response = self.general_llm.invoke(messages)
+        response = await self.general_llm.ainvoke(messages)
 
         logger.debug('_generate_final_response completed...')
         return response.content
@@ -517,8 +621,12 @@ Suggest specific changes or improvements that align with the user's requirements
 
         # TODO: Hardcoding top result for now, have to check what else can be done here?
         result = kb_results[0]
-            
-        context_parts.append(result.get('content'))
+
+        # Only the sections relevant to the task when the screen matched on them
+        if result.get('sections'):
+            context_parts.extend(result['sections'])
+        else:
+            context_parts.append(result.get('content'))
         
         logger.debug('_build_kb_context successfully processed')
-        return "\n".join(context_parts)
\ No newline at end of file
+        return "\n\n".join(context_parts)
\ No newline at end of file
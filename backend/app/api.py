@@ -1,16 +1,24 @@
+import asyncio
 from contextlib import asynccontextmanager
 import json
-from fastapi import FastAPI, HTTPException
+import math
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from app.agents.worklow import AgentWorklow
-from app.agents.state_manager import StateManager
-from app.agents.tools.knowledgebase import KnowledgeBase
+from app.container import container
+from app.core import metrics
+from app.core.config import config
+from app.core.hedging import deadline, within_deadline
+from app.core.scheduler import scheduler
 from app.core.logging import get_logger
-from services.screen_service import ScreenService
+
+if TYPE_CHECKING:
+    from app.agents.worklow import AgentWorklow
 
 logger = get_logger(__name__)
 
@@ -31,14 +39,88 @@ class ChatResponse(BaseModel):
     response: str
     session_id: str
 
+async def get_agent_workflow() -> 'AgentWorklow':
+    """Returns the workflow singleton, building it off the event loop on first use"""
+    if container.is_initialized('agent_workflow'):
+        return container.agent_workflow
+
+    return await asyncio.to_thread(lambda: container.agent_workflow)
+
+
+def _log_warm_up(task: asyncio.Task):
+    if task.cancelled():
+        return
+
+    if task.exception():
+        logger.error(f"Error warming up workflow, will retry on first request: {task.exception()}")
+    else:
+        logger.info("LangGraph workflow initialized and ready")
+
+
+async def reap_sessions():
+    state_manager = await asyncio.to_thread(lambda: container.state_manager)
+    await state_manager.run_reaper(config.SESSION_REAPER_INTERVAL)
+
+
+async def collect_images():
+    image_store, state_manager, edit_cache = await asyncio.to_thread(
+        lambda: (container.image_store, container.state_manager, container.edit_cache)
+    )
+
+    async def referenced():
+        # Edited images of stored sessions and cached edits, anything else only lives out its retention
+        digests = await state_manager.store.aedited_images()
+        if edit_cache is not None:
+            digests |= edit_cache.digests()
+        return digests
+
+    await image_store.run_collector(config.IMAGE_GC_INTERVAL, config.IMAGE_RETENTION_SECONDS, referenced)
+
+
+def build_vector_indexes():
+    try:
+        container.screen_service.ensure_vector_indexes()
+    except Exception as e:
+        logger.error(f"Error building vector indexes: {e}")
+
+
+async def refresh_screen_index():
+    screen_index = await asyncio.to_thread(lambda: container.screen_index)
+    await screen_index.run_refresher(config.VECTOR_MIRROR_REFRESH_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     logger.info("Starting Agentic Workflow API...")
-    logger.info("LangGraph workflow initialized and ready")
+
+    warm_up = None
+    if config.EAGER_WARM_UP:
+        # Accept connections right away, requests arriving before warm up completes share the same construction
+        warm_up = asyncio.create_task(get_agent_workflow())
+        warm_up.add_done_callback(_log_warm_up)
+
+        # Builds can take minutes on a large catalog, a daemon thread holds up neither requests nor shutdown
+        threading.Thread(target=build_vector_indexes, name='vector-index-build', daemon=True).start()
+
+    background = [asyncio.create_task(reap_sessions()), asyncio.create_task(collect_images())]
+    if config.VECTOR_MIRROR_ENABLED:
+        background.append(asyncio.create_task(refresh_screen_index()))
 
     yield
 
-    state_manager.clear_expired()
+    for task in background:
+        task.cancel()
+
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+
+    # Flushes queued conversation messages, off the loop so in-flight responses can finish
+    await asyncio.to_thread(container.shutdown)
+
+    if container.is_initialized('screen_service'):
+        from app.core.pg import dispose_async_engine
+        await dispose_async_engine()
+
     logger.info("Shutting down Agentic Workflow API...")
 
 
@@ -59,11 +141,6 @@ app.add_middleware(
     allow_headers=['*']
 )
 
-state_manager = StateManager(ttl=30)
-screen_service = ScreenService()
-knowledge_base = KnowledgeBase(screen_service)
-agent_workflow = AgentWorklow(knowledge_base, state_manager)
-
 
 @app.get("/")
 async def root():
@@ -84,7 +161,8 @@ async def create_session():
         SessionResponse with the new session_id
     """
     try:
-        session_id = agent_workflow.start_session()
+        agent_workflow = await get_agent_workflow()
+        session_id = await agent_workflow.astart_session()
         logger.info(f"New session created: {session_id}")
         return SessionResponse(session_id=session_id)
     except Exception as e:
@@ -104,14 +182,17 @@ async def chat(request: ChatRequest) -> ChatResponse:
         ChatResponse with the agent's response
     """
     try:
+        agent_workflow = await get_agent_workflow()
+
         # Create session if not provided
         session_id = request.session_id
         if not session_id:
-            session_id = agent_workflow.start_session()
+            session_id = await agent_workflow.astart_session()
             logger.info(f"Created new session: {session_id}")
         
         # Process message
-        response = agent_workflow.process_message(session_id, request.message)
+        with deadline(config.CHAT_DEADLINE_SECONDS):
+            response = await agent_workflow.process_message(session_id, request.message)
         
         return ChatResponse(
             response=response,
@@ -158,28 +239,56 @@ async def chat_stream(request: ChatRequest):
         for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
             print(chunk, end='', flush=True)
     """
+    # Shed load before any work when model calls would queue past the SLO, the client can retry
+    rejection = scheduler.admission()
+    if rejection is not None:
+        logger.warning(f"Rejecting chat stream with {rejection.status_code}: {rejection.reason}")
+        raise HTTPException(
+            status_code=rejection.status_code,
+            detail=rejection.reason,
+            headers={"Retry-After": str(math.ceil(rejection.retry_after))}
+        )
+
     try:
+        agent_workflow = await get_agent_workflow()
+
         session_id = request.session_id
         if not session_id:
-            session_id = agent_workflow.start_session()
+            session_id = await agent_workflow.astart_session()
             logger.info(f"Created new session for streaming: {session_id}")
         
         async def generate_stream():
+            started = time.perf_counter()
+            sent = 0
             try:
                 yield '{"role": "assistant", "content": "START"}\n\n'
 
-                async for token in agent_workflow.stream_process_message(
-                    session_id, 
-                    request.message
+                # Model calls of the turn, retries included, and the stream itself end with the request's deadline
+                async for token in within_deadline(
+                    agent_workflow.stream_process_message(session_id, request.message),
+                    config.CHAT_DEADLINE_SECONDS
                 ):
                     t_result = json.loads(token)
-                    yield json.dumps({"role": "assistant", "content": t_result['content'], "mimeType": t_result['mime']})+'\n\n'
+                    event = {"role": "assistant", "content": t_result['content'], "mimeType": t_result['mime']}
+                    if 'width' in t_result:
+                        event['width'] = t_result['width']
+                        event['height'] = t_result['height']
+                    chunk = json.dumps(event)+'\n\n'
+
+                    if not sent:
+                        metrics.STREAM_FIRST_EVENT_SECONDS.observe(time.perf_counter() - started)
+                    sent += len(chunk)
+
+                    yield chunk
                 
                 yield '{"role": "assistant", "content": "END"}\n\n'
                 
             except Exception as e:
                 logger.error(f"Error in stream generation: {e}")
                 yield json.dumps({"role": "assistant", "content": str(e)}) + '\n\n'
+            finally:
+                metrics.STREAM_SECONDS.observe(time.perf_counter() - started)
+                metrics.STREAM_BYTES.observe(sent)
         
         return StreamingResponse(
             generate_stream(),
@@ -199,6 +308,46 @@ async def chat_stream(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus scrape endpoint: node, LLM, embedding and DB histograms, plus the cache and
+    writer counters of the singletons built so far
+    """
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    return Response(metrics.registry.render(container.stats()), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/images/{digest}")
+async def get_image(digest: str, request: Request, width: Optional[int] = None, format: Optional[str] = None):
+    """
+    Serve a stored image by its content digest, optionally resized and/or re-encoded
+
+    Args:
+        digest: sha256 of the stored image bytes
+        width: Thumbnail width, snapped up to a supported size
+        format: One of webp, png or jpeg
+
+    Returns:
+        The image, immutable and cacheable, with byte range support
+    """
+    try:
+        path, mime_type, etag = await asyncio.to_thread(container.image_store.variant, digest, format, width)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Image {digest} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type=mime_type, headers=headers)
+
+
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """
@@ -211,7 +360,9 @@ async def delete_session(session_id: str):
         Status message
     """
     try:
-        state_manager.clear_expired()
+        # Building the postgres store runs its migrations, the store's async methods keep the DB off the loop
+        state_manager = await asyncio.to_thread(lambda: container.state_manager)
+        await state_manager.aclear_expired()
         return {"status": "success", "message": "Expired sessions cleared"}
     except Exception as e:
         logger.error(f"Error clearing sessions: {e}")
@@ -0,0 +1,207 @@
+import threading
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from app.core.config import config
+from app.core.logging import get_logger
+from app.core.scheduler import scheduler
+from app.core.singleflight import coalescing_stats
+
+if TYPE_CHECKING:
+    from app.agents.session_store import SessionStore
+    from app.agents.state_manager import StateManager
+    from app.agents.tools.edit_cache import EditCache
+    from app.agents.tools.knowledgebase import KnowledgeBase
+    from app.agents.tools.response_cache import ResponseCache
+    from app.agents.worklow import AgentWorklow
+    from services.conversation_writer import ConversationWriter
+    from services.image_store import ImageStore
+    from services.screen_index import ScreenVectorIndex
+    from services.screen_service import ScreenService
+
+logger = get_logger(__name__)
+
+
+class Container:
+    """
+    Lazily constructed application singletons. Heavy modules (LangGraph, LLM clients, SQLAlchemy
+    models) are only imported, and DB migrations only run, when a singleton is first requested.
+    """
+
+    def __init__(self):
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                logger.info(f'Initializing {name}')
+                instance = factory()
+                self._instances[name] = instance
+
+        return instance
+
+    def is_initialized(self, name: str) -> bool:
+        return name in self._instances
+
+    def override(self, name: str, instance: Any):
+        """Replace a singleton, e.g. with a stand-in for tests"""
+        with self._lock:
+            self._instances[name] = instance
+
+    @property
+    def session_store(self) -> 'SessionStore':
+        def build():
+            if config.SESSION_STORE == 'postgres':
+                from services.session_store import PostgresSessionStore
+                return PostgresSessionStore()
+
+            if config.SESSION_STORE != 'memory':
+                raise ValueError(f'Unsupported session store {config.SESSION_STORE}, expected memory or postgres')
+
+            from app.agents.session_store import InMemorySessionStore
+            return InMemorySessionStore(
+                stripes=config.SESSION_STORE_STRIPES,
+                max_sessions=config.SESSION_MAX_SESSIONS,
+                max_bytes=config.SESSION_MAX_BYTES
+            )
+
+        return self._get('session_store', build)
+
+    @property
+    def state_manager(self) -> 'StateManager':
+        def build():
+            from app.agents.state_manager import StateManager
+            return StateManager(ttl=config.SESSION_TTL_MINUTES, store=self.session_store)
+
+        return self._get('state_manager', build)
+
+    @property
+    def screen_service(self) -> 'ScreenService':
+        def build():
+            from services.screen_service import ScreenService
+            return ScreenService()
+
+        return self._get('screen_service', build)
+
+    @property
+    def screen_index(self) -> Optional['ScreenVectorIndex']:
+        def build():
+            from services.screen_index import ScreenVectorIndex
+            index = ScreenVectorIndex(self.screen_service, snapshot_path=config.VECTOR_MIRROR_PATH)
+            index.load()
+            return index
+
+        if not config.VECTOR_MIRROR_ENABLED:
+            return None
+
+        return self._get('screen_index', build)
+
+    @property
+    def image_store(self) -> 'ImageStore':
+        def build():
+            from services.image_store import ImageStore
+            return ImageStore()
+
+        return self._get('image_store', build)
+
+    @property
+    def edit_cache(self) -> Optional['EditCache']:
+        def build():
+            from app.agents.tools.edit_cache import EditCache
+            return EditCache(self.image_store)
+
+        if not config.EDIT_CACHE_ENABLED:
+            return None
+
+        return self._get('edit_cache', build)
+
+    @property
+    def response_cache(self) -> Optional['ResponseCache']:
+        def build():
+            from app.agents.tools.response_cache import ResponseCache
+            return ResponseCache()
+
+        if not config.RESPONSE_CACHE_ENABLED:
+            return None
+
+        return self._get('response_cache', build)
+
+    @property
+    def conversation_writer(self) -> Optional['ConversationWriter']:
+        def build():
+            from services.conversation_service import ConversationService
+            from services.conversation_writer import ConversationWriter
+            return ConversationWriter(ConversationService())
+
+        if not config.CONVERSATION_PERSISTENCE:
+            return None
+
+        return self._get('conversation_writer', build)
+
+    @property
+    def knowledge_base(self) -> 'KnowledgeBase':
+        def build():
+            from app.agents.tools.knowledgebase import KnowledgeBase
+            return KnowledgeBase(self.screen_service, vector_index=self.screen_index)
+
+        return self._get('knowledge_base', build)
+
+    @property
+    def agent_workflow(self) -> 'AgentWorklow':
+        def build():
+            from app.agents.worklow import AgentWorklow
+            return AgentWorklow(
+                self.knowledge_base, self.state_manager, self.image_store, self.edit_cache,
+                conversation_log=self.conversation_writer, response_cache=self.response_cache
+            )
+
+        return self._get('agent_workflow', build)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the singletons built so far, nothing is constructed just to report on it"""
+        stats: Dict[str, Any] = {}
+
+        if self.is_initialized('session_store'):
+            stats['session_store'] = self.session_store.stats()
+
+        if self.is_initialized('knowledge_base'):
+            stats['search'] = self.knowledge_base.search_stats.as_dict()
+            stats['embedding_cache'] = self.knowledge_base.embedding_cache.stats()
+
+        if self.is_initialized('response_cache'):
+            stats['response_cache'] = self.response_cache.stats.as_dict()
+
+        if self.is_initialized('edit_cache'):
+            stats['edit_cache'] = self.edit_cache.stats.as_dict()
+
+        if self.is_initialized('conversation_writer'):
+            stats['conversation_writer'] = self.conversation_writer.stats.as_dict()
+
+        llm_lanes = scheduler.stats()
+        if llm_lanes:
+            stats['llm'] = llm_lanes
+
+        coalescing = coalescing_stats()
+        if coalescing:
+            stats['coalescing'] = coalescing
+
+        if self.is_initialized('screen_index'):
+            stats['vector_mirror'] = {'screens': len(self.screen_index)}
+
+        return stats
+
+    def shutdown(self):
+        if self.is_initialized('conversation_writer'):
+            self.conversation_writer.close(timeout=config.CONVERSATION_FLUSH_TIMEOUT)
+
+        if self.is_initialized('state_manager'):
+            self.state_manager.clear_expired()
+
+
+container = Container()
@@ -14,9 +14,83 @@ class Config:
     DB_USER = os.environ.get('DB_USER')
     DB_PASS = os.environ.get('DB_PASS')
     DB_SCHEMA = os.environ.get('DB_SCHEMA')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+    DB_SEARCH_TIMEOUT_MS = int(os.environ.get('DB_SEARCH_TIMEOUT_MS', '2000'))
     OPEN_AI_KEY = os.environ.get('OPEN_AI_KEY')
     GOOGLE_AI_KEY = os.environ.get('GOOGLE_AI_KEY')
+    MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'live')
+    OFFLINE_LATENCY_MS = float(os.environ.get('OFFLINE_LATENCY_MS', '300'))
+    OFFLINE_TOKENS_PER_SECOND = float(os.environ.get('OFFLINE_TOKENS_PER_SECOND', '50'))
+    OFFLINE_COMPLETION_TOKENS = int(os.environ.get('OFFLINE_COMPLETION_TOKENS', '60'))
+    OFFLINE_EMBEDDING_LATENCY_MS = float(os.environ.get('OFFLINE_EMBEDDING_LATENCY_MS', '80'))
+    OFFLINE_IMAGE_LATENCY_MS = float(os.environ.get('OFFLINE_IMAGE_LATENCY_MS', '2000'))
+    OFFLINE_FAILURE_RATE = float(os.environ.get('OFFLINE_FAILURE_RATE', '0'))
+    OFFLINE_FAILURE_STATUS = int(os.environ.get('OFFLINE_FAILURE_STATUS', '503'))
+    OFFLINE_SEED = int(os.environ.get('OFFLINE_SEED', '0'))
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '16'))
+    LLM_CONCURRENCY_LIMITS = os.environ.get('LLM_CONCURRENCY_LIMITS', '')
+    LLM_QUEUE_SLO_SECONDS = float(os.environ.get('LLM_QUEUE_SLO_SECONDS', '10'))
+    LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get('LLM_CALL_TIMEOUT_SECONDS', '60'))
+    LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', '3'))
+    LLM_RETRY_BASE_SECONDS = float(os.environ.get('LLM_RETRY_BASE_SECONDS', '0.5'))
+    LLM_RETRY_MAX_SECONDS = float(os.environ.get('LLM_RETRY_MAX_SECONDS', '8'))
+    HEDGING_ENABLED = os.environ.get('HEDGING_ENABLED', 'false').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+    HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+    HEDGE_MIN_DELAY_MS = float(os.environ.get('HEDGE_MIN_DELAY_MS', '50'))
+    CHAT_DEADLINE_SECONDS = float(os.environ.get('CHAT_DEADLINE_SECONDS', '120'))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    EAGER_WARM_UP = os.environ.get('EAGER_WARM_UP', 'true').lower() == 'true'
+    SESSION_STORE = os.environ.get('SESSION_STORE', 'memory')
+    SESSION_STORE_STRIPES = int(os.environ.get('SESSION_STORE_STRIPES', '64'))
+    SESSION_TTL_MINUTES = int(os.environ.get('SESSION_TTL_MINUTES', '30'))
+    SESSION_MAX_SESSIONS = int(os.environ.get('SESSION_MAX_SESSIONS', '10000'))
+    SESSION_MAX_BYTES = int(os.environ.get('SESSION_MAX_BYTES', str(256 * 1024 * 1024)))
+    SESSION_REAPER_INTERVAL = float(os.environ.get('SESSION_REAPER_INTERVAL', '30'))
+    HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', '2000'))
+    CONVERSATION_PERSISTENCE = os.environ.get('CONVERSATION_PERSISTENCE', 'true').lower() == 'true'
+    CONVERSATION_WRITE_QUEUE = int(os.environ.get('CONVERSATION_WRITE_QUEUE', '10000'))
+    CONVERSATION_WRITE_BATCH = int(os.environ.get('CONVERSATION_WRITE_BATCH', '500'))
+    CONVERSATION_FLUSH_TIMEOUT = float(os.environ.get('CONVERSATION_FLUSH_TIMEOUT', '10'))
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_THRESHOLD = float(os.environ.get('RESPONSE_CACHE_THRESHOLD', '0.95'))
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+    RESPONSE_CACHE_BUCKET_SIZE = int(os.environ.get('RESPONSE_CACHE_BUCKET_SIZE', '64'))
+    EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '1536'))
+    EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', '1024'))
+    EMBEDDING_CACHE_TTL = float(os.environ.get('EMBEDDING_CACHE_TTL', '86400'))
+    EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH')
+    VECTOR_INDEX_TYPE = os.environ.get('VECTOR_INDEX_TYPE', 'hnsw')
+    VECTOR_INDEX_METRIC = os.environ.get('VECTOR_INDEX_METRIC', 'inner_product')
+    VECTOR_INDEX_M = int(os.environ.get('VECTOR_INDEX_M', '16'))
+    VECTOR_INDEX_EF_CONSTRUCTION = int(os.environ.get('VECTOR_INDEX_EF_CONSTRUCTION', '64'))
+    VECTOR_INDEX_LISTS = int(os.environ.get('VECTOR_INDEX_LISTS', '100'))
+    VECTOR_SEARCH_EF = int(os.environ.get('VECTOR_SEARCH_EF', '40'))
+    VECTOR_QUANTIZATION = os.environ.get('VECTOR_QUANTIZATION', 'none')
+    VECTOR_RERANK_CANDIDATES = int(os.environ.get('VECTOR_RERANK_CANDIDATES', '40'))
+    VECTOR_SEARCH_PROBES = int(os.environ.get('VECTOR_SEARCH_PROBES', '10'))
+    SEARCH_TOP_K = int(os.environ.get('SEARCH_TOP_K', '3'))
+    SEARCH_SECTIONS = os.environ.get('SEARCH_SECTIONS', 'true').lower() == 'true'
+    SEARCH_SECTIONS_K = int(os.environ.get('SEARCH_SECTIONS_K', '8'))
+    SEARCH_HYBRID_CANDIDATES = int(os.environ.get('SEARCH_HYBRID_CANDIDATES', '10'))
+    SEARCH_TITLE_SIMILARITY = float(os.environ.get('SEARCH_TITLE_SIMILARITY', '0.6'))
+    VECTOR_MIRROR_ENABLED = os.environ.get('VECTOR_MIRROR_ENABLED', 'false').lower() == 'true'
+    VECTOR_MIRROR_PATH = os.environ.get('VECTOR_MIRROR_PATH')
+    VECTOR_MIRROR_REFRESH_INTERVAL = float(os.environ.get('VECTOR_MIRROR_REFRESH_INTERVAL', '60'))
+    SEARCH_MAX_DISTANCE = float(os.environ.get('SEARCH_MAX_DISTANCE', '0.50'))
+    IMAGE_STORE_PATH = os.environ.get('IMAGE_STORE_PATH')
+    IMAGE_RETENTION_SECONDS = float(os.environ.get('IMAGE_RETENTION_SECONDS', str(7 * 24 * 3600)))
+    IMAGE_GC_INTERVAL = float(os.environ.get('IMAGE_GC_INTERVAL', '3600'))
+    EDIT_CACHE_ENABLED = os.environ.get('EDIT_CACHE_ENABLED', 'true').lower() == 'true'
+    EDIT_CACHE_PATH = os.environ.get('EDIT_CACHE_PATH')
+    EDIT_CACHE_MAX_BYTES = int(os.environ.get('EDIT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+    EDIT_CACHE_MAX_ENTRIES = int(os.environ.get('EDIT_CACHE_MAX_ENTRIES', '2000'))
 
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Deadline-aware retries and hedging for outbound model calls.
+
+A call gets the remaining time of the request it serves (`deadline`, or `within_deadline` for a
+streamed response), capped by the per-call timeout. Failed attempts that may succeed on a retry (429, 5xx, timeouts, connection errors) are
+retried after a full-jitter exponential backoff, as long as the backoff ends before the deadline.
+
+With hedging on, an async attempt still running after the HEDGE_PERCENTILE latency of recent calls
+of the same lane gets a duplicate. The first to succeed is kept and the other cancelled. Hedges are
+only fired while the lane has spare capacity, a duplicate sent into a queue only adds load.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.core import metrics
+from app.core.config import config
+from app.core.scheduler import scheduler
+
+T = TypeVar('T')
+
+HEDGES_FIRED = metrics.registry.counter('llm_hedges_fired_total', 'Duplicate requests sent because the first one was slower than the hedge percentile', ('lane',))
+HEDGES_WON = metrics.registry.counter('llm_hedges_won_total', 'Hedged requests that answered before the original', ('lane',))
+RETRIES = metrics.registry.counter('llm_retries_total', 'Attempts retried after a retryable failure', ('lane',))
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Latencies kept per lane for the hedge percentile
+_WINDOW = 500
+
+# First chunk of a stream that ended without any
+_EMPTY = object()
+
+_deadline: ContextVar[Optional[float]] = ContextVar('request_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Model calls made inside the block, including in tasks it starts, finish within `seconds`.
+    Not for blocks spanning a `yield`, the context var could be reset from another context;
+    streams use `within_deadline`.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def within_deadline(stream: AsyncIterator[T], seconds: float) -> AsyncIterator[T]:
+    """
+    Items of `stream` with its model calls bounded by a deadline `seconds` from now, and the stream
+    itself: an item not produced by then raises TimeoutError. The deadline is set around each
+    step only, never held across a `yield`, so the iterator may be closed from any context.
+    """
+    ends_at = time.monotonic() + seconds
+    iterator = stream.__aiter__()
+
+    try:
+        while True:
+            token = _deadline.set(ends_at)
+            try:
+                async with asyncio.timeout(ends_at - time.monotonic()):
+                    item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _deadline.reset(token)
+
+            yield item
+    finally:
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+
+def _request_remaining() -> Optional[float]:
+    request_deadline = _deadline.get()
+    return None if request_deadline is None else request_deadline - time.monotonic()
+
+
+def remaining() -> float:
+    """Seconds left for a call made now, the request's remaining time capped by the per-call timeout"""
+    request_remaining = _request_remaining()
+    if request_remaining is None:
+        return config.LLM_CALL_TIMEOUT_SECONDS
+    return min(config.LLM_CALL_TIMEOUT_SECONDS, request_remaining)
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if status in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # openai.APIConnectionError and its APITimeoutError subclass, without importing openai here
+    return any(cls.__name__ == 'APIConnectionError' for cls in type(error).__mro__)
+
+
+class LatencyWindow:
+    """Most recent latencies of a lane"""
+
+    def __init__(self, size: int = _WINDOW):
+        self._values: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._values) < min_samples:
+                return None
+            values = sorted(self._values)
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+_windows: Dict[Tuple[str, str, str], LatencyWindow] = {}
+_windows_lock = threading.Lock()
+
+
+def latency_window(provider: str, model: str, kind: str) -> LatencyWindow:
+    key = (provider, model, kind)
+    with _windows_lock:
+        window = _windows.get(key)
+        if window is None:
+            window = _windows[key] = LatencyWindow()
+        return window
+
+
+class CallPolicy:
+    """Retries, deadline and optional hedging of the calls of one (provider, model) lane"""
+
+    def __init__(self, provider: str, model: str, hedge: Optional[bool] = None, max_attempts: Optional[int] = None):
+        self.provider = provider
+        self.model = model
+        self.lane = f'{provider}/{model}'
+        self.hedge = config.HEDGING_ENABLED if hedge is None else hedge
+        self.max_attempts = max_attempts or config.LLM_MAX_ATTEMPTS
+
+    def _backoff(self, attempt: int, error: BaseException, ends_at: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, None when the call should fail now"""
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return None
+
+        delay = random.uniform(0, min(config.LLM_RETRY_MAX_SECONDS, config.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+        if time.monotonic() + delay >= ends_at:
+            return None
+
+        RETRIES.inc(1, self.lane)
+        return delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Sync calls are retried, not hedged"""
+        ends_at = time.monotonic() + remaining()
+
+        for attempt in itertools.count():
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._backoff(attempt, e, ends_at)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def acall(self, start: Callable[[], Awaitable[T]]) -> T:
+        return await self._retrying(lambda: self._hedged(start, 'call'))
+
+    async def astream(self, start: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Streams are retried and hedged up to their first chunk, the stream that produces it first is
+        the one consumed. Failures after the first chunk reach the caller.
+
+        The first chunk is bounded by `remaining()`. Later chunks are only bounded by the request's
+        deadline, when there is one: a long answer may stream past the per-call timeout, a stalled
+        one fails with TimeoutError once the request is out of time.
+        """
+        async def first_chunk() -> Tuple[AsyncIterator[T], Any]:
+            stream = start().__aiter__()
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, _EMPTY
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def discard(result: Tuple[AsyncIterator[T], Any]):
+            await result[0].aclose()
+
+        stream, first = await self._retrying(lambda: self._hedged(first_chunk, 'first_chunk', discard))
+        try:
+            if first is _EMPTY:
+                return
+            yield first
+
+            while True:
+                try:
+                    async with asyncio.timeout(_request_remaining()):
+                        chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _retrying(self, attempt_fn: Callable[[], Awaitable[T]]) -> T:
+        ends_at = time.monotonic() + remaining()
+
+        for attempt in itertools.count():
+            try:
+                async with asyncio.timeout(ends_at - time.monotonic()):
+                    return await attempt_fn()
+            except Exception as e:
+                delay = self._backoff(attempt, e, ends_at)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def _hedge_delay(self, window: LatencyWindow) -> Optional[float]:
+        if not self.hedge:
+            return None
+        delay = window.percentile(config.HEDGE_PERCENTILE, config.HEDGE_MIN_SAMPLES)
+        return max(delay, config.HEDGE_MIN_DELAY_MS / 1000) if delay is not None else None
+
+    async def _hedged(self, start: Callable[[], Awaitable[T]], kind: str, discard: Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+        window = latency_window(self.provider, self.model, kind)
+        delay = self._hedge_delay(window)
+
+        started = {}
+
+        def launch() -> asyncio.Task:
+            task = asyncio.ensure_future(start())
+            started[task] = time.monotonic()
+            return task
+
+        original = launch()
+        pending = {original}
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and scheduler.has_capacity(self.provider, self.model):
+                    HEDGES_FIRED.inc(1, self.lane)
+                    pending.add(launch())
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # The original first when both finished together
+                for task in sorted(done, key=lambda t: t is not original):
+                    if task.exception() is None:
+                        window.record(time.monotonic() - started[task])
+                        if task is not original:
+                            HEDGES_WON.inc(1, self.lane)
+                        if discard is not None:
+                            for other in done - {task}:
+                                if other.exception() is None:
+                                    await discard(other.result())
+                        return task.result()
+                    error = error or task.exception()
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                # Finished before it could be cancelled, e.g. an open stream holding a slot
+                if discard is not None:
+                    for task in pending:
+                        if not task.cancelled() and task.exception() is None:
+                            await discard(task.result())
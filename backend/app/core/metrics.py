@@ -0,0 +1,247 @@
+"""
+Process-local counters and histograms rendered in the Prometheus text format at `/metrics`.
+
+Recording is a bucket lookup and an increment under a per-metric lock, nothing is aggregated or
+sent anywhere until a scrape renders the registry. With METRICS_ENABLED=false every `observe`,
+`inc` and timer returns immediately.
+"""
+import functools
+import inspect
+import math
+import threading
+import time
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        if not self.registry.enabled:
+            return
+
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}' for labels, v in values]
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets: int):
+        # Not cumulative, the rendering sums them up
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+
+        # Prometheus buckets are upper bounds inclusive (le)
+        position = bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _HistogramSeries(len(self.buckets))
+            series.counts[position] += 1
+            series.sum += value
+            series.count += 1
+
+    def time(self, *labels: str) -> _Timer:
+        """Context manager observing the seconds spent in its block"""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series.count if series is not None else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(s.counts), s.sum, s.count) for labels, s in self._series.items()]
+
+        lines = []
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels((*self.labelnames, "le"), (*labels, _format_value(bound)))} {cumulative}')
+
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets=buckets))
+
+    def render(self, stats: Optional[Dict[str, Any]] = None) -> str:
+        """All metrics, followed by `stats` (e.g. cache `as_dict()` outputs) flattened into gauges"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        for name, value in flatten_stats(stats or {}):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def flatten_stats(stats: Dict[str, Any], prefix: str = 'agent') -> List[Tuple[str, float]]:
+    """Numeric leaves of nested stats dicts, named by their path: {'edit_cache': {'hits': 2}} is agent_edit_cache_hits"""
+    flat = []
+    for key, value in stats.items():
+        name = f'{prefix}_{key}'
+        if isinstance(value, dict):
+            flat.extend(flatten_stats(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat.append((name, value))
+        elif isinstance(value, bool):
+            flat.append((name, int(value)))
+    return flat
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """Decorator observing the duration of each call of a function or coroutine function"""
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not histogram.registry.enabled:
+                    return await fn(*args, **kwargs)
+                with histogram.time(*labels):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not histogram.registry.enabled:
+                return fn(*args, **kwargs)
+            with histogram.time(*labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+registry = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+NODE_SECONDS = registry.histogram('agent_node_seconds', 'Time spent in each LangGraph node', ('node',))
+
+LLM_SECONDS = registry.histogram('llm_request_seconds', 'Chat and image model calls, end to end', ('model',))
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram('llm_time_to_first_token_seconds', 'Time to the first streamed token of chat model calls', ('model',))
+LLM_PROMPT_TOKENS = registry.histogram('llm_prompt_tokens', 'Prompt tokens per model call', ('model',), buckets=TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = registry.histogram('llm_completion_tokens', 'Completion tokens per model call', ('model',), buckets=TOKEN_BUCKETS)
+LLM_ERRORS = registry.counter('llm_errors_total', 'Failed chat and image model calls', ('model',))
+
+EMBEDDING_SECONDS = registry.histogram('embedding_request_seconds', 'Embedding calls, end to end', ('model',))
+EMBEDDING_TOKENS = registry.histogram('embedding_input_tokens', 'Input tokens per embedding call', ('model',), buckets=TOKEN_BUCKETS)
+
+DB_QUERY_SECONDS = registry.histogram('db_query_seconds', 'ScreenService queries', ('query',))
+
+STREAM_FIRST_EVENT_SECONDS = registry.histogram('chat_stream_first_event_seconds', 'Time from a /chat/stream request to its first content event')
+STREAM_SECONDS = registry.histogram('chat_stream_seconds', 'Duration of /chat/stream responses')
+STREAM_BYTES = registry.histogram('chat_stream_bytes', 'Bytes sent per /chat/stream response', buckets=BYTE_BUCKETS)
@@ -0,0 +1,79 @@
+import threading
+import zlib
+
+from typing import Callable, Sequence, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.core.pg import pg_engine
+
+logger = get_logger(__name__)
+
+# Single advisory lock id shared by all components, it also guards creation of schema_version itself
+_LOCK_ID = zlib.crc32(b'schema_version')
+
+_applied: Set[str] = set()
+_applied_lock = threading.Lock()
+
+
+Migration = Callable[[Session], None]
+
+
+def ensure_schema(component: str, migrations: Sequence[Migration]):
+    """
+    Bring `component` up to date by running the `migrations` it has not applied yet.
+    The schema version of a component is the number of migrations applied to it.
+
+    The check hits the database once per process, a transaction scoped advisory lock keeps
+    concurrent workers from running the same migration twice.
+    """
+    version = len(migrations)
+    key = f'{component}:{version}'
+    if key in _applied:
+        return
+
+    with _applied_lock:
+        if key in _applied:
+            return
+
+        with Session(pg_engine) as session:
+            session.begin()
+            try:
+                session.execute(text('select pg_advisory_xact_lock(:lock_id)'), {'lock_id': _LOCK_ID})
+
+                session.execute(text(
+                    '''
+                    create table if not exists schema_version (
+                        component varchar(100) primary key,
+                        version integer not null,
+                        applied_at timestamp default current_timestamp
+                    )
+                    '''
+                ))
+
+                current = session.execute(
+                    text('select version from schema_version where component = :component'),
+                    {'component': component}
+                ).scalar()
+
+                current = current or 0
+                if current < version:
+                    logger.info(f'Migrating {component} schema from version {current} to {version}')
+                    for migrate in migrations[current:]:
+                        migrate(session)
+
+                    session.execute(text(
+                        '''
+                        insert into schema_version (component, version) values (:component, :version)
+                        on conflict (component) do update set version = excluded.version, applied_at = current_timestamp
+                        '''
+                    ), {'component': component, 'version': version})
+
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+        _applied.add(key)
@@ -1,8 +1,71 @@
-from sqlalchemy import create_engine
+import threading
+
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
 from app.core.config import config
 
 db_conn_str = f'postgresql+psycopg2://{config.DB_USER}:{config.DB_PASS}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_SCHEMA}'
+db_async_conn_str = f'postgresql+asyncpg://{config.DB_USER}:{config.DB_PASS}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_SCHEMA}'
+
+pool_settings = dict(
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+
 pg_engine = None
 
 if pg_engine is None:
-    pg_engine = create_engine(db_conn_str)
\ No newline at end of file
+    # Used by migrations, ingestion and the thread offloaded services, no statement timeout
+    # since index builds and bulk loads legitimately run long
+    pg_engine = create_engine(db_conn_str, **pool_settings)
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessions: Optional[async_sessionmaker[AsyncSession]] = None
+_async_lock = threading.Lock()
+
+
+def pg_async_engine() -> AsyncEngine:
+    """
+    Engine for request path queries awaited on the event loop. Built on first use so
+    processes that never query asynchronously don't need asyncpg.
+    """
+    global _async_engine, _async_sessions
+
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                engine = create_async_engine(
+                    db_async_conn_str,
+                    connect_args={'server_settings': {'statement_timeout': str(config.DB_STATEMENT_TIMEOUT_MS)}},
+                    **pool_settings
+                )
+
+                @event.listens_for(engine.sync_engine, 'connect')
+                def _register_vector(dbapi_connection, _):
+                    from pgvector.asyncpg import register_vector
+                    dbapi_connection.run_async(register_vector)
+
+                _async_sessions = async_sessionmaker(engine, expire_on_commit=False)
+                _async_engine = engine
+
+    return _async_engine
+
+
+def pg_async_session() -> AsyncSession:
+    pg_async_engine()
+    return _async_sessions()
+
+
+async def dispose_async_engine():
+    """Close pooled asyncpg connections, they are bound to the event loop that opened them"""
+    global _async_engine, _async_sessions
+
+    if _async_engine is not None:
+        engine, _async_engine, _async_sessions = _async_engine, None, None
+        await engine.dispose()
@@ -0,0 +1,377 @@
+"""
+Admission control for outbound model calls. Every (provider, model) pair gets a lane with a
+concurrency limit and request/token buckets, callers wait in the lane in priority order.
+
+The buckets start unlimited and learn the provider's limits from its `x-ratelimit-*` response
+headers, a 429 pauses the lane for its `retry-after`. `admission` estimates how long an interactive
+call would queue right now, `/chat/stream` turns requests away early when that exceeds the SLO
+instead of letting them time out in the queue.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import re
+import threading
+import time
+
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import config
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+QUEUE_SECONDS = metrics.registry.histogram('llm_queue_seconds', 'Time model calls waited for a slot in their lane', ('lane', 'priority'))
+REJECTED = metrics.registry.counter('llm_admission_rejected_total', 'Chat requests turned away because the model queue is over its SLO', ('status',))
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+# Hold time assumed for a lane before any call has completed
+_INITIAL_HOLD_SECONDS = 1.0
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset headers look like 20ms, 1s or 6m0s, retry-after is plain seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION.findall(value)
+    return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+class TokenBucket:
+    """Unlimited until `update` is fed the provider's limits"""
+
+    def __init__(self):
+        self.capacity: Optional[float] = None
+        self.level = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.capacity is None:
+            return 0.0
+
+        self._refill(now)
+        # A cost above the capacity would never fit, let it through on a full bucket
+        missing = min(cost, self.capacity) - self.level
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else 1.0
+
+    def take(self, cost: float, now: float):
+        if self.capacity is not None:
+            self._refill(now)
+            self.level -= cost
+
+    def update(self, limit: float, remaining: float, reset: Optional[float], now: float):
+        self.capacity = limit
+        self.level = remaining
+        self.updated = now
+        if reset and remaining < limit:
+            self.rate = (limit - remaining) / reset
+        elif not self.rate:
+            # Provider limits are per minute
+            self.rate = limit / 60.0
+
+    def pause(self, seconds: float, now: float):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'enqueued')
+
+    def __init__(self, priority: Priority, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: '_Waiter') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _ThreadWaiter(_Waiter):
+    __slots__ = ('_event',)
+
+    def __init__(self, priority: Priority, seq: int):
+        super().__init__(priority, seq)
+        self._event = threading.Event()
+
+    def reset(self):
+        self._event.clear()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout: Optional[float]):
+        self._event.wait(timeout)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _TaskWaiter(_Waiter):
+    __slots__ = ('_loop', '_future')
+
+    def __init__(self, priority: Priority, seq: int):
+        super().__init__(priority, seq)
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+
+    def reset(self):
+        if self._future.done():
+            self._future = self._loop.create_future()
+
+    def wake(self):
+        # Releases may happen on worker threads
+        self._loop.call_soon_threadsafe(_resolve, self._future)
+
+    async def wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class _Lane:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: list = []
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        # Moving average of how long a call holds its slot, streams hold it until their last token
+        self.hold_seconds = _INITIAL_HOLD_SECONDS
+
+
+@dataclass
+class Rejection:
+    status_code: int
+    retry_after: float
+    reason: str
+
+
+class LLMScheduler:
+    def __init__(self, default_limit: Optional[int] = None, limits: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit or config.LLM_MAX_CONCURRENCY
+        self.limits = parse_limits(config.LLM_CONCURRENCY_LIMITS) if limits is None else limits
+        self._lanes: Dict[Tuple[str, str], _Lane] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        key = (provider, model)
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(key)
+                if lane is None:
+                    name = f'{provider}/{model}'
+                    lane = self._lanes[key] = _Lane(name, self.limits.get(name, self.default_limit))
+        return lane
+
+    def _try_grant(self, lane: _Lane, waiter: _Waiter, cost: float) -> Optional[float]:
+        """Under the lock. 0 once granted, seconds to wait for the buckets, or None to wait for a wake up"""
+        if lane.waiters[0] is not waiter or lane.in_flight >= lane.limit:
+            return None
+
+        now = time.monotonic()
+        delay = max(lane.requests.wait_time(1, now), lane.tokens.wait_time(cost, now))
+        if delay > 0:
+            return delay
+
+        heapq.heappop(lane.waiters)
+        lane.in_flight += 1
+        lane.requests.take(1, now)
+        lane.tokens.take(cost, now)
+
+        # The next in line may fit as well
+        if lane.waiters:
+            lane.waiters[0].wake()
+        return 0.0
+
+    def _abandon(self, lane: _Lane, waiter: _Waiter):
+        with self._lock:
+            if waiter in lane.waiters:
+                lane.waiters.remove(waiter)
+                heapq.heapify(lane.waiters)
+                if lane.waiters:
+                    lane.waiters[0].wake()
+
+    def _granted(self, lane: _Lane, waiter: _Waiter) -> float:
+        granted_at = time.monotonic()
+        QUEUE_SECONDS.observe(granted_at - waiter.enqueued, lane.name, waiter.priority.name.lower())
+        return granted_at
+
+    def _release(self, lane: _Lane, granted_at: float):
+        with self._lock:
+            lane.in_flight -= 1
+            lane.hold_seconds = 0.8 * lane.hold_seconds + 0.2 * (time.monotonic() - granted_at)
+            if lane.waiters:
+                lane.waiters[0].wake()
+
+    @contextmanager
+    def slot(self, provider: str, model: str, priority: Priority = Priority.BATCH, cost: float = 0):
+        """Holds one of the lane's slots for the duration of the block, blocking the thread until granted"""
+        lane = self._lane(provider, model)
+        waiter = _ThreadWaiter(priority, next(self._seq))
+
+        with self._lock:
+            heapq.heappush(lane.waiters, waiter)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_grant(lane, waiter, cost)
+                    if delay == 0:
+                        break
+                    waiter.reset()
+                waiter.wait(delay)
+        except BaseException:
+            self._abandon(lane, waiter)
+            raise
+
+        granted_at = self._granted(lane, waiter)
+        try:
+            yield
+        finally:
+            self._release(lane, granted_at)
+
+    @asynccontextmanager
+    async def aslot(self, provider: str, model: str, priority: Priority = Priority.INTERACTIVE, cost: float = 0):
+        """`slot` for coroutines, waiting does not block the event loop"""
+        lane = self._lane(provider, model)
+        waiter = _TaskWaiter(priority, next(self._seq))
+
+        with self._lock:
+            heapq.heappush(lane.waiters, waiter)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_grant(lane, waiter, cost)
+                    if delay == 0:
+                        break
+                    waiter.reset()
+                await waiter.wait(delay)
+        except BaseException:
+            self._abandon(lane, waiter)
+            raise
+
+        granted_at = self._granted(lane, waiter)
+        try:
+            yield
+        finally:
+            self._release(lane, granted_at)
+
+    def has_capacity(self, provider: str, model: str) -> bool:
+        """Whether a call made now would be granted without queueing"""
+        lane = self._lane(provider, model)
+        with self._lock:
+            return (lane.in_flight < lane.limit and not lane.waiters
+                    and lane.requests.wait_time(1, time.monotonic()) == 0)
+
+    def observe_headers(self, provider: str, model: str, headers: Mapping[str, str], status_code: int = 200):
+        """Feed the lane's buckets from `x-ratelimit-*` headers, a 429 pauses the lane"""
+        lane = self._lane(provider, model)
+        now = time.monotonic()
+
+        with self._lock:
+            for bucket, kind in ((lane.requests, 'requests'), (lane.tokens, 'tokens')):
+                limit, remaining = headers.get(f'x-ratelimit-limit-{kind}'), headers.get(f'x-ratelimit-remaining-{kind}')
+                try:
+                    if limit is not None and remaining is not None:
+                        bucket.update(float(limit), float(remaining), parse_duration(headers.get(f'x-ratelimit-reset-{kind}')), now)
+                except ValueError:
+                    continue
+
+            if status_code == 429:
+                pause = parse_duration(headers.get('retry-after')) or parse_duration(headers.get('x-ratelimit-reset-requests')) or 1.0
+                lane.requests.pause(pause, now)
+                logger.warning(f'{lane.name} is rate limited, pausing for {pause:.1f}s')
+
+    def throttled(self, provider: str, model: str, seconds: float = 1.0):
+        """A call failed with a rate limit without headers to learn from"""
+        self.observe_headers(provider, model, {'retry-after': str(seconds)}, status_code=429)
+
+    def observe_openai_response(self, response):
+        """httpx response hook of the OpenAI clients, the model comes from the request body"""
+        try:
+            model = json.loads(response.request.content).get('model')
+        except Exception:
+            return
+        if model:
+            self.observe_headers('openai', model, response.headers, response.status_code)
+
+    def queue_delay(self, lane: _Lane, now: float) -> Tuple[float, bool]:
+        """Under the lock. Expected wait of a new interactive call, and whether the buckets are the cause"""
+        ahead = sum(1 for w in lane.waiters if w.priority == Priority.INTERACTIVE)
+        oldest = max((now - w.enqueued for w in lane.waiters if w.priority == Priority.INTERACTIVE), default=0.0)
+
+        busy = lane.in_flight + ahead - lane.limit + 1
+        by_concurrency = math.ceil(busy / lane.limit) * lane.hold_seconds if busy > 0 else 0.0
+        by_rate = lane.requests.wait_time(ahead + 1, now)
+
+        return max(by_concurrency, by_rate, oldest), by_rate >= by_concurrency and by_rate > 0
+
+    def admission(self, slo: Optional[float] = None) -> Optional[Rejection]:
+        """A rejection when an interactive call would queue longer than the SLO in any lane"""
+        slo = config.LLM_QUEUE_SLO_SECONDS if slo is None else slo
+        if slo <= 0:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            worst = max(((self.queue_delay(lane, now), lane.name) for lane in self._lanes.values()), default=None)
+
+        if worst is None or worst[0][0] <= slo:
+            return None
+
+        (delay, rate_limited), name = worst
+        status = 429 if rate_limited else 503
+        REJECTED.inc(1, str(status))
+        return Rejection(status, delay, f'{name} would queue for {delay:.1f}s')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                re.sub(r'\W', '_', lane.name): {'in_flight': lane.in_flight, 'queued': len(lane.waiters), 'limit': lane.limit, 'hold_seconds': lane.hold_seconds}
+                for lane in self._lanes.values()
+            }
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """`openai/gpt-4o-mini=32,gemini/gemini-2.5-flash-image=4`"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, limit = item.partition('=')
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+scheduler = LLMScheduler()
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import weakref
+
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+from app.core import metrics
+
+V = TypeVar('V')
+
+COALESCE_CALLS = metrics.registry.counter('coalesce_calls_total', 'Calls made through a singleflight group', ('group',))
+COALESCE_SHARED = metrics.registry.counter('coalesce_shared_total', 'Calls answered by another in-flight call with the same key', ('group',))
+
+
+@dataclass
+class CoalescingStats:
+    calls: int = 0
+    coalesced: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Share of calls that waited on an identical in-flight call instead of doing the work"""
+        return self.coalesced / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'ratio': self.ratio}
+
+
+# Every live group, for reporting
+_groups: 'weakref.WeakSet[SingleFlight]' = weakref.WeakSet()
+
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every live group by name, groups sharing a name are added up"""
+    totals: Dict[str, CoalescingStats] = {}
+    for group in list(_groups):
+        total = totals.setdefault(group.name, CoalescingStats())
+        total.calls += group.stats.calls
+        total.coalesced += group.stats.coalesced
+
+    return {name: stats.as_dict() for name, stats in totals.items()}
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[V]):
+    """
+    Concurrent calls with the same key share one execution: the first caller runs the function,
+    the others wait for its result (or its exception). Nothing is kept once the call completes,
+    a later call with the same key runs again. Results are shared, callers must not mutate them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = CoalescingStats()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        _groups.add(self)
+
+    def __count(self, shared: bool):
+        # Under self._lock
+        self.stats.calls += 1
+        COALESCE_CALLS.inc(1, self.name)
+        if shared:
+            self.stats.coalesced += 1
+            COALESCE_SHARED.inc(1, self.name)
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> V:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.__count(shared=not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> V:
+        """
+        `do` for coroutines of one event loop. The work runs in its own task, a caller that is
+        cancelled (e.g. a client disconnecting) stops waiting without cancelling it for the others.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            shared = task is not None
+            if not shared:
+                task = self._tasks[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self.__forget(key, task))
+            self.__count(shared=shared)
+
+        return await asyncio.shield(task)
+
+    def __forget(self, key: Hashable, task: asyncio.Future):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+        # Nobody may be left waiting, retrieve the exception so asyncio doesn't log it as unhandled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import hedging
+from app.core.config import config
+from app.core.hedging import CallPolicy, deadline, latency_window, within_deadline
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(config, 'LLM_RETRY_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(config, 'LLM_RETRY_MAX_SECONDS', 0.05)
+
+
+def warm(model: str, kind: str, seconds: float, samples: int = 20):
+    window = latency_window('test', model, kind)
+    for _ in range(samples):
+        window.record(seconds)
+
+
+def test_retryable_errors_are_retried_and_others_raised(fast_retries):
+    policy = CallPolicy('test', 'retry', hedge=False, max_attempts=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Unavailable()
+        return 'ok'
+
+    assert policy.call(flaky) == 'ok'
+    assert len(attempts) == 3
+
+    async def invalid():
+        attempts.append(1)
+        raise ValueError('bad request')
+
+    attempts.clear()
+    with pytest.raises(ValueError):
+        asyncio.run(policy.acall(invalid))
+    assert len(attempts) == 1
+
+
+def test_retries_stop_at_the_request_deadline(monkeypatch):
+    monkeypatch.setattr(config, 'LLM_RETRY_BASE_SECONDS', 1)
+    monkeypatch.setattr(config, 'LLM_RETRY_MAX_SECONDS', 1)
+    policy = CallPolicy('test', 'deadline', hedge=False, max_attempts=10)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        with deadline(0.1):
+            await policy.acall(slow)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(scenario())
+    assert time.monotonic() - started < 0.5
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    warm('hedge', 'call', 0.01)
+    policy = CallPolicy('test', 'hedge', hedge=True)
+    fired, won = hedging.HEDGES_FIRED.value('test/hedge'), hedging.HEDGES_WON.value('test/hedge')
+    cancelled = []
+
+    async def call(delays=iter([1.0, 0.01])):
+        try:
+            await asyncio.sleep(next(delays))
+            return 'answer'
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    started = time.monotonic()
+    assert asyncio.run(policy.acall(call)) == 'answer'
+
+    assert time.monotonic() - started < 0.5
+    assert cancelled == [1]
+    assert hedging.HEDGES_FIRED.value('test/hedge') == fired + 1
+    assert hedging.HEDGES_WON.value('test/hedge') == won + 1
+
+
+def test_hedged_stream_consumes_one_stream_and_closes_the_other():
+    warm('stream', 'first_chunk', 0.01)
+    policy = CallPolicy('test', 'stream', hedge=True)
+    closed = []
+
+    async def stream(name, delay):
+        try:
+            await asyncio.sleep(delay)
+            for token in ('a', 'b'):
+                yield f'{name}:{token}'
+        finally:
+            closed.append(name)
+
+    async def scenario(streams=iter([('original', 1.0), ('hedge', 0.01)])):
+        return [chunk async for chunk in policy.astream(lambda: stream(*next(streams)))]
+
+    assert asyncio.run(scenario()) == ['hedge:a', 'hedge:b']
+    assert sorted(closed) == ['hedge', 'original']
+
+
+def test_stream_within_deadline_times_out_and_closes_from_another_task():
+    policy = CallPolicy('test', 'stalled', hedge=False)
+    closed = []
+
+    async def stalled():
+        try:
+            yield hedging.remaining()
+            yield 'b'
+            await asyncio.sleep(1)
+            yield 'c'
+        finally:
+            closed.append(1)
+
+    async def consume(stream):
+        return [chunk async for chunk in stream]
+
+    async def timed_out():
+        return await consume(within_deadline(policy.astream(stalled), 0.1))
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(timed_out())
+    assert time.monotonic() - started < 0.5
+    assert closed == [1]
+
+    async def closed_elsewhere():
+        stream = within_deadline(stalled(), 5)
+        assert await anext(stream) <= 5
+        await asyncio.create_task(stream.aclose())
+        assert hedging._deadline.get() is None
+
+    asyncio.run(closed_elsewhere())
+    assert closed == [1, 1]
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from app.core.scheduler import LLMScheduler, Priority, parse_duration
+
+
+def test_parse_duration_reads_openai_reset_headers():
+    assert parse_duration('20ms') == 0.02
+    assert parse_duration('6m0s') == 360.0
+    assert parse_duration('1.5') == 1.5
+    assert parse_duration(None) is None
+
+
+def test_slots_are_granted_by_priority_within_the_concurrency_limit():
+    scheduler = LLMScheduler(default_limit=1, limits={})
+    order = []
+
+    async def call(name, priority, hold=0.0):
+        async with scheduler.aslot('openai', 'm', priority):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def scenario():
+        first = asyncio.create_task(call('first', Priority.BATCH, hold=0.05))
+        await asyncio.sleep(0.01)
+        # Queued behind `first`, the interactive call overtakes the batch one queued before it
+        batch = asyncio.create_task(call('batch', Priority.BATCH))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call('interactive', Priority.INTERACTIVE))
+        await asyncio.gather(first, batch, interactive)
+
+    asyncio.run(scenario())
+
+    assert order == ['first', 'interactive', 'batch']
+    lane = scheduler.stats()['openai_m']
+    assert lane['in_flight'] == 0 and lane['queued'] == 0
+
+
+def test_threads_and_cancelled_waiters_release_their_place():
+    scheduler = LLMScheduler(default_limit=1, limits={})
+
+    async def scenario():
+        async with scheduler.aslot('openai', 'm'):
+            waiter = asyncio.create_task(scheduler.aslot('openai', 'm').__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+
+        with scheduler.slot('openai', 'm'):
+            pass
+
+    asyncio.run(scenario())
+
+    assert scheduler.stats()['openai_m']['queued'] == 0
+
+
+def test_rate_limit_headers_pace_requests_and_trigger_early_rejection():
+    scheduler = LLMScheduler(default_limit=8, limits={})
+    scheduler.observe_headers('openai', 'm', {
+        'x-ratelimit-limit-requests': '10',
+        'x-ratelimit-remaining-requests': '0',
+        # Back to 10 in a second, so the next request fits after 100ms
+        'x-ratelimit-reset-requests': '1s',
+    })
+
+    started = time.monotonic()
+    with scheduler.slot('openai', 'm'):
+        pass
+    assert time.monotonic() - started >= 0.09
+
+    scheduler.observe_headers('openai', 'm', {'retry-after': '30'}, status_code=429)
+    rejection = scheduler.admission(slo=5)
+
+    assert rejection.status_code == 429 and rejection.retry_after > 25
+
+
+def test_saturated_lane_is_rejected_with_503():
+    scheduler = LLMScheduler(default_limit=1, limits={'openai/m': 1})
+
+    async def scenario():
+        async with scheduler.aslot('openai', 'm'):
+            queued = [asyncio.create_task(scheduler.aslot('openai', 'm').__aenter__()) for _ in range(5)]
+            await asyncio.sleep(0.01)
+            rejection = scheduler.admission(slo=3)
+            for task in queued:
+                task.cancel()
+            await asyncio.gather(*queued, return_exceptions=True)
+            return rejection
+
+    rejection = asyncio.run(scenario())
+
+    # Five queued calls ahead at the initial one second hold estimate
+    assert rejection.status_code == 503 and rejection.retry_after >= 5
+    assert scheduler.admission(slo=3) is None
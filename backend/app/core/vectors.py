@@ -0,0 +1,13 @@
+import math
+
+from typing import List, Sequence
+
+
+def l2_normalize(vector: Sequence[float]) -> List[float]:
+    """L2-normalize a single embedding, zero vectors are returned unchanged"""
+    norm = math.hypot(*vector)
+
+    if norm == 0:
+        return list(vector)
+
+    return [x / norm for x in vector]
@@ -1,12 +1,23 @@
-from app.agents.tools.knowledgebase import KnowledgeBase
+from app.agents.tools.knowledgebase import KnowledgeBase, ScreenInput
+from app.agents.tools.models import chat_model
+from app.agents.tools.summaries import ScreenSummariser
+from app.core.scheduler import Priority
 from services.screen_service import ScreenService
 
 
 def start_ingesting():
     screen_repo = ScreenService()
     kb = KnowledgeBase(screen_svc=screen_repo)
+    summariser = ScreenSummariser(chat_model(
+        "gpt-4o-mini",
+        priority=Priority.BATCH,
+        temperature=0.7,
+        timeout=60.0
+    ))
 
-    kb.ingest_screen(
+    screens = []
+
+    screens.append(ScreenInput(
         title='Home Dashboard',
         chunk='''
 ## Home Dashboard
@@ -83,9 +94,9 @@ It offers transparency in financial operations and assists in decision-making.
 
         ''',
         imgs=['data/raw/dashboard.png']
-    )
+    ))
 
-    kb.ingest_screen(
+    screens.append(ScreenInput(
         title='Product List',
         chunk='''
 ## **Product List**
@@ -134,9 +145,9 @@ This grid helps users quickly identify product status, version information, and
 
 ''',
         imgs=['data/raw/product-list.png']
-    )
+    ))
 
-    kb.ingest_screen(
+    screens.append(ScreenInput(
         title='Add Product',
         chunk='''
 ## **Add Product Screen**
@@ -211,4 +222,6 @@ Located at the bottom of the form, two key action controls are provided:
 These provide users control over data submission and workflow navigation.
 ''',
         imgs=['data/raw/add-product.png']
-    )
\ No newline at end of file
+    ))
+
+    return kb.ingest_screens(screens, summariser=summariser)
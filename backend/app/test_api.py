@@ -0,0 +1,117 @@
+import subprocess
+import sys
+
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.agents.state_manager import StateManager
+from app.api import app
+from app.container import container
+from app.core import metrics
+from app.core.metrics import MetricsRegistry
+from app.core.scheduler import Rejection, scheduler
+from services.image_store import ImageStore
+
+
+class StubWorkflow:
+    def __init__(self):
+        self.sm = StateManager()
+
+    async def astart_session(self) -> str:
+        return await self.sm.acreate_session()
+
+
+def test_import_does_not_load_workflow_or_db_modules():
+    code = (
+        'import sys, app.api; '
+        'heavy = [m for m in ("langgraph", "langchain_openai", "google.genai", "services.screen_service", "sklearn") if m in sys.modules]; '
+        'print("HEAVY=" + ",".join(heavy))'
+    )
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=Path(__file__).parent.parent, text=True)
+
+    assert 'HEAVY=\n' in out
+
+
+def test_session_uses_lazily_provided_workflow(monkeypatch):
+    monkeypatch.setattr('app.core.config.config.EAGER_WARM_UP', False)
+    monkeypatch.setattr(container, '_instances', {})
+    container.override('agent_workflow', StubWorkflow())
+
+    with TestClient(app) as client:
+        health = client.get('/')
+        session = client.post('/session')
+
+    assert health.json()['status'] == 'healthy'
+    assert session.status_code == 200
+    assert session.json()['session_id']
+    assert not container.is_initialized('screen_service')
+
+
+def test_images_are_served_with_etag_and_ranges(monkeypatch, tmp_path):
+    monkeypatch.setattr('app.core.config.config.EAGER_WARM_UP', False)
+    monkeypatch.setattr(container, '_instances', {})
+
+    store = ImageStore(str(tmp_path))
+    container.override('image_store', store)
+    stored = store.put_bytes(Path(__file__).parent.parent.joinpath('data/raw/dashboard.png').read_bytes())
+
+    with TestClient(app) as client:
+        full = client.get(stored.url)
+        cached = client.get(stored.url, headers={'If-None-Match': full.headers['etag']})
+        partial = client.get(stored.url, headers={'Range': 'bytes=0-99'})
+        thumbnail = client.get(stored.url, params={'width': 128, 'format': 'webp'})
+        missing = client.get('/images/' + '0' * 64)
+        invalid = client.get('/images/not-a-digest')
+
+    assert full.status_code == 200
+    assert full.headers['content-type'] == 'image/png'
+    assert 'immutable' in full.headers['cache-control']
+    assert cached.status_code == 304
+    assert partial.status_code == 206
+    assert len(partial.content) == 100
+    assert thumbnail.headers['content-type'] == 'image/webp'
+    assert missing.status_code == 404
+    assert invalid.status_code == 400
+
+
+def test_metrics_are_rendered_in_prometheus_text_format(monkeypatch):
+    monkeypatch.setattr('app.core.config.config.EAGER_WARM_UP', False)
+    monkeypatch.setattr(container, '_instances', {})
+    container.override('agent_workflow', StubWorkflow())
+
+    registry = MetricsRegistry()
+    latency = registry.histogram('test_seconds', 'Test latency', ('node',), buckets=(0.1, 1.0))
+    latency.observe(0.05, 'search')
+    latency.observe(0.5, 'search')
+    monkeypatch.setattr(metrics, 'registry', registry)
+
+    with TestClient(app) as client:
+        client.post('/session')
+        container.session_store
+        body = client.get('/metrics')
+
+    assert body.status_code == 200
+    assert body.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert '# TYPE test_seconds histogram' in body.text
+    assert 'test_seconds_bucket{node="search",le="0.1"} 1' in body.text
+    assert 'test_seconds_bucket{node="search",le="+Inf"} 2' in body.text
+    assert 'test_seconds_count{node="search"} 2' in body.text
+    assert 'agent_session_store_hits ' in body.text
+
+    monkeypatch.setattr('app.core.config.config.METRICS_ENABLED', False)
+    with TestClient(app) as client:
+        assert client.get('/metrics').status_code == 404
+
+
+def test_chat_stream_is_shed_when_the_model_queue_is_over_its_slo(monkeypatch):
+    monkeypatch.setattr('app.core.config.config.EAGER_WARM_UP', False)
+    monkeypatch.setattr(container, '_instances', {})
+    container.override('agent_workflow', StubWorkflow())
+    monkeypatch.setattr(scheduler, 'admission', lambda: Rejection(503, 4.2, 'openai/gpt-4o-mini would queue for 4.2s'))
+
+    with TestClient(app) as client:
+        resp = client.post('/chat/stream', json={'message': 'Add a dashboard'})
+
+    assert resp.status_code == 503
+    assert resp.headers['retry-after'] == '5'
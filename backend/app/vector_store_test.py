@@ -10,8 +10,7 @@ from sqlalchemy import text, select
 from pgvector.sqlalchemy.vector import Vector
 from openai import OpenAI
 
-import numpy
-from sklearn.preprocessing import normalize
+from app.core.vectors import l2_normalize
 
 client = OpenAI(
     api_key=config.OPEN_AI_KEY
@@ -22,11 +21,7 @@ from app.core.logging import get_logger
 logger = get_logger(__name__)
 
 def __normalize(vector: List[float]) -> List[float]:
-    vector_np = numpy.array(vector, dtype=numpy.float32)
-
-    normalized = normalize(vector_np.reshape(1, -1), 'l2')
-
-    return normalized[0].tolist()
+    return l2_normalize(vector)
 
 
 def similarity_check(user_query: str):
@@ -0,0 +1,109 @@
+"""
+Time to first token and prompt size per turn over long chat sessions, with the
+token budgeted conversation memory against an unbounded history.
+
+By default the LLM is simulated: the first streamed token is delayed in
+proportion to the prompt length, like prefill on a hosted model. Pass --live
+to stream from the real OpenAI model instead (needs OPEN_AI_KEY).
+
+Usage:
+    python -m benchmarks.conversation_memory --turns 50 --budget 2000
+    python -m benchmarks.conversation_memory --turns 50 --live
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.agents.state_manager import StateManager
+from app.agents.tools.conversation_memory import ConversationMemory
+from app.agents.worklow import AgentWorklow
+
+REPLY = ' '.join(['The spec covers requirements, design, API changes, tests and rollout for the screen.'] * 20)
+
+
+class PrefillLLM:
+    """Simulated chat model, first token latency grows with the prompt like prefill does"""
+
+    def __init__(self, seconds_per_token: float):
+        self.seconds_per_token = seconds_per_token
+        self.prompt_tokens = []
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(0.01)
+        return AIMessage(content='Add a dashboard to OrderSys')
+
+    async def astream(self, messages):
+        tokens = sum(len(m.content) for m in messages) // 4
+        self.prompt_tokens.append(tokens)
+        await asyncio.sleep(tokens * self.seconds_per_token)
+        for word in REPLY.split(' '):
+            yield AIMessageChunk(content=word + ' ')
+
+
+class EmptyKnowledgeBase:
+    async def asearch_screens(self, query):
+        return []
+
+
+async def _session(workflow: AgentWorklow, turns: int):
+    session_id = await workflow.astart_session()
+    ttfts = []
+
+    for turn in range(turns):
+        started = time.perf_counter()
+        first = None
+        async for token in workflow.stream_process_message(session_id, f'refine the dashboard, iteration {turn}'):
+            if first is None:
+                first = time.perf_counter()
+            json.loads(token)
+        ttfts.append(first - started)
+
+    return ttfts
+
+
+def _run(budget: int, turns: int, live: bool, seconds_per_token: float):
+    workflow = AgentWorklow(EmptyKnowledgeBase(), StateManager())
+    workflow.memory = ConversationMemory(budget=budget, count_tokens=None if live else (lambda text: len(text) // 4))
+    if not live:
+        workflow.general_llm = PrefillLLM(seconds_per_token)
+
+    ttfts = asyncio.run(_session(workflow, turns))
+    prompt_tokens = workflow.general_llm.prompt_tokens if not live else []
+    return ttfts, prompt_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--budget', type=int, default=2000, help='history token budget for the windowed run')
+    parser.add_argument('--seconds-per-token', type=float, default=0.0001, help='simulated prefill seconds per prompt token')
+    parser.add_argument('--live', action='store_true', help='stream from the real OpenAI model')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runs = {
+        'windowed': _run(args.budget, args.turns, args.live, args.seconds_per_token),
+        'unbounded': _run(10 ** 9, args.turns, args.live, args.seconds_per_token),
+    }
+
+    print(f'{"history":>10} {"turn":>5} {"ttft_ms":>9} {"prompt_tokens":>14}')
+    for name, (ttfts, prompt_tokens) in runs.items():
+        for turn in (0, 9, 24, args.turns - 1):
+            if turn < len(ttfts):
+                tokens = prompt_tokens[turn] if turn < len(prompt_tokens) else '-'
+                print(f'{name:>10} {turn + 1:>5} {ttfts[turn] * 1000:>9.1f} {tokens:>14}')
+
+    print()
+    print(f'{"history":>10} {"first10_ms":>11} {"last10_ms":>10}')
+    for name, (ttfts, _) in runs.items():
+        print(f'{name:>10} {statistics.mean(ttfts[:10]) * 1000:>11.1f} {statistics.mean(ttfts[-10:]) * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Load test for similarity search under concurrency, measuring how much the DB
+wait stalls the event loop. A ticker coroutine sleeps 10ms in a loop and
+records how late it wakes up while `--concurrency` searches run:
+
+  blocking  sync find_by_similarity called on the loop (the original handlers)
+  thread    sync find_by_similarity through asyncio.to_thread
+  async     afind_by_similarity on the asyncpg engine
+
+Needs a populated `screens` table, see benchmarks.vector_index for loading one.
+
+Usage:
+    python -m benchmarks.db_event_loop --concurrency 64 --requests 2000 --modes blocking thread async
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.core.config import config
+from app.core.vectors import l2_normalize
+from services.screen_service import ScreenService
+
+TICK = 0.01
+
+
+def _percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _random_query(rng: random.Random):
+    return l2_normalize([rng.gauss(0, 1) for _ in range(1536)])
+
+
+async def _ticker(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def _run(service: ScreenService, mode: str, concurrency: int, requests: int):
+    rng = random.Random(42)
+    queries = [_random_query(rng) for _ in range(min(requests, 256))]
+    latencies = []
+    lags = []
+    remaining = [requests]
+
+    async def search(query):
+        if mode == 'blocking':
+            return service.find_by_similarity(query)
+        if mode == 'thread':
+            return await asyncio.to_thread(service.find_by_similarity, query)
+        return await service.afind_by_similarity(query)
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            await search(queries[remaining[0] % len(queries)])
+            latencies.append(time.perf_counter() - started)
+
+    # Warm up the pools so connection setup is not measured
+    await asyncio.gather(*[search(queries[0]) for _ in range(min(concurrency, config.DB_POOL_SIZE))])
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+
+    return {
+        'rps': requests / elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+        'lag_p50_ms': _percentile(lags, 50) * 1000 if lags else float('nan'),
+        'lag_p99_ms': _percentile(lags, 99) * 1000 if lags else float('nan'),
+        'lag_max_ms': max(lags) * 1000 if lags else float('nan'),
+        'ticks': len(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--modes', nargs='+', default=['blocking', 'thread', 'async'], choices=['blocking', 'thread', 'async'])
+    args = parser.parse_args()
+
+    asyncio.run(_main(args))
+
+
+async def _main(args):
+    # One loop for every mode, asyncpg connections are bound to the loop that opened them
+    service = await asyncio.to_thread(ScreenService)
+
+    print(f'pool_size={config.DB_POOL_SIZE} max_overflow={config.DB_MAX_OVERFLOW} concurrency={args.concurrency}')
+    print(f'{"mode":>9} {"rps":>8} {"p50_ms":>8} {"p95_ms":>8} {"lag_p50":>8} {"lag_p99":>8} {"lag_max":>8} {"ticks":>6}')
+    for mode in args.modes:
+        r = await _run(service, mode, args.concurrency, args.requests)
+        print(f'{mode:>9} {r["rps"]:>8.0f} {r["p50_ms"]:>8.1f} {r["p95_ms"]:>8.1f} '
+              f'{r["lag_p50_ms"]:>8.1f} {r["lag_p99_ms"]:>8.1f} {r["lag_max_ms"]:>8.1f} {r["ticks"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Index size, build time, latency and recall@k of the screen embeddings at
+reduced sizes (text-embedding-3 embeddings shortened and re-normalized, which
+equals requesting the smaller size from OpenAI).
+
+Vectors are the full size embeddings already stored in `screens`, recall is
+measured against exact neighbours at full size. Queries are texts from
+`--queries-file` embedded once at full size, or stored embeddings with gaussian
+noise when no file is given. With `--synthetic N` random vectors are used
+instead of the catalog, those have no structure in their leading dimensions
+and show the worst case.
+
+Usage:
+    python -m benchmarks.embedding_dimensions --dimensions 256 512 1536 --queries-file data/queries.txt
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy
+
+from app.core.pg import pg_engine
+from services.screen_service import INDEX_OPCLASSES
+
+TABLE = 'screens_dims_bench'
+OPERATORS = {'cosine': '<=>', 'inner_product': '<#>'}
+
+
+def _shorten(vectors: numpy.ndarray, dimensions: int) -> numpy.ndarray:
+    shortened = numpy.ascontiguousarray(vectors[:, :dimensions])
+    return shortened / numpy.linalg.norm(shortened, axis=1, keepdims=True)
+
+
+def _to_literal(vector: numpy.ndarray) -> str:
+    return '[' + ','.join(f'{x:.7f}' for x in vector) + ']'
+
+
+def _catalog_vectors() -> numpy.ndarray:
+    from services.screen_service import ScreenService
+
+    screens, _ = ScreenService().load_vectors()
+    return numpy.asarray([numpy.asarray(s.embedding, dtype=numpy.float32) for s in screens])
+
+
+def _queries(vectors: numpy.ndarray, args) -> numpy.ndarray:
+    if args.queries_file:
+        from openai import OpenAI
+
+        from app.agents.tools.knowledgebase import EMBEDDING_MODEL
+        from app.core.config import config
+
+        with open(args.queries_file) as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+        resp = OpenAI(api_key=config.OPEN_AI_KEY).embeddings.create(model=EMBEDDING_MODEL, input=texts, dimensions=vectors.shape[1])
+        return _shorten(numpy.asarray([d.embedding for d in sorted(resp.data, key=lambda d: d.index)], dtype=numpy.float32), vectors.shape[1])
+
+    rng = numpy.random.default_rng(args.seed + 1)
+    picked = vectors[rng.integers(0, len(vectors), args.queries)]
+    return _shorten(picked + rng.standard_normal(picked.shape, dtype=numpy.float32) * args.noise, vectors.shape[1])
+
+
+def _load(raw_conn, vectors: numpy.ndarray, metric: str, m: int, ef_construction: int):
+    """Scratch table at the size of `vectors` with an HNSW index, returns (build seconds, index bytes)"""
+    with raw_conn.cursor() as cur:
+        cur.execute(f'drop table if exists {TABLE}')
+        cur.execute(f'create table {TABLE} (id bigint primary key, embedding vector({vectors.shape[1]}) not null)')
+
+        buffer = io.StringIO()
+        for i, v in enumerate(vectors):
+            buffer.write(f'{i}\t{_to_literal(v)}\n')
+        buffer.seek(0)
+        cur.copy_expert(f'copy {TABLE} (id, embedding) from stdin', buffer)
+
+        started = time.perf_counter()
+        cur.execute(
+            f'create index {TABLE}_embedding on {TABLE} using hnsw (embedding {INDEX_OPCLASSES[metric]}) '
+            f'with (m = {m}, ef_construction = {ef_construction})'
+        )
+        build_seconds = time.perf_counter() - started
+
+        cur.execute(f'analyze {TABLE}')
+        cur.execute(f"select pg_relation_size('{TABLE}_embedding')")
+        size = cur.fetchone()[0]
+
+    raw_conn.commit()
+    return build_seconds, size
+
+
+def _search(raw_conn, queries: numpy.ndarray, k: int, metric: str, ef_search: int):
+    latencies = []
+    found = []
+
+    with raw_conn.cursor() as cur:
+        cur.execute("select set_config('hnsw.ef_search', %s, false)", (str(ef_search),))
+        for q in queries:
+            started = time.perf_counter()
+            cur.execute(f'select id from {TABLE} order by embedding {OPERATORS[metric]} %s::vector limit %s', (_to_literal(q), k))
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append([r[0] for r in rows])
+
+    return found, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[256, 512, 1536])
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--queries-file')
+    parser.add_argument('--noise', type=float, default=0.02)
+    parser.add_argument('--synthetic', type=int, help='random vectors instead of the catalog')
+    parser.add_argument('--metric', choices=list(OPERATORS), default='inner_product')
+    parser.add_argument('--m', type=int, default=16)
+    parser.add_argument('--ef-construction', type=int, default=64)
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[20, 40, 80])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = _shorten(numpy.random.default_rng(args.seed).standard_normal((args.synthetic, 1536), dtype=numpy.float32), 1536)
+    else:
+        vectors = _catalog_vectors()
+
+    queries = _queries(vectors, args)
+    truth = numpy.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    raw_conn = pg_engine.raw_connection()
+    try:
+        print(f'# {len(vectors)} vectors, {len(queries)} queries, recall against exact {vectors.shape[1]} dimensional neighbours')
+        print(f'{"dims":>5} {"index MiB":>10} {"build s":>8} {"ef_search":>9} {"recall@" + str(args.k):>9} {"p50 ms":>8} {"p95 ms":>8}')
+        for dimensions in args.dimensions:
+            build_seconds, size = _load(raw_conn, _shorten(vectors, dimensions), args.metric, args.m, args.ef_construction)
+
+            for ef_search in args.ef_search:
+                found, latencies = _search(raw_conn, _shorten(queries, dimensions), args.k, args.metric, ef_search)
+                recall = sum(len(set(f) & set(t.tolist())) for f, t in zip(found, truth)) / truth.size
+                p95 = statistics.quantiles(latencies, n=20)[18]
+                print(f'{dimensions:>5} {size / 2 ** 20:>10.1f} {build_seconds:>8.1f} {ef_search:>9} {recall:>9.3f} '
+                      f'{statistics.median(latencies):>8.2f} {p95:>8.2f}')
+    finally:
+        with raw_conn.cursor() as cur:
+            cur.execute(f'drop table if exists {TABLE}')
+        raw_conn.commit()
+        raw_conn.close()
+
+
+if __name__ == '__main__':
+    main()
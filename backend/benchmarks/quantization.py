@@ -0,0 +1,126 @@
+"""
+Storage, build time, latency and recall@k per quantization level of the
+embedding index, on a scratch table of random L2-normalized vectors.
+
+  none     HNSW/IVFFlat on the full precision vector column
+  halfvec  index on embedding::halfvec, exact re-rank of the candidates
+  binary   index on binary_quantize(embedding)::bit, exact re-rank of the candidates
+
+For the quantized levels every `--rerank-candidates` value is reported, recall
+is measured against exact brute-force neighbours computed while loading.
+Random vectors are a worst case for binary codes, real embeddings cluster and
+keep more of their neighbourhood after quantization.
+
+Usage:
+    python -m benchmarks.quantization --size 100000 --levels none halfvec binary --rerank-candidates 20 40 80 160
+"""
+import argparse
+import statistics
+import time
+
+import numpy
+
+from app.core.pg import pg_engine
+from benchmarks.vector_index import OPERATORS, TABLE, _load, _random_unit_vectors, _recall, _to_literal
+from services.screen_service import EMBEDDING_DIMENSIONS, HALFVEC_OPCLASSES, QUANTIZATION_LEVELS, VectorIndexConfig
+
+DIM = EMBEDDING_DIMENSIONS
+
+
+def _coarse_order(level: str, metric: str) -> str:
+    if level == 'halfvec':
+        return f'embedding::halfvec({DIM}) {OPERATORS[metric]} %(q)s::halfvec({DIM})'
+    return f'binary_quantize(embedding)::bit({DIM}) <~> binary_quantize(%(q)s::vector)::bit({DIM})'
+
+
+def _search_sql(level: str, metric: str) -> str:
+    exact = f'embedding {OPERATORS[metric]} %(q)s::vector'
+    if level == 'none':
+        return f'select id from {TABLE} order by {exact} limit %(k)s'
+
+    return (
+        f'select id from (select id, embedding from {TABLE} order by {_coarse_order(level, metric)} limit %(candidates)s) candidates '
+        f'order by {exact} limit %(k)s'
+    )
+
+
+def _build(raw_conn, index_config: VectorIndexConfig) -> tuple:
+    with raw_conn.cursor() as cur:
+        cur.execute(f"select indexname from pg_indexes where tablename = '{TABLE}' and indexname <> '{TABLE}_pkey'")
+        for (index_name,) in cur.fetchall():
+            cur.execute(f'drop index {index_name}')
+
+        sql = index_config.create_index_sql() if index_config.quantization == 'none' else index_config.create_quantized_index_sql()
+        name = index_config.index_name if index_config.quantization == 'none' else index_config.quantized_index_name
+
+        started = time.perf_counter()
+        cur.execute(sql)
+        cur.execute(f'analyze {TABLE}')
+        build_seconds = time.perf_counter() - started
+
+        cur.execute('select pg_relation_size(%s::regclass)', (name,))
+        size = cur.fetchone()[0]
+
+    raw_conn.commit()
+    return build_seconds, size
+
+
+def _search(raw_conn, sql: str, queries: numpy.ndarray, k: int, candidates: int):
+    latencies = []
+    found = []
+
+    with raw_conn.cursor() as cur:
+        for q in queries:
+            started = time.perf_counter()
+            cur.execute(sql, {'q': _to_literal(q), 'k': k, 'candidates': candidates})
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append([r[0] for r in rows])
+
+    return found, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--levels', nargs='+', choices=QUANTIZATION_LEVELS, default=list(QUANTIZATION_LEVELS))
+    parser.add_argument('--metric', choices=list(HALFVEC_OPCLASSES), default='inner_product')
+    parser.add_argument('--rerank-candidates', type=int, nargs='+', default=[20, 40, 80, 160])
+    parser.add_argument('--ef-search', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    queries = _random_unit_vectors(numpy.random.default_rng(args.seed + 1), args.queries, DIM)
+
+    raw_conn = pg_engine.raw_connection()
+    try:
+        truth = _load(raw_conn, args.size, DIM, queries, args.k, args.seed)
+
+        with raw_conn.cursor() as cur:
+            cur.execute(f"select pg_table_size('{TABLE}')")
+            print(f'# {args.size} rows, table {cur.fetchone()[0] / 2 ** 20:.1f} MiB')
+
+        print(f'{"level":>8} {"index MiB":>10} {"build s":>8} {"candidates":>10} {"recall@" + str(args.k):>9} {"p50 ms":>8} {"p95 ms":>8}')
+        for level in args.levels:
+            index_config = VectorIndexConfig(index_type='hnsw', metric=args.metric, quantization=level, table=TABLE)
+            build_seconds, size = _build(raw_conn, index_config)
+
+            for candidates in ([args.k] if level == 'none' else args.rerank_candidates):
+                with raw_conn.cursor() as cur:
+                    cur.execute("select set_config('hnsw.ef_search', %s, false)", (str(max(args.ef_search, candidates)),))
+
+                found, latencies = _search(raw_conn, _search_sql(level, args.metric), queries, args.k, candidates)
+                p95 = statistics.quantiles(latencies, n=20)[18]
+                print(f'{level:>8} {size / 2 ** 20:>10.1f} {build_seconds:>8.1f} {candidates if level != "none" else "-":>10} '
+                      f'{_recall(found, truth):>9.3f} {statistics.median(latencies):>8.2f} {p95:>8.2f}')
+    finally:
+        with raw_conn.cursor() as cur:
+            cur.execute(f'drop table if exists {TABLE}')
+        raw_conn.commit()
+        raw_conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Replays a query log through KnowledgeBase.search_screens and reports how many
+searches were answered without an embedding API call, by the exact-title fast
+path or the query embedding cache, together with the latency of each path.
+
+The query file has one query per line. Without one, every screen title in the
+`screens` table is queried once as "<title> screen" followed by the same
+number of free text queries built from the first line of its details.
+
+Usage:
+    python -m benchmarks.search_paths --queries data/query_log.txt
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.agents.tools.knowledgebase import KnowledgeBase
+from app.core.pg import pg_engine
+from services.screen_service import ScreenModel, ScreenService
+
+
+def _percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else float('nan')
+
+
+def _default_queries():
+    with Session(pg_engine) as session:
+        rows = session.execute(select(ScreenModel.name, ScreenModel.details)).all()
+
+    titles = [f'{name} screen' for name, _ in rows]
+    free_text = [(details or '').strip().splitlines()[0][:120] for _, details in rows if (details or '').strip()]
+    return titles + free_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', help='file with one query per line')
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = _default_queries()
+
+    service = ScreenService()
+    service.ensure_vector_indexes()
+    kb = KnowledgeBase(service)
+    latencies = {'title': [], 'hybrid': []}
+
+    for query in queries:
+        title_hits = kb.search_stats.title_hits
+        started = time.perf_counter()
+        kb.search_screens(query)
+        path = 'title' if kb.search_stats.title_hits > title_hits else 'hybrid'
+        latencies[path].append(time.perf_counter() - started)
+
+    print(json.dumps(kb.search_stats.as_dict(), indent=2))
+    for path, values in latencies.items():
+        print(f'{path:>7} n={len(values):<6} p50={_percentile(values, 50) * 1000:.1f}ms p95={_percentile(values, 95) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
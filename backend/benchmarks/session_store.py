@@ -0,0 +1,82 @@
+"""
+Throughput of StateManager get/update against the configured session stores
+with many live sessions. Worker threads pick random sessions and do a
+get_state followed by update_state, like one chat turn does.
+
+Usage:
+    python -m benchmarks.session_store --sessions 10000 --threads 32 --ops 200000 --stores single memory postgres
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from app.agents.session_store import InMemorySessionStore, SessionStore
+from app.agents.state_manager import StateManager
+
+
+def _build_store(name: str, stripes: int) -> SessionStore:
+    if name == 'single':
+        # One lock for every session, equivalent to the previous StateManager
+        return InMemorySessionStore(stripes=1)
+    if name == 'memory':
+        return InMemorySessionStore(stripes=stripes)
+    if name == 'postgres':
+        from services.session_store import PostgresSessionStore
+        return PostgresSessionStore()
+    raise ValueError(f'Unknown store {name}')
+
+
+def _run(manager: StateManager, session_ids, threads: int, ops: int) -> float:
+    remaining = [ops]
+    lock = threading.Lock()
+
+    def worker():
+        rng = random.Random()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+
+            session_id = rng.choice(session_ids)
+            state = manager.get_state(session_id)
+            state['user_input'] = 'add a dashboard'
+            manager.update_state(session_id, state)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in range(threads):
+            pool.submit(worker)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10_000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ops', type=int, default=200_000, help='get+update pairs per store')
+    parser.add_argument('--stripes', type=int, default=64)
+    parser.add_argument('--stores', nargs='+', default=['single', 'memory'], choices=['single', 'memory', 'postgres'])
+    args = parser.parse_args()
+
+    # StateManager logs every update at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f'{"store":>10} {"sessions":>9} {"threads":>8} {"ops/s":>10} {"us/op":>8}')
+    for name in args.stores:
+        manager = StateManager(store=_build_store(name, args.stripes))
+        session_ids = [manager.create_session() for _ in range(args.sessions)]
+
+        elapsed = _run(manager, session_ids, args.threads, args.ops)
+        print(f'{name:>10} {args.sessions:>9} {args.threads:>8} {args.ops / elapsed:>10.0f} {elapsed / args.ops * 1e6:>8.1f}')
+
+        manager.store.expire(timedelta(0))
+
+
+if __name__ == '__main__':
+    main()
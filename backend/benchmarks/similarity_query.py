@@ -0,0 +1,88 @@
+"""
+Latency of ScreenService.find_by_similarity (one statement, cutoff and image
+aggregation in SQL) against the previous two-query path (screens, then imgs,
+cutoff filtered in Python). Runs against the configured database and the
+screens already ingested there.
+
+Usage:
+    python -m benchmarks.similarity_query --iterations 200 --k 3 --max-distance 0.5
+"""
+import argparse
+import statistics
+import time
+
+from collections import defaultdict
+from typing import Callable, List
+
+import numpy
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.pg import pg_engine
+from services.screen_service import ImageModel, ScreenModel, ScreenProjection, ScreenService
+
+
+def two_query_find(service: ScreenService, query_embedding: List[float], k: int, max_distance: float) -> List[ScreenProjection]:
+    """The pre-existing implementation, kept here only as the baseline"""
+    with Session(pg_engine) as session:
+        session.execute(service._search_settings())
+        order_expr, distance_expr = service._distance_expr(query_embedding)
+
+        results = session.execute(
+            select(ScreenModel.id, ScreenModel.name, ScreenModel.details, distance_expr.label('distance')).order_by(order_expr).limit(k)
+        )
+        projections = {r.id: ScreenProjection(id=r.id, name=r.name, details=r.details, distance=r.distance, imgs=[]) for r in results}
+
+        imgs_for_screen = defaultdict(list)
+        for r in session.execute(select(ImageModel.screen_id, ImageModel.img_url).where(ImageModel.screen_id.in_(projections.keys()))):
+            imgs_for_screen[r.screen_id].append(r.img_url)
+
+        for id, p in projections.items():
+            p.imgs = imgs_for_screen[id]
+
+        return sorted([p for p in projections.values() if p.distance < max_distance], key=lambda p: p.distance)
+
+
+def _measure(fn: Callable[[List[float]], List[ScreenProjection]], queries: numpy.ndarray) -> List[float]:
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        fn(q.tolist())
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--max-distance', type=float, default=0.5)
+    parser.add_argument('--dim', type=int, default=1536)
+    args = parser.parse_args()
+
+    service = ScreenService()
+    service.ensure_vector_indexes()
+
+    rng = numpy.random.default_rng(7)
+    queries = rng.standard_normal((args.iterations, args.dim), dtype=numpy.float32)
+    queries /= numpy.linalg.norm(queries, axis=1, keepdims=True)
+
+    # Warm up connections and plans for both paths
+    _measure(lambda q: two_query_find(service, q, args.k, 2.0), queries[:10])
+    _measure(lambda q: service.find_by_similarity(q, k=args.k, max_distance=2.0), queries[:10])
+
+    paths = {
+        'two-query': lambda q: two_query_find(service, q, args.k, args.max_distance),
+        'single-statement': lambda q: service.find_by_similarity(q, k=args.k, max_distance=args.max_distance),
+    }
+
+    print(f'{"path":>18} {"p50 ms":>8} {"p95 ms":>8} {"mean ms":>8}')
+    for name, fn in paths.items():
+        latencies = _measure(fn, queries)
+        p95 = statistics.quantiles(latencies, n=20)[18]
+        print(f'{name:>18} {statistics.median(latencies):>8.2f} {p95:>8.2f} {statistics.fmean(latencies):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
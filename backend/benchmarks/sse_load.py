@@ -0,0 +1,145 @@
+"""
+Load generator for `/session` + `/chat/stream`. Each virtual user opens a
+session and sends `--messages` in order (the default is a request followed by
+accepting the edited image), `--concurrency` users run at once until
+`--turns` turns have completed.
+
+Reports p50/p95/p99 time to first token (first event after START), total
+turn latency and throughput. Start the server with MODEL_BACKEND=offline so
+no OpenAI/Gemini quota is used, OFFLINE_* settings shape the stand-ins:
+
+    MODEL_BACKEND=offline OFFLINE_LATENCY_MS=300 OFFLINE_TOKENS_PER_SECOND=50 \
+        uvicorn app.api:app --port 8000
+
+Usage:
+    python -m benchmarks.sse_load --url http://localhost:8000 --concurrency 50 --turns 1000
+    python -m benchmarks.sse_load --concurrency 10 --duration 60 --messages "Add a search bar to the product list"
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import httpx
+
+DEFAULT_MESSAGES = ['Add a vendor filter to the product list screen of OrderSys', 'yes']
+
+
+def _percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else float('nan')
+
+
+@dataclass
+class LoadResults:
+    ttft: List[float] = field(default_factory=list)
+    latency: List[float] = field(default_factory=list)
+    events: int = 0
+    errors: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def failed(self, reason: str):
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(reason)
+
+
+async def _turn(client: httpx.AsyncClient, session_id: str, message: str, results: LoadResults):
+    started = time.perf_counter()
+    first: Optional[float] = None
+    buffer = ''
+
+    async with client.stream('POST', '/chat/stream', json={'message': message, 'session_id': session_id}) as resp:
+        if resp.status_code != 200:
+            results.failed(f'HTTP {resp.status_code}')
+            return
+
+        async for chunk in resp.aiter_text():
+            buffer += chunk
+            *complete, buffer = buffer.split('\n\n')
+
+            for raw in complete:
+                content = json.loads(raw).get('content')
+                if content in ('START', 'END'):
+                    continue
+                if first is None:
+                    first = time.perf_counter() - started
+                results.events += 1
+
+    if first is None:
+        results.failed('stream ended without content')
+        return
+
+    results.ttft.append(first)
+    results.latency.append(time.perf_counter() - started)
+
+
+async def _user(client: httpx.AsyncClient, messages: List[str], remaining: List[int], deadline: float, results: LoadResults):
+    while remaining[0] > 0 and time.perf_counter() < deadline:
+        try:
+            resp = await client.post('/session')
+            resp.raise_for_status()
+            session_id = resp.json()['session_id']
+        except Exception as e:
+            results.failed(f'session: {e!r}')
+            continue
+
+        for message in messages:
+            if remaining[0] <= 0 or time.perf_counter() >= deadline:
+                return
+            remaining[0] -= 1
+
+            try:
+                await _turn(client, session_id, message, results)
+            except Exception as e:
+                results.failed(repr(e))
+
+
+async def run(url: str, concurrency: int, turns: int, duration: float, messages: List[str], timeout: float) -> LoadResults:
+    results = LoadResults()
+    remaining = [turns]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _user(client, messages, remaining, started + duration, results) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    _report(results, concurrency, elapsed)
+    return results
+
+
+def _report(results: LoadResults, concurrency: int, elapsed: float):
+    def line(name, values):
+        print(f'{name:>8} p50={_percentile(values, 50) * 1000:.1f}ms p95={_percentile(values, 95) * 1000:.1f}ms p99={_percentile(values, 99) * 1000:.1f}ms')
+
+    completed = len(results.latency)
+    print(f'concurrency={concurrency} turns={completed} errors={results.errors} elapsed={elapsed:.1f}s')
+    line('ttft', results.ttft)
+    line('latency', results.latency)
+    print(f'throughput {completed / elapsed:.2f} turns/s, {results.events / elapsed:.1f} events/s')
+
+    for sample in results.error_samples:
+        print(f'  error: {sample}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=200, help='stop after this many turns')
+    parser.add_argument('--duration', type=float, default=float('inf'), help='or after this many seconds')
+    parser.add_argument('--messages', nargs='+', default=DEFAULT_MESSAGES, help='sent in order on every session')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.concurrency, args.turns, args.duration, args.messages, args.timeout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold start benchmark for the API process: time to import `app.api`, run the
+lifespan startup and serve the first request, measured in a fresh interpreter
+per run. Each invocation appends a summary line to the history file so the
+numbers can be tracked across commits.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --first-request "POST /session"
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+HISTORY = ROOT / 'benchmarks' / 'results' / 'startup.jsonl'
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app.api
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+
+method, path = sys.argv[1].split(' ', 1)
+with TestClient(app.api.app) as client:
+    ready = time.perf_counter()
+    resp = client.request(method, path)
+    first_request = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'lifespan_ms': (ready - imported) * 1000,
+    'first_request_ms': (first_request - ready) * 1000,
+    'total_ms': (first_request - started) * 1000,
+    'status': resp.status_code,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _run_once(first_request: str) -> dict:
+    out = subprocess.check_output([sys.executable, '-c', CHILD, first_request], cwd=ROOT, env=os.environ.copy(), text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--first-request', default='POST /session', help='"METHOD /path" of the first request')
+    parser.add_argument('--no-record', action='store_true', help='do not append to the history file')
+    args = parser.parse_args()
+
+    runs = [_run_once(args.first_request) for _ in range(args.runs)]
+
+    summary = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'first_request': args.first_request,
+        'runs': args.runs,
+        'status': sorted({r['status'] for r in runs}),
+        'modules': runs[-1]['modules'],
+    }
+    for metric in ('import_ms', 'lifespan_ms', 'first_request_ms', 'total_ms'):
+        summary[metric] = round(statistics.median(r[metric] for r in runs), 1)
+
+    print(json.dumps(summary, indent=2))
+
+    if not args.no_record:
+        HISTORY.parent.mkdir(parents=True, exist_ok=True)
+        with HISTORY.open('a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+
+if __name__ == '__main__':
+    main()
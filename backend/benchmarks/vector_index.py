@@ -0,0 +1,142 @@
+"""
+Recall@k vs latency for the screens.embedding ANN index.
+
+Loads N random L2-normalized vectors into a scratch table, builds the configured
+index and, for each search knob value, reports recall@k against exact brute-force
+neighbours together with p50/p95 query latency.
+
+Usage:
+    python -m benchmarks.vector_index --sizes 10000 100000 1000000 --index hnsw --metric inner_product
+"""
+import argparse
+import io
+import statistics
+import time
+
+from typing import List
+
+import numpy
+
+from app.core.pg import pg_engine
+from services.screen_service import INDEX_OPCLASSES
+
+TABLE = 'screens_bench'
+OPERATORS = {'cosine': '<=>', 'inner_product': '<#>'}
+
+
+def _random_unit_vectors(rng: numpy.random.Generator, n: int, dim: int) -> numpy.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=numpy.float32)
+    vectors /= numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _to_literal(vector: numpy.ndarray) -> str:
+    return '[' + ','.join(f'{x:.7f}' for x in vector) + ']'
+
+
+def _load(raw_conn, size: int, dim: int, queries: numpy.ndarray, k: int, seed: int, chunk: int = 20_000) -> numpy.ndarray:
+    """COPY vectors in chunks while tracking exact top-k ids for every query"""
+    rng = numpy.random.default_rng(seed)
+    best_scores = numpy.full((len(queries), k), -numpy.inf, dtype=numpy.float32)
+    best_ids = numpy.zeros((len(queries), k), dtype=numpy.int64)
+
+    with raw_conn.cursor() as cur:
+        cur.execute(f'drop table if exists {TABLE}')
+        cur.execute(f'create table {TABLE} (id bigint primary key, embedding vector({dim}) not null)')
+
+        for offset in range(0, size, chunk):
+            vectors = _random_unit_vectors(rng, min(chunk, size - offset), dim)
+            ids = numpy.arange(offset, offset + len(vectors))
+
+            buffer = io.StringIO()
+            for i, v in zip(ids, vectors):
+                buffer.write(f'{i}\t{_to_literal(v)}\n')
+            buffer.seek(0)
+            cur.copy_expert(f'copy {TABLE} (id, embedding) from stdin', buffer)
+
+            scores = numpy.concatenate([best_scores, queries @ vectors.T], axis=1)
+            candidates = numpy.concatenate([best_ids, numpy.broadcast_to(ids, (len(queries), len(ids)))], axis=1)
+            top = numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = numpy.take_along_axis(scores, top, axis=1)
+            best_ids = numpy.take_along_axis(candidates, top, axis=1)
+
+    raw_conn.commit()
+    return best_ids
+
+
+def _build_index(raw_conn, index: str, metric: str, m: int, ef_construction: int, lists: int) -> float:
+    opclass = INDEX_OPCLASSES[metric]
+    with_clause = f'm = {m}, ef_construction = {ef_construction}' if index == 'hnsw' else f'lists = {lists}'
+
+    started = time.perf_counter()
+    with raw_conn.cursor() as cur:
+        cur.execute(f'create index on {TABLE} using {index} (embedding {opclass}) with ({with_clause})')
+        cur.execute(f'analyze {TABLE}')
+    raw_conn.commit()
+    return time.perf_counter() - started
+
+
+def _search(raw_conn, queries: numpy.ndarray, k: int, metric: str, knob: str, value: int):
+    latencies = []
+    found = []
+
+    with raw_conn.cursor() as cur:
+        cur.execute(f"select set_config('{knob}', %s, false)", (str(value),))
+        for q in queries:
+            literal = _to_literal(q)
+            started = time.perf_counter()
+            cur.execute(f'select id from {TABLE} order by embedding {OPERATORS[metric]} %s::vector limit %s', (literal, k))
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append([r[0] for r in rows])
+
+    return found, latencies
+
+
+def _recall(found: List[List[int]], truth: numpy.ndarray) -> float:
+    hits = sum(len(set(f) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--index', choices=['hnsw', 'ivfflat'], default='hnsw')
+    parser.add_argument('--metric', choices=list(OPERATORS), default='inner_product')
+    parser.add_argument('--m', type=int, default=16)
+    parser.add_argument('--ef-construction', type=int, default=64)
+    parser.add_argument('--lists', type=int, default=None, help='ivfflat lists, defaults to rows / 1000')
+    parser.add_argument('--knob-values', type=int, nargs='+', default=None, help='ef_search (hnsw) or probes (ivfflat) values')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    knob = 'hnsw.ef_search' if args.index == 'hnsw' else 'ivfflat.probes'
+    knob_values = args.knob_values or ([10, 20, 40, 80, 160] if args.index == 'hnsw' else [1, 5, 10, 20, 50])
+
+    queries = _random_unit_vectors(numpy.random.default_rng(args.seed + 1), args.queries, args.dim)
+
+    raw_conn = pg_engine.raw_connection()
+    try:
+        print(f'{"rows":>9} {"index":>8} {"knob":>16} {"recall@" + str(args.k):>9} {"p50 ms":>8} {"p95 ms":>8}')
+        for size in args.sizes:
+            truth = _load(raw_conn, size, args.dim, queries, args.k, args.seed)
+            lists = args.lists or max(size // 1000, 1)
+            build_seconds = _build_index(raw_conn, args.index, args.metric, args.m, args.ef_construction, lists)
+            print(f'# {size} rows: index built in {build_seconds:.1f}s')
+
+            for value in knob_values:
+                found, latencies = _search(raw_conn, queries, args.k, args.metric, knob, value)
+                p95 = statistics.quantiles(latencies, n=20)[18]
+                print(f'{size:>9} {args.index:>8} {knob + "=" + str(value):>16} {_recall(found, truth):>9.3f} {statistics.median(latencies):>8.2f} {p95:>8.2f}')
+    finally:
+        with raw_conn.cursor() as cur:
+            cur.execute(f'drop table if exists {TABLE}')
+        raw_conn.commit()
+        raw_conn.close()
+
+
+if __name__ == '__main__':
+    main()
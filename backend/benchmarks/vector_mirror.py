@@ -0,0 +1,119 @@
+"""
+Latency of the in-process ScreenVectorIndex against the pgvector path of
+ScreenService.find_by_similarity on the live `screens` table, plus the
+overlap of their results (the mirror is exact, pgvector uses the ANN index).
+
+Queries are stored screen embeddings with gaussian noise so they land near
+real screens. With `--synthetic N` no database is needed, the mirror is
+filled with N random vectors to show how matrix size drives latency.
+
+Usage:
+    python -m benchmarks.vector_mirror --queries 500
+    python -m benchmarks.vector_mirror --synthetic 1000 10000 100000
+"""
+import argparse
+import time
+
+from types import SimpleNamespace
+
+import numpy
+
+from app.core.config import config
+from services.screen_index import ScreenVectorIndex
+
+
+def _percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _timed(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([r.id for r in search(query)])
+        latencies.append(time.perf_counter() - started)
+    return latencies, results
+
+
+def _report(name, latencies):
+    print(f'{name:>8} p50={_percentile(latencies, 50) * 1000:.3f}ms p95={_percentile(latencies, 95) * 1000:.3f}ms')
+
+
+def _noisy_queries(vectors: numpy.ndarray, n: int, noise: float, seed: int):
+    rng = numpy.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), n)]
+    queries = picked + rng.standard_normal(picked.shape, dtype=numpy.float32) * noise
+    queries /= numpy.linalg.norm(queries, axis=1, keepdims=True)
+    return [q.tolist() for q in queries]
+
+
+class _SyntheticService:
+    def __init__(self, size: int, dim: int, seed: int):
+        self.dimensions = dim
+        rng = numpy.random.default_rng(seed)
+        vectors = rng.standard_normal((size, dim), dtype=numpy.float32)
+        vectors /= numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        self.screens = [
+            SimpleNamespace(id=i + 1, name=f'S{i}', details='', summary=None, summary_hash=None, embedding=v, imgs=[])
+            for i, v in enumerate(vectors)
+        ]
+
+    def reload_dimensions(self):
+        return self.dimensions
+
+    def load_vectors(self, after_id=0):
+        return [s for s in self.screens if s.id > after_id], []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=config.SEARCH_TOP_K)
+    parser.add_argument('--noise', type=float, default=0.02)
+    parser.add_argument('--synthetic', type=int, nargs='+', help='catalog sizes to test the mirror alone')
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        for size in args.synthetic:
+            index = ScreenVectorIndex(_SyntheticService(size, args.dim, args.seed))
+            started = time.perf_counter()
+            index.load()
+            loaded = time.perf_counter() - started
+
+            vectors = numpy.asarray([s.embedding for s in index.service.screens])
+            latencies, _ = _timed(lambda q: index.find_by_similarity(q, k=args.k, max_distance=2.0), _noisy_queries(vectors, args.queries, args.noise, args.seed))
+            print(f'screens={size} load={loaded:.2f}s matrix={vectors.nbytes / 2 ** 20:.1f}MiB')
+            _report('mirror', latencies)
+        return
+
+    from services.screen_service import ScreenService
+
+    service = ScreenService()
+    index = ScreenVectorIndex(service)
+
+    started = time.perf_counter()
+    index.load()
+    print(f'screens={len(index)} load={time.perf_counter() - started:.2f}s')
+
+    screens, _ = service.load_vectors()
+    vectors = numpy.asarray([numpy.asarray(s.embedding, dtype=numpy.float32) for s in screens])
+    queries = _noisy_queries(vectors, args.queries, args.noise, args.seed)
+
+    # Warm up the connection pool so connection setup is not measured
+    service.find_by_similarity(queries[0], k=args.k)
+
+    pg_latencies, pg_results = _timed(lambda q: service.find_by_similarity(q, k=args.k), queries)
+    mirror_latencies, mirror_results = _timed(lambda q: index.find_by_similarity(q, k=args.k), queries)
+
+    _report('pgvector', pg_latencies)
+    _report('mirror', mirror_latencies)
+
+    overlap = [len(set(p) & set(m)) / len(m) for p, m in zip(pg_results, mirror_results) if m]
+    print(f'pgvector results matching the exact mirror: {numpy.mean(overlap) if overlap else float("nan"):.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,12 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, text, select
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, text, select, insert
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from app.core.exceptions import ConversationException
 from app.core.logging import get_logger
+from app.core.migrations import ensure_schema
 from app.core.pg import pg_engine
 
 from sqlalchemy.orm import Session, DeclarativeBase, relationship, mapped_column, Mapped
@@ -16,69 +19,91 @@ class BaseModel(DeclarativeBase):
 
 class Conversation(BaseModel):
     __tablename__ = 'conversations'
-    id = Column(String)
-    session_id = Column(String)
+    id = Column(UUID(as_uuid=False), primary_key=True)
+    session_id = Column(String, unique=True, nullable=False)
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
-    metadata_field = Column(name='metadata', type=JSON)
+    metadata_field = Column('metadata', JSONB)
     messages: Mapped[List['Message']] = relationship(back_populates="conversation")
 
 
 class Message(BaseModel):
     __tablename__ = 'messages'
-    id = Column(Integer)
+    id = Column(Integer, primary_key=True)
     conversation_id = mapped_column(ForeignKey('conversations.id'))
     conversation: Mapped['Conversation'] = relationship(back_populates="messages") 
     role = Column(String)
     content = Column(String)
-    metadata = Column(JSON)
+    metadata_field = Column('metadata', JSONB)
     created_at = Column(DateTime)
 
 
+@dataclass
+class MessageRecord:
+    """A chat message waiting to be persisted, the conversation is looked up by session id"""
+    session_id: str
+    role: str
+    content: str
+    metadata: Optional[Dict[str, Any]] = None
+    created_at: datetime = field(default_factory=datetime.now)
+
+
+def _create_conversation_tables(session: Session):
+    session.execute(text(
+        '''
+        create table if not exists conversations (
+            id uuid primary key,
+            session_id varchar(255) unique not null,
+            created_at timestamp default current_timestamp,
+            updated_at timestamp default current_timestamp,
+            metadata jsonb
+        )
+        '''
+    ))
+
+    session.execute(text(
+        '''
+        create table if not exists messages (
+            id serial primary key,
+            conversation_id uuid references conversations(id) on delete cascade,
+            role varchar(50) not null,
+            content text not null,
+            metadata jsonb,
+            created_at timestamp default current_timestamp
+        )
+        '''
+    ))
+
+    session.execute(text(
+        '''
+        create index if not exists idx_messages_conversation
+        on messages(conversation_id, created_at)
+        '''
+    ))
+
+
+def _index_conversation_updated_at(session: Session):
+    session.execute(text(
+        '''
+        create index if not exists idx_conversations_updated_at
+        on conversations(updated_at)
+        '''
+    ))
+
+
+# Append only, the position of a migration in this list is its schema version
+CONVERSATION_MIGRATIONS = [
+    _create_conversation_tables,
+    _index_conversation_updated_at,
+]
+
+
 class ConversationService:
     def __init__(self):
         self.__initialize_db()
 
     def __initialize_db(self):
-        with Session(pg_engine) as session:
-            session.begin()
-            try:
-                session.execute(text(
-                    '''
-                    create table if not exists conversations (
-                        id uuid primary key,
-                        session_id varchar(255) unique not null,
-                        created_at timestamp default current_timestamp,
-                        updated_at timestamp default current_timestamp,
-                        metadata jsonb
-                    )
-                    '''
-                ))
-
-                session.execute(text(
-                    '''
-                    create table if not exists messages (
-                        id serial primary key,
-                        conversation_id uuid references conversations(id) on delete cascade,
-                        role varchar(50) not null,
-                        content text not null,
-                        metadata jsonb,
-                        created_at timestamp default current_timestamp
-                    )
-                    '''
-                ))
-
-                session.execute(text(
-                    '''
-                    create index if not exists idx_messages_conversation
-                    on messages(conversation_id, created_at)
-                    '''
-                ))
-
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                raise e
+        ensure_schema('conversations', CONVERSATION_MIGRATIONS)
 
     
     def create_conversation(self, session_id: Optional[str] = None) -> str:
@@ -107,27 +132,81 @@ class ConversationService:
             return []
             
     def add_message(self, conv_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        """Append a message to the existing conversation `conv_id`"""
+        now = datetime.now()
+
         with Session(pg_engine) as session:
             session.begin()
             try:
-                results: List[Conversation] = session.scalars(select(Conversation).where(Conversation.id.is_(conv_id)).limit(1))
-                
-                conversation = results[0]
+                updated = session.execute(
+                    text('update conversations set updated_at = greatest(updated_at, :now) where id = :conv_id'),
+                    {'conv_id': conv_id, 'now': now}
+                )
+                if updated.rowcount == 0:
+                    raise ConversationException(f'Conversation {conv_id} not found')
 
-                message = Message(
+                session.execute(insert(Message.__table__).values(
                     conversation_id=conv_id,
                     role=role,
                     content=content,
-                    metadata=metadata
-                )
+                    metadata=metadata,
+                    created_at=now
+                ))
+
+                session.commit()
+            except ConversationException:
+                session.rollback()
+                raise
+            except Exception as e:
+                session.rollback()
+                raise ConversationException(f'Failed to add message to conversation {conv_id}') from e
 
-                conversation.messages.append(message)
-                conversation.updated_at = datetime.now(datetime.tzname())
+    def add_message_for_session(self, session_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        """Append a message to the conversation of `session_id`, creating the conversation if needed"""
+        self.add_messages([MessageRecord(session_id=session_id, role=role, content=content, metadata=metadata)])
+
+    def add_messages(self, records: List[MessageRecord]):
+        """
+        Persist a batch of messages in one transaction: one upsert for the conversations of all
+        sessions in the batch and one multi-row insert for the messages.
+        """
+        if not records:
+            return
+
+        last_seen: Dict[str, datetime] = {}
+        for record in records:
+            last_seen[record.session_id] = max(record.created_at, last_seen.get(record.session_id, record.created_at))
+
+        with Session(pg_engine) as session:
+            session.begin()
+            try:
+                rows = session.execute(text(
+                    '''
+                    insert into conversations (id, session_id, created_at, updated_at)
+                    select gen_random_uuid(), s.session_id, s.seen_at, s.seen_at
+                    from unnest(cast(:session_ids as varchar[]), cast(:seen_at as timestamp[])) as s(session_id, seen_at)
+                    on conflict (session_id) do update
+                    set updated_at = greatest(conversations.updated_at, excluded.updated_at)
+                    returning id, session_id
+                    '''
+                ), {'session_ids': list(last_seen.keys()), 'seen_at': list(last_seen.values())})
+                conversation_ids = {row.session_id: row.id for row in rows}
+
+                session.execute(insert(Message.__table__).values([
+                    {
+                        'conversation_id': conversation_ids[record.session_id],
+                        'role': record.role,
+                        'content': record.content,
+                        'metadata': record.metadata,
+                        'created_at': record.created_at,
+                    }
+                    for record in records
+                ]))
 
                 session.commit()
             except Exception as e:
                 session.rollback()
-                raise e
+                raise ConversationException(f'Failed to persist {len(records)} messages') from e
 
     def get_conv_history(self, conv_id: str) -> List[Message]:
         with Session(pg_engine) as session:
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.config import config
+from app.core.logging import get_logger
+from services.conversation_service import ConversationService, MessageRecord
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class WriterStats:
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    failed: int = 0
+    batches: int = 0
+    retries: int = 0
+    max_depth: int = 0
+    last_flush_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ConversationWriter:
+    """
+    Write-behind persistence for chat messages. `record` only appends to a bounded queue and
+    never blocks, a background thread drains it in batches into ConversationService.add_messages.
+
+    While a batch is being written new messages accumulate, so batches grow with load. When the
+    queue is full new messages are dropped and counted rather than stalling the chat stream.
+    """
+
+    def __init__(self, service: ConversationService, max_queue: Optional[int] = None, batch_size: Optional[int] = None,
+                 max_retries: int = 3, retry_delay: float = 0.5):
+        self.service = service
+        self.batch_size = batch_size or config.CONVERSATION_WRITE_BATCH
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.stats = WriterStats()
+
+        self._queue: queue.Queue[MessageRecord] = queue.Queue(maxsize=max_queue or config.CONVERSATION_WRITE_QUEUE)
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='conversation-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, session_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue a message for persistence, returns False if it was dropped"""
+        if self._stopping.is_set():
+            logger.warning(f'Conversation writer closed, dropping {role} message for {session_id}')
+            return False
+
+        try:
+            self._queue.put_nowait(MessageRecord(session_id=session_id, role=role, content=content, metadata=metadata))
+        except queue.Full:
+            with self._stats_lock:
+                self.stats.dropped += 1
+            logger.warning(f'Conversation write queue full, dropping {role} message for {session_id}')
+            return False
+
+        with self._stats_lock:
+            self.stats.enqueued += 1
+            self.stats.max_depth = max(self.stats.max_depth, self._queue.qsize())
+        return True
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> List[MessageRecord]:
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch: List[MessageRecord]):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self.service.add_messages(batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f'Giving up on {len(batch)} conversation messages: {e}')
+                    with self._stats_lock:
+                        self.stats.failed += len(batch)
+                    return
+
+                logger.warning(f'Failed writing {len(batch)} conversation messages, retrying: {e}')
+                with self._stats_lock:
+                    self.stats.retries += 1
+                time.sleep(self.retry_delay * (2 ** attempt))
+                continue
+
+            with self._stats_lock:
+                self.stats.written += len(batch)
+                self.stats.batches += 1
+                self.stats.last_flush_seconds = time.perf_counter() - started
+            return
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop accepting messages and wait for everything queued to be written"""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+            logger.warning(f'Conversation writer did not drain in time, {self.depth} messages not persisted')
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from dataclasses import dataclass, asdict
+from io import BytesIO
+from pathlib import Path
+from typing import Awaitable, Callable, Collection, Dict, Optional, Tuple
+
+from PIL import Image
+
+from app.core.config import ROOT, config
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+VARIANT_FORMATS = {
+    'webp': 'image/webp',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+}
+
+# Requested widths are snapped up to one of these so the number of cached variants stays bounded
+VARIANT_WIDTHS = (128, 256, 512, 1024, 2048)
+
+
+@dataclass
+class StoredImage:
+    digest: str
+    mime_type: str
+    width: int
+    height: int
+    size: int
+
+    @property
+    def url(self) -> str:
+        return f'/images/{self.digest}'
+
+
+class ImageStore:
+    """
+    Content addressed image blobs on local disk. Images are stored once per sha256 digest,
+    with a json sidecar holding mime type and dimensions, and resized/re-encoded variants
+    are generated on first request and kept next to the original.
+
+    Blobs are kept for a retention period after they were last stored, `collect` removes older
+    ones unless they are still referenced, e.g. by a live session or the edit cache.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or config.IMAGE_STORE_PATH or ROOT / 'data' / 'blobs')
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._meta: Dict[str, StoredImage] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, digest: str) -> Path:
+        if not _DIGEST.match(digest):
+            raise ValueError(f'Invalid image digest {digest}')
+        return self.root / digest[:2]
+
+    def path_for(self, digest: str) -> Path:
+        return self._dir(digest) / digest
+
+    def _write_atomic(self, target: Path, data: bytes):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def put_bytes(self, data: bytes) -> StoredImage:
+        digest = hashlib.sha256(data).hexdigest()
+
+        existing = self.get(digest)
+        if existing is not None:
+            # Stored again, restart its retention period
+            try:
+                os.utime(self.path_for(digest))
+            except OSError:
+                pass
+            return existing
+
+        # Opening only parses the header, pixels are not decoded
+        with Image.open(BytesIO(data)) as img:
+            stored = StoredImage(
+                digest=digest,
+                mime_type=Image.MIME.get(img.format, 'application/octet-stream'),
+                width=img.width,
+                height=img.height,
+                size=len(data)
+            )
+
+        self._write_atomic(self.path_for(digest), data)
+        self._write_atomic(self._dir(digest) / f'{digest}.json', json.dumps(asdict(stored)).encode('utf-8'))
+
+        with self._lock:
+            self._meta[digest] = stored
+
+        logger.debug(f'Stored image {digest} ({stored.mime_type}, {stored.width}x{stored.height})')
+        return stored
+
+    def get(self, digest: str) -> Optional[StoredImage]:
+        stored = self._meta.get(digest)
+        if stored is not None:
+            return stored
+
+        meta_path = self._dir(digest) / f'{digest}.json'
+        if not meta_path.exists() or not self.path_for(digest).exists():
+            return None
+
+        stored = StoredImage(**json.loads(meta_path.read_text()))
+        with self._lock:
+            self._meta[digest] = stored
+        return stored
+
+    def delete(self, digest: str):
+        """Remove an image together with its sidecar and generated variants"""
+        directory = self._dir(digest)
+
+        with self._lock:
+            self._meta.pop(digest, None)
+
+        for path in directory.glob(f'{digest}*'):
+            path.unlink(missing_ok=True)
+
+    def collect(self, max_age: float, keep: Collection[str] = ()) -> int:
+        """Delete blobs last stored more than `max_age` seconds ago and not in `keep`, returns how many"""
+        cutoff = time.time() - max_age
+        removed = 0
+
+        for path in self.root.glob('*/*'):
+            digest = path.name
+            if not _DIGEST.match(digest) or digest in keep:
+                continue
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+
+            self.delete(digest)
+            removed += 1
+
+        return removed
+
+    async def run_collector(self, interval: float, max_age: float, referenced: Callable[[], Awaitable[Collection[str]]]):
+        """`collect` every `interval` seconds until cancelled, keeping the digests `referenced` returns"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                keep = await referenced()
+                removed = await asyncio.to_thread(self.collect, max_age, keep)
+                if removed:
+                    logger.debug(f'Collected {removed} expired images')
+            except Exception as e:
+                logger.error(f'Error collecting images: {e}')
+
+    def variant(self, digest: str, fmt: Optional[str] = None, width: Optional[int] = None) -> Tuple[Path, str, str]:
+        """
+        Returns (path, mime type, etag) of the requested variant, generating it if needed.
+        Raises FileNotFoundError for unknown digests and ValueError for unsupported variants.
+        """
+        stored = self.get(digest)
+        if stored is None:
+            raise FileNotFoundError(digest)
+
+        if fmt is not None and fmt not in VARIANT_FORMATS:
+            raise ValueError(f'Unsupported image format {fmt}, expected one of {tuple(VARIANT_FORMATS)}')
+
+        if width is not None:
+            if width <= 0:
+                raise ValueError('Image width must be positive')
+            width = next((w for w in VARIANT_WIDTHS if w >= width), VARIANT_WIDTHS[-1])
+            if width >= stored.width:
+                width = None
+
+        if fmt is None and width is None:
+            return self.path_for(digest), stored.mime_type, f'"{digest}"'
+
+        fmt = fmt or stored.mime_type.split('/')[-1]
+        if fmt not in VARIANT_FORMATS:
+            fmt = 'png'
+
+        variant_name = f'{digest}.{width or "full"}.{fmt}'
+        path = self._dir(digest) / variant_name
+
+        if not path.exists():
+            with Image.open(self.path_for(digest)) as img:
+                if width is not None:
+                    img.thumbnail((width, round(stored.height * width / stored.width)))
+                if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+
+                buffer = BytesIO()
+                img.save(buffer, format=fmt.upper())
+                self._write_atomic(path, buffer.getvalue())
+
+        return path, VARIANT_FORMATS[fmt], f'"{variant_name}"'
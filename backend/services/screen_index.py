@@ -0,0 +1,323 @@
+import asyncio
+import json
+import os
+import threading
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import numpy
+
+from app.agents.tools.knowledgebase import title_query
+from app.core.config import config
+from app.core.logging import get_logger
+from app.core.vectors import l2_normalize
+from services.screen_service import ScreenProjection, ScreenService, merge_nearest
+
+logger = get_logger(__name__)
+
+_SCREENS_FILE = 'screens.npy'
+_SECTIONS_FILE = 'sections.npy'
+_META_FILE = 'meta.json'
+
+# Above this many rows the product takes milliseconds, the async search moves it off the event loop
+_INLINE_ROWS = 2000
+
+
+@dataclass
+class _IndexState:
+    """Immutable once published, a refresh builds a new state and swaps the reference"""
+    screen_vectors: numpy.ndarray
+    # Row i of screen_vectors, without distance
+    screens: List[ScreenProjection]
+    section_vectors: numpy.ndarray
+    # Row index into `screens` of the owner of each section
+    section_owners: numpy.ndarray
+    section_ordinals: List[int]
+    section_contents: List[str]
+    positions: Dict[int, int] = field(default_factory=dict)
+    # Rows of the screens by `title_query` of their name
+    titles: Dict[str, List[int]] = field(default_factory=dict)
+
+    @property
+    def max_screen_id(self) -> int:
+        return self.screens[-1].id if self.screens else 0
+
+
+def _empty_state(dimensions: int) -> _IndexState:
+    return _IndexState(
+        screen_vectors=numpy.empty((0, dimensions), dtype=numpy.float32),
+        screens=[],
+        section_vectors=numpy.empty((0, dimensions), dtype=numpy.float32),
+        section_owners=numpy.empty(0, dtype=numpy.int64),
+        section_ordinals=[],
+        section_contents=[]
+    )
+
+
+def _top_k(distances: numpy.ndarray, k: int, max_distance: Optional[float]) -> numpy.ndarray:
+    """Row indices of the `k` smallest distances below `max_distance`, nearest first"""
+    if k < len(distances):
+        candidates = numpy.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = numpy.arange(len(distances))
+
+    candidates = candidates[numpy.argsort(distances[candidates], kind='stable')]
+
+    if max_distance is not None:
+        candidates = candidates[distances[candidates] < max_distance]
+
+    return candidates
+
+
+class ScreenVectorIndex:
+    """
+    In-process copy of the screen and section embeddings as contiguous float32 matrices, answering
+    `find_by_similarity` with one matrix-vector product instead of a Postgres round trip.
+
+    Embeddings are L2-normalized at ingestion, so the inner product ranks for both supported metrics
+    and distance is reported as 1 - <q, v> like the pgvector path. Screens are only ever appended,
+    `refresh` loads the ones with an id above the newest screen already held. With a `snapshot_path`
+    the matrices are memory-mapped from the last snapshot at startup and only newer screens are read.
+    """
+
+    def __init__(self, service: ScreenService, snapshot_path: Optional[str] = None, dimensions: Optional[int] = None):
+        self.service = service
+        self.snapshot_path = snapshot_path
+        self.dimensions = dimensions or service.dimensions
+        self._state = _empty_state(self.dimensions)
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._state.screens)
+
+    def load(self) -> int:
+        """Load the snapshot, when there is one, then everything newer from the database"""
+        if self.snapshot_path:
+            snapshot = self._read_snapshot()
+            if snapshot is not None:
+                self._state = snapshot
+                logger.info(f'Loaded {len(snapshot.screens)} screens from vector snapshot {self.snapshot_path}')
+
+        added = self.refresh()
+
+        if self.snapshot_path and added:
+            self.save_snapshot()
+
+        return added
+
+    def refresh(self) -> int:
+        """Append screens ingested since the last refresh, returns the number added"""
+        with self._refresh_lock:
+            state = self._state
+
+            dimensions = self.service.reload_dimensions()
+            if dimensions != self.dimensions:
+                # The catalog was re-embedded at another size, every vector held is stale
+                logger.info(f'Stored embeddings changed to {dimensions} dimensions, reloading the vector index')
+                self.dimensions = dimensions
+                state = _empty_state(dimensions)
+
+            screens, sections = self.service.load_vectors(after_id=state.max_screen_id)
+
+            if not screens:
+                return 0
+
+            self._state = self._append(state, screens, sections)
+
+        logger.info(f'Vector index holds {len(self._state.screens)} screens after adding {len(screens)}')
+        return len(screens)
+
+    async def run_refresher(self, interval: float):
+        """Pick up screens ingested by other processes every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                added = await asyncio.to_thread(self.refresh)
+                if added and self.snapshot_path:
+                    await asyncio.to_thread(self.save_snapshot)
+            except Exception as e:
+                logger.error(f'Error refreshing vector index: {e}')
+
+    def update_summary(self, screen_id: int, summary: str, summary_hash: str):
+        with self._refresh_lock:
+            state = self._state
+            position = state.positions.get(screen_id)
+
+            if position is not None:
+                screens = list(state.screens)
+                screens[position] = replace(screens[position], summary=summary, summary_hash=summary_hash)
+                self._state = replace(state, screens=screens)
+
+    def find_by_title(self, title: str) -> List[ScreenProjection]:
+        """Screens whose name reduces to `title` under `title_query`, as exact title hits of `ScreenService.find_by_text`"""
+        state = self._state
+        return [
+            replace(state.screens[i], distance=0.0, title_similarity=1.0)
+            for i in state.titles.get(title, [])[:config.SEARCH_TOP_K]
+        ]
+
+    def find_by_similarity(self, query_embedding: List[float], k: Optional[int] = None, max_distance: Optional[float] = None) -> List[ScreenProjection]:
+        """Same results as `ScreenService.find_by_similarity` with an exact (not approximate) nearest neighbour search"""
+        k = k or config.SEARCH_TOP_K
+        max_distance = config.SEARCH_MAX_DISTANCE if max_distance is None else max_distance
+
+        state = self._state
+        dimensions = state.screen_vectors.shape[1]
+
+        if len(query_embedding) > dimensions:
+            query_embedding = l2_normalize(query_embedding[:dimensions])
+        query = numpy.asarray(query_embedding, dtype=numpy.float32)
+
+        if not config.SEARCH_SECTIONS:
+            return self._find_screens(state, query, k, max_distance)
+
+        section_hits = self._find_sections(state, query, k, max_distance, config.SEARCH_SECTIONS_K) if len(state.section_vectors) else []
+
+        # Screens ingested before sections existed are only reachable as a whole
+        without_sections = numpy.ones(len(state.screens), dtype=bool)
+        without_sections[state.section_owners] = False
+        screen_hits = self._find_screens(state, query, k, max_distance, numpy.flatnonzero(without_sections))
+
+        return merge_nearest(section_hits, screen_hits, k)
+
+    def _find_screens(self, state: _IndexState, query: numpy.ndarray, k: int, max_distance: Optional[float], rows: Optional[numpy.ndarray] = None) -> List[ScreenProjection]:
+        """The `k` nearest screens, of the ones at `rows` when given"""
+        vectors = state.screen_vectors if rows is None else state.screen_vectors[rows]
+        if not len(vectors):
+            return []
+
+        distances = 1.0 - vectors @ query
+
+        return [
+            replace(state.screens[i if rows is None else rows[i]], distance=float(distances[i]))
+            for i in _top_k(distances, k, max_distance)
+        ]
+
+    async def afind_by_similarity(self, query_embedding: List[float], k: Optional[int] = None, max_distance: Optional[float] = None) -> List[ScreenProjection]:
+        state = self._state
+        if len(state.screen_vectors) + len(state.section_vectors) <= _INLINE_ROWS:
+            # Sub millisecond, cheaper than a thread hop
+            return self.find_by_similarity(query_embedding, k, max_distance)
+
+        # numpy releases the GIL in the product
+        return await asyncio.to_thread(self.find_by_similarity, query_embedding, k, max_distance)
+
+    def _find_sections(self, state: _IndexState, query: numpy.ndarray, k: int, max_distance: Optional[float], k_sections: int) -> List[ScreenProjection]:
+        """The `k` screens owning the `k_sections` nearest sections, ranked by their best section"""
+        distances = 1.0 - state.section_vectors @ query
+        nearest = _top_k(distances, k_sections, max_distance)
+
+        matched: Dict[int, List[int]] = {}
+        for i in nearest:
+            matched.setdefault(int(state.section_owners[i]), []).append(int(i))
+
+        # Dicts keep insertion order and `nearest` is sorted, so owners are ranked by their best section
+        return [
+            replace(
+                state.screens[owner],
+                distance=float(distances[rows[0]]),
+                sections=[state.section_contents[i] for i in sorted(rows, key=lambda i: state.section_ordinals[i])]
+            )
+            for owner, rows in list(matched.items())[:k]
+        ]
+
+    def _append(self, state: _IndexState, screens: List, sections: List) -> _IndexState:
+        positions = dict(state.positions)
+        titles = {title: list(rows) for title, rows in state.titles.items()}
+        projections = list(state.screens)
+
+        for row in screens:
+            positions[row.id] = len(projections)
+            titles.setdefault(title_query(row.name or ''), []).append(len(projections))
+            projections.append(ScreenProjection(
+                id=row.id,
+                name=row.name,
+                details=row.details,
+                distance=0.0,
+                imgs=list(row.imgs or []),
+                summary=row.summary,
+                summary_hash=row.summary_hash
+            ))
+
+        def stack(current: numpy.ndarray, rows: List) -> numpy.ndarray:
+            if not rows:
+                return current
+            added = numpy.asarray([numpy.asarray(r.embedding, dtype=numpy.float32) for r in rows], dtype=numpy.float32)
+            # Copies a memory-mapped snapshot into memory, later refreshes append to a regular array
+            return numpy.ascontiguousarray(numpy.concatenate([current, added]))
+
+        return _IndexState(
+            screen_vectors=stack(state.screen_vectors, screens),
+            screens=projections,
+            section_vectors=stack(state.section_vectors, sections),
+            section_owners=numpy.concatenate([state.section_owners, numpy.asarray([positions[r.screen_id] for r in sections], dtype=numpy.int64)]),
+            section_ordinals=state.section_ordinals + [r.ordinal for r in sections],
+            section_contents=state.section_contents + [r.content for r in sections],
+            positions=positions,
+            titles=titles
+        )
+
+    def save_snapshot(self):
+        """Write the matrices and screen metadata, each file is replaced atomically"""
+        state = self._state
+        os.makedirs(self.snapshot_path, exist_ok=True)
+
+        def write(name: str, writer):
+            tmp = os.path.join(self.snapshot_path, f'.{name}.tmp')
+            with open(tmp, 'wb') as f:
+                writer(f)
+            os.replace(tmp, os.path.join(self.snapshot_path, name))
+
+        write(_SCREENS_FILE, lambda f: numpy.save(f, state.screen_vectors))
+        write(_SECTIONS_FILE, lambda f: numpy.save(f, state.section_vectors))
+
+        # Written last, a snapshot whose matrices don't match it is ignored on load
+        meta = {
+            'dimensions': self.dimensions,
+            'screens': [
+                {'id': s.id, 'name': s.name, 'details': s.details, 'imgs': s.imgs, 'summary': s.summary, 'summary_hash': s.summary_hash}
+                for s in state.screens
+            ],
+            'sections': [
+                {'owner': int(owner), 'ordinal': ordinal, 'content': content}
+                for owner, ordinal, content in zip(state.section_owners, state.section_ordinals, state.section_contents)
+            ]
+        }
+        write(_META_FILE, lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+    def _read_snapshot(self) -> Optional[_IndexState]:
+        try:
+            with open(os.path.join(self.snapshot_path, _META_FILE), 'rb') as f:
+                meta = json.loads(f.read())
+
+            screen_vectors = numpy.load(os.path.join(self.snapshot_path, _SCREENS_FILE), mmap_mode='r')
+            section_vectors = numpy.load(os.path.join(self.snapshot_path, _SECTIONS_FILE), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'Ignoring unreadable vector snapshot {self.snapshot_path}: {e}')
+            return None
+
+        if (meta.get('dimensions') != self.dimensions
+                or screen_vectors.shape != (len(meta['screens']), self.dimensions)
+                or section_vectors.shape != (len(meta['sections']), self.dimensions)):
+            logger.warning(f'Ignoring vector snapshot {self.snapshot_path}, it does not match its metadata')
+            return None
+
+        screens = [ScreenProjection(distance=0.0, **s) for s in meta['screens']]
+
+        titles: Dict[str, List[int]] = {}
+        for i, s in enumerate(screens):
+            titles.setdefault(title_query(s.name or ''), []).append(i)
+
+        return _IndexState(
+            screen_vectors=screen_vectors,
+            screens=screens,
+            section_vectors=section_vectors,
+            section_owners=numpy.asarray([s['owner'] for s in meta['sections']], dtype=numpy.int64),
+            section_ordinals=[s['ordinal'] for s in meta['sections']],
+            section_contents=[s['content'] for s in meta['sections']],
+            positions={s.id: i for i, s in enumerate(screens)},
+            titles=titles
+        )
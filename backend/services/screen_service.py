@@ -1,16 +1,29 @@
-from collections import defaultdict
-from typing import List
-from dataclasses import dataclass
+import zlib
 
-from sqlalchemy import ForeignKey, Column, Integer, String, JSON, DateTime, select, text
+from typing import List, Optional, Set, Tuple
+from dataclasses import astuple, dataclass, field, replace
+
+from sqlalchemy import ForeignKey, Column, Computed, Integer, String, JSON, DateTime, cast, exists, func, literal, literal_column, null, or_, select, text, update
 from sqlalchemy.orm import Session, DeclarativeBase, mapped_column, relationship, Mapped, joinedload
-from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import TSVECTOR, aggregate_order_by
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
 
+from app.core.config import config
 from app.core.logging import get_logger
-from app.core.pg import pg_engine
+from app.core.metrics import DB_QUERY_SECONDS, timed
+from app.core.migrations import ensure_schema
+from app.core.pg import pg_async_session, pg_engine
+from app.core.vectors import l2_normalize
 
 logger = get_logger(__name__)
 
+# Size of the embeddings of a new catalog. An existing catalog keeps the size it was created
+# with until it is moved with `python -m services.vector_migration reembed`.
+EMBEDDING_DIMENSIONS = config.EMBEDDING_DIMENSIONS
+
+# Full text document of a screen, title matches rank above matches in the details
+SEARCH_TSV_EXPR = "setweight(to_tsvector('english', coalesce(name, '')), 'A') || setweight(to_tsvector('english', coalesce(details, '')), 'B')"
+
 class BaseModel(DeclarativeBase):
     pass
 
@@ -19,11 +32,26 @@ class ScreenModel(BaseModel):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     details = Column(String)
-    embedding = Column(Vector(1536))
+    embedding = Column(Vector())
+    summary = Column(String)
+    summary_hash = Column(String)
+    search_tsv = Column(TSVECTOR, Computed(SEARCH_TSV_EXPR, persisted=True))
     imgs: Mapped[List['ImageModel']] = relationship(back_populates='screen')
+    sections: Mapped[List['SectionModel']] = relationship(back_populates='screen', order_by='SectionModel.ordinal')
     created_at = Column(DateTime)
     
 
+class SectionModel(BaseModel):
+    __tablename__ = 'screen_sections'
+    id = Column(Integer, primary_key=True)
+    screen_id = mapped_column(ForeignKey('screens.id'))
+    screen: Mapped['ScreenModel'] = relationship('ScreenModel', back_populates='sections')
+    ordinal = Column(Integer)
+    path = Column(String)
+    content = Column(String)
+    embedding = Column(Vector())
+
+
 class ImageModel(BaseModel):
     __tablename__ = 'imgs'
     id = Column(Integer, primary_key=True)
@@ -40,92 +68,663 @@ class ScreenProjection:
     details: str
     distance: float
     imgs: List[str]
+    summary: Optional[str] = None
+    summary_hash: Optional[str] = None
+    # Sections of the screen matching the query, in document order
+    sections: List[str] = field(default_factory=list)
+    # Set by text search: trigram similarity of the title to the query and full text rank
+    title_similarity: float = 0.0
+    text_rank: float = 0.0
+
+def _create_screens_tables(session: Session):
+    session.execute(text(f'''
+        create table if not exists screens (
+            id serial primary key,
+            name text not null,
+            details text,
+            embedding vector({EMBEDDING_DIMENSIONS}) not null,
+            created_at timestamp default current_timestamp
+        )
+    '''))
+
+    session.execute(text('''
+        create table if not exists imgs (
+            id serial primary key,
+            screen_id integer references screens(id) on delete cascade,
+            img_url text not null,
+            metadata jsonb,
+            created_at timestamp default current_timestamp
+        );
+    '''))
+
+
+def _add_screen_summary(session: Session):
+    session.execute(text('''
+        alter table screens
+            add column if not exists summary text,
+            add column if not exists summary_hash varchar(64)
+    '''))
+
+
+def _create_screen_sections(session: Session):
+    session.execute(text(f'''
+        create table if not exists screen_sections (
+            id serial primary key,
+            screen_id integer not null references screens(id) on delete cascade,
+            ordinal integer not null,
+            path text not null,
+            content text not null,
+            embedding vector({EMBEDDING_DIMENSIONS}) not null
+        )
+    '''))
+
+    session.execute(text('create index if not exists idx_screen_sections_screen on screen_sections(screen_id, ordinal)'))
+
+
+def _add_screen_text_search(session: Session):
+    session.execute(text('create extension if not exists pg_trgm'))
+
+    session.execute(text(f'''
+        alter table screens
+            add column if not exists search_tsv tsvector generated always as ({SEARCH_TSV_EXPR}) stored
+    '''))
+
+    session.execute(text('create index if not exists idx_screens_search_tsv on screens using gin (search_tsv)'))
+    session.execute(text('create index if not exists idx_screens_name_trgm on screens using gin (lower(name) gin_trgm_ops)'))
+
+
+# Append only, the position of a migration in this list is its schema version
+SCREENS_MIGRATIONS = [
+    _create_screens_tables,
+    _add_screen_summary,
+    _create_screen_sections,
+    _add_screen_text_search,
+]
+
+INDEX_TYPES = ('hnsw', 'ivfflat', 'none')
+
+# Levels of the optional quantized index searched before an exact re-rank on the full vectors
+QUANTIZATION_LEVELS = ('none', 'halfvec', 'binary')
+
+# pgvector operator class per supported metric. Inner product is only a valid
+# similarity ordering because KnowledgeBase stores L2-normalized vectors.
+INDEX_OPCLASSES = {
+    'cosine': 'vector_cosine_ops',
+    'inner_product': 'vector_ip_ops',
+}
+
+HALFVEC_OPCLASSES = {
+    'cosine': 'halfvec_cosine_ops',
+    'inner_product': 'halfvec_ip_ops',
+}
+
+@dataclass
+class VectorIndexConfig:
+    index_type: str = field(default_factory=lambda: config.VECTOR_INDEX_TYPE)
+    metric: str = field(default_factory=lambda: config.VECTOR_INDEX_METRIC)
+    m: int = field(default_factory=lambda: config.VECTOR_INDEX_M)
+    ef_construction: int = field(default_factory=lambda: config.VECTOR_INDEX_EF_CONSTRUCTION)
+    lists: int = field(default_factory=lambda: config.VECTOR_INDEX_LISTS)
+    ef_search: int = field(default_factory=lambda: config.VECTOR_SEARCH_EF)
+    probes: int = field(default_factory=lambda: config.VECTOR_SEARCH_PROBES)
+    quantization: str = field(default_factory=lambda: config.VECTOR_QUANTIZATION)
+    rerank_candidates: int = field(default_factory=lambda: config.VECTOR_RERANK_CANDIDATES)
+    # Quantized expressions cast to a fixed size, ScreenService sets the size of the stored embeddings
+    dimensions: int = field(default_factory=lambda: config.EMBEDDING_DIMENSIONS)
+    table: str = 'screens'
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f'Unsupported vector index type {self.index_type}, expected one of {INDEX_TYPES}')
+        if self.metric not in INDEX_OPCLASSES:
+            raise ValueError(f'Unsupported vector metric {self.metric}, expected one of {tuple(INDEX_OPCLASSES)}')
+        if self.quantization not in QUANTIZATION_LEVELS:
+            raise ValueError(f'Unsupported vector quantization {self.quantization}, expected one of {QUANTIZATION_LEVELS}')
+        if self.quantization != 'none' and self.index_type == 'none':
+            raise ValueError('Vector quantization needs an index type, the quantized column is only searched through its index')
+
+    @property
+    def index_name(self) -> str:
+        """Index name encodes its build parameters so a config change is detected as a stale index"""
+        if self.index_type == 'hnsw':
+            return f'idx_{self.table}_embedding_hnsw_{self.metric}_m{self.m}_ef{self.ef_construction}'
+        return f'idx_{self.table}_embedding_ivfflat_{self.metric}_l{self.lists}'
+
+    @property
+    def quantized_index_name(self) -> str:
+        # Binary codes are always compared by hamming distance, the metric is not part of the name
+        metric = '' if self.quantization == 'binary' else f'_{self.metric}'
+        prefix = f'idx_{self.table}_q{self.quantization}_d{self.dimensions}'
+        if self.index_type == 'hnsw':
+            return f'{prefix}_hnsw{metric}_m{self.m}_ef{self.ef_construction}'
+        return f'{prefix}_ivfflat{metric}_l{self.lists}'
+
+    def create_quantized_index_sql(self, concurrently: bool = False) -> str:
+        """Expression index over the quantized full precision column, inserts need no extra column"""
+        if self.quantization == 'halfvec':
+            target = f'(embedding::halfvec({int(self.dimensions)})) {HALFVEC_OPCLASSES[self.metric]}'
+        else:
+            target = f'(binary_quantize(embedding)::bit({int(self.dimensions)})) bit_hamming_ops'
+
+        if self.index_type == 'hnsw':
+            method = f'hnsw ({target}) with (m = {int(self.m)}, ef_construction = {int(self.ef_construction)})'
+        else:
+            method = f'ivfflat ({target}) with (lists = {int(self.lists)})'
+
+        return f'create index {"concurrently " if concurrently else ""}if not exists {self.quantized_index_name} on {self.table} using {method}'
+
+    def create_index_sql(self, column: str = 'embedding', index_name: Optional[str] = None, concurrently: bool = False) -> str:
+        """DDL of the full precision index, another `column` and `index_name` build it for a column being migrated"""
+        opclass = INDEX_OPCLASSES[self.metric]
+        prefix = f'create index {"concurrently " if concurrently else ""}if not exists {index_name or self.index_name} on {self.table}'
+
+        if self.index_type == 'hnsw':
+            return f'{prefix} using hnsw ({column} {opclass}) with (m = {int(self.m)}, ef_construction = {int(self.ef_construction)})'
+        return f'{prefix} using ivfflat ({column} {opclass}) with (lists = {int(self.lists)})'
+
+
+def merge_nearest(section_hits: List[ScreenProjection], screen_hits: List[ScreenProjection], k: int) -> List[ScreenProjection]:
+    """
+    Screens found through their sections together with screens that have no sections, i.e. were
+    ingested before sections existed and are only searchable as a whole, `k` nearest first
+    """
+    return sorted(section_hits + screen_hits, key=lambda r: r.distance)[:k]
+
+
+# typmod of a pgvector column is its dimension count
+_STORED_DIMENSIONS = text("select atttypmod from pg_attribute where attrelid = 'screens'::regclass and attname = 'embedding'")
+
+# Index configs already verified by this process
+_ensured_indexes: Set[Tuple] = set()
+
+# Held while a process syncs the vector indexes, so concurrently starting workers don't undo each other's builds
+_INDEX_LOCK_ID = zlib.crc32(b'vector_index')
+
+# A concurrent build is invalid until it completes, `building` tells it from one that was interrupted
+_MANAGED_INDEXES = text('''
+    select c.relname, i.indisvalid,
+        exists (select 1 from pg_stat_progress_create_index p where p.index_relid = i.indexrelid) as building
+    from pg_index i
+    join pg_class c on c.oid = i.indexrelid
+    join pg_class t on t.oid = i.indrelid
+    where t.relname = :table and c.relname like :prefix
+''')
+
 
 class ScreenService:
-    def __init__(self):
+    def __init__(self, index_config: Optional[VectorIndexConfig] = None):
         self.__initialize_db()
+        self.dimensions = self.__stored_dimensions()
+
+        if self.dimensions != config.EMBEDDING_DIMENSIONS:
+            logger.warning(
+                f'Stored embeddings have {self.dimensions} dimensions, EMBEDDING_DIMENSIONS is {config.EMBEDDING_DIMENSIONS}. '
+                f'Searching at {self.dimensions}, run `python -m services.vector_migration reembed` to move the catalog.'
+            )
+
+        self.index_config = replace(index_config or VectorIndexConfig(), dimensions=self.dimensions)
+        self.section_index_config = replace(self.index_config, table='screen_sections')
 
     def __initialize_db(self):
+        ensure_schema('screens', SCREENS_MIGRATIONS)
+
+    def __stored_dimensions(self) -> int:
+        with Session(pg_engine) as session:
+            return session.execute(_STORED_DIMENSIONS).scalar()
+
+    @timed(DB_QUERY_SECONDS, 'reload_dimensions')
+    def reload_dimensions(self) -> int:
+        """Pick up a catalog re-embedded at another size while this process was running"""
+        return self.__set_dimensions(self.__stored_dimensions())
+
+    @timed(DB_QUERY_SECONDS, 'areload_dimensions')
+    async def areload_dimensions(self) -> int:
+        async with pg_async_session() as session:
+            return self.__set_dimensions((await session.execute(_STORED_DIMENSIONS)).scalar())
+
+    def __set_dimensions(self, dimensions: int) -> int:
+        if dimensions != self.dimensions:
+            logger.info(f'Stored embeddings changed from {self.dimensions} to {dimensions} dimensions')
+            self.index_config = replace(self.index_config, dimensions=dimensions)
+            self.section_index_config = replace(self.section_index_config, dimensions=dimensions)
+            self.dimensions = dimensions
+
+        return dimensions
+
+    def fit_query(self, query_embedding: List[float]) -> List[float]:
+        """
+        Shorten a query embedded at a larger size to the stored one. text-embedding-3 embeddings
+        truncated and re-normalized equal embeddings requested at the smaller size.
+        """
+        if len(query_embedding) > self.dimensions:
+            return l2_normalize(query_embedding[:self.dimensions])
+        return query_embedding
+
+    @timed(DB_QUERY_SECONDS, 'save')
+    def save(self, screen: ScreenModel):
         with Session(pg_engine) as session:
             session.begin()
             try:
-                session.execute(text('''
-                    create table if not exists screens (
-                        id serial primary key,
-                        name text not null,
-                        details text,
-                        embedding vector(1536) not null,
-                        created_at timestamp default current_timestamp
-                    )
-                '''))
-
-                session.execute(text('''
-                    create table if not exists imgs (
-                        id serial primary key,
-                        screen_id integer references screens(id) on delete cascade,
-                        img_url text not null,
-                        metadata jsonb,
-                        created_at timestamp default current_timestamp
-                    );
-                '''))
+                session.add(screen)
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
 
+    @timed(DB_QUERY_SECONDS, 'asave')
+    async def asave(self, screen: ScreenModel):
+        async with pg_async_session() as session:
+            async with session.begin():
+                session.add(screen)
+
+    @timed(DB_QUERY_SECONDS, 'save_all')
+    def save_all(self, screens: List[ScreenModel]):
+        """Insert many screens (and their imgs) in a single transaction using batched INSERTs"""
+        if not screens:
+            return
 
-    def save(self, screen: ScreenModel):
         with Session(pg_engine) as session:
             session.begin()
             try:
-                session.add(screen)
+                session.add_all(screens)
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
 
-    def find_by_similarity(self, query_embedding: List[float]) -> List[ScreenProjection]:
+    @timed(DB_QUERY_SECONDS, 'save_summary')
+    def save_summary(self, screen_id: int, summary: str, summary_hash: str):
         with Session(pg_engine) as session:
+            session.begin()
             try:
-                distance_col = (ScreenModel.embedding.cosine_distance(query_embedding)).label('distance')
+                session.execute(
+                    update(ScreenModel)
+                    .where(ScreenModel.id == screen_id)
+                    .values(summary=summary, summary_hash=summary_hash)
+                )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    @timed(DB_QUERY_SECONDS, 'asave_summary')
+    async def asave_summary(self, screen_id: int, summary: str, summary_hash: str):
+        async with pg_async_session() as session:
+            async with session.begin():
+                await session.execute(
+                    update(ScreenModel)
+                    .where(ScreenModel.id == screen_id)
+                    .values(summary=summary, summary_hash=summary_hash)
+                )
+
+    def ensure_vector_indexes(self):
+        """Sync the indexes of the screens and sections embeddings, see `ensure_vector_index`"""
+        self.ensure_vector_index()
+        self.ensure_vector_index(self.section_index_config)
 
-                query = select(
+    def ensure_vector_index(self, index_config: Optional[VectorIndexConfig] = None):
+        """
+        Create the configured ANN index on the embedding column of the configured table
+        (screens by default) and drop any previously managed index built with different parameters.
+        The quantized index, when configured, is managed the same way.
+
+        Indexes are built and dropped concurrently, writes to the table go on while a build runs.
+        A build can take minutes on a large catalog, the API runs this in the background at startup
+        and `python -m services.vector_migration index` runs it as a deploy step.
+        """
+        index_config = index_config or self.index_config
+
+        memo_key = astuple(index_config)
+        if memo_key in _ensured_indexes:
+            return
+
+        # Concurrent index DDL cannot run inside a transaction, so the lock is session scoped
+        with pg_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('select pg_advisory_lock(:lock_id)'), {'lock_id': _INDEX_LOCK_ID})
+            try:
+                self.__sync_index(
+                    conn, index_config.table, f'idx_{index_config.table}_embedding%',
+                    index_config.index_name if index_config.index_type != 'none' else None,
+                    lambda: index_config.create_index_sql(concurrently=True)
+                )
+                self.__sync_index(
+                    conn, index_config.table, f'idx_{index_config.table}_q%',
+                    index_config.quantized_index_name if index_config.quantization != 'none' else None,
+                    lambda: index_config.create_quantized_index_sql(concurrently=True)
+                )
+            finally:
+                conn.execute(text('select pg_advisory_unlock(:lock_id)'), {'lock_id': _INDEX_LOCK_ID})
+
+        _ensured_indexes.add(memo_key)
+
+    def __sync_index(self, conn, table: str, prefix: str, wanted: Optional[str], create_sql):
+        """Drop managed indexes of `table` matching `prefix` other than `wanted`, then build `wanted` if missing"""
+        existing = conn.execute(_MANAGED_INDEXES, {'table': table, 'prefix': prefix}).all()
+
+        present = False
+        for index_name, valid, building in existing:
+            if building:
+                # Left to the process building it (e.g. `vector_migration quantize`), a stale one goes on the next sync
+                logger.info(f'Vector index {index_name} is being built by another process')
+                present = present or index_name == wanted
+                continue
+            # An interrupted concurrent build leaves an invalid index that `if not exists` would keep
+            if index_name == wanted and valid:
+                present = True
+                continue
+            logger.info(f'Dropping stale vector index {index_name}')
+            conn.execute(text(f'drop index concurrently if exists {index_name}'))
+
+        if wanted is not None and not present:
+            logger.info(f'Building vector index {wanted}')
+            conn.execute(text(create_sql()))
+
+    def _distance_expr(self, query_embedding: List[float], column=ScreenModel.embedding):
+        """
+        Returns (order_by expression, distance expression). For inner product the ordering uses the
+        index friendly `<#>` operator and distance is reported as cosine distance (1 - <q, v>),
+        which is equivalent for normalized vectors.
+        """
+        if self.index_config.metric == 'inner_product':
+            order_expr = column.max_inner_product(query_embedding)
+            return order_expr, 1 + order_expr
+
+        order_expr = column.cosine_distance(query_embedding)
+        return order_expr, order_expr
+
+    def _quantized_distance_expr(self, query_embedding: List[float], column):
+        """Coarse ordering on the quantized expression index of `column`"""
+        dimensions = self.index_config.dimensions
+
+        if self.index_config.quantization == 'halfvec':
+            halfvec = cast(column, HALFVEC(dimensions))
+            query = cast(literal(query_embedding, HALFVEC(dimensions)), HALFVEC(dimensions))
+
+            if self.index_config.metric == 'inner_product':
+                return halfvec.max_inner_product(query)
+            return halfvec.cosine_distance(query)
+
+        bits = cast(func.binary_quantize(column), BIT(dimensions))
+        # binary_quantize is overloaded for vector and halfvec, the parameter needs an explicit type
+        vector = cast(literal(query_embedding, Vector(dimensions)), Vector(dimensions))
+        query = cast(func.binary_quantize(vector), BIT(dimensions))
+        return bits.hamming_distance(query)
+
+    def _search_source(self, table, query_embedding: List[float], columns: List[str], k: int, where=None):
+        """
+        Rows exact distances are computed over. Without quantization that is the table itself so the
+        full precision index serves the ordering. Otherwise it is the `rerank_candidates` rows nearest
+        on the quantized index, the caller re-ranks them by their full precision embedding.
+        `where` restricts the rows searched in both cases.
+        """
+        if self.index_config.quantization == 'none':
+            if where is None:
+                return table
+            # Pulled up into the outer query by the planner, the index still serves the ordering
+            return select(*[table.c[name] for name in columns]).where(where).subquery(f'{table.name}_filtered')
+
+        coarse = self._quantized_distance_expr(query_embedding, table.c.embedding)
+
+        candidates = select(*[table.c[name] for name in columns])
+        if where is not None:
+            candidates = candidates.where(where)
+
+        return candidates.order_by(coarse).limit(max(k, self.index_config.rerank_candidates)).cte(f'{table.name}_candidates')
+
+    def _search_settings(self):
+        """Per query recall/latency knobs and the search statement timeout, scoped to the current transaction"""
+        settings = {'statement_timeout': str(config.DB_SEARCH_TIMEOUT_MS)}
+
+        if self.index_config.index_type == 'hnsw':
+            # An HNSW scan returns at most ef_search rows, the quantized phase needs all its candidates
+            ef_search = self.index_config.ef_search
+            if self.index_config.quantization != 'none':
+                ef_search = max(ef_search, self.index_config.rerank_candidates)
+            settings['hnsw.ef_search'] = str(ef_search)
+        elif self.index_config.index_type == 'ivfflat':
+            settings['ivfflat.probes'] = str(self.index_config.probes)
+
+        return select(*[func.set_config(name, value, True) for name, value in settings.items()])
+
+    def similarity_query(self, query_embedding: List[float], k: int, max_distance: Optional[float], without_sections: bool = False):
+        """
+        Single statement returning the `k` nearest screens with their image urls aggregated,
+        the distance cutoff is applied in the database. `without_sections` only searches screens
+        that have no sections.
+        """
+        screens = ScreenModel.__table__
+        where = ~exists().where(SectionModel.screen_id == screens.c.id) if without_sections else None
+        source = self._search_source(
+            screens, query_embedding, ['id', 'name', 'details', 'summary', 'summary_hash', 'embedding'], k, where
+        )
+        order_expr, distance_expr = self._distance_expr(query_embedding, source.c.embedding)
+
+        nearest = select(
+            source.c.id,
+            source.c.name,
+            source.c.details,
+            source.c.summary,
+            source.c.summary_hash,
+            distance_expr.label('distance')
+        )
+
+        if max_distance is not None:
+            nearest = nearest.where(distance_expr < max_distance)
+
+        nearest = nearest.order_by(order_expr).limit(k).cte('nearest')
+
+        return select(
+            nearest.c.id,
+            nearest.c.name,
+            nearest.c.details,
+            nearest.c.summary,
+            nearest.c.summary_hash,
+            nearest.c.distance,
+            func.array_remove(func.array_agg(aggregate_order_by(ImageModel.img_url, ImageModel.id)), null()).label('imgs')
+        ).select_from(
+            nearest.outerjoin(ImageModel, ImageModel.screen_id == nearest.c.id)
+        ).group_by(
+            nearest.c.id, nearest.c.name, nearest.c.details, nearest.c.summary, nearest.c.summary_hash, nearest.c.distance
+        ).order_by(nearest.c.distance)
+
+    def section_similarity_query(self, query_embedding: List[float], k: int, max_distance: Optional[float], k_sections: int):
+        """
+        Single statement returning the `k` screens owning the `k_sections` nearest sections, ranked by
+        their best section, with the matching sections (in document order) and image urls aggregated.
+        """
+        source = self._search_source(SectionModel.__table__, query_embedding, ['screen_id', 'ordinal', 'content', 'embedding'], k_sections)
+        order_expr, distance_expr = self._distance_expr(query_embedding, source.c.embedding)
+
+        nearest = select(
+            source.c.screen_id,
+            source.c.ordinal,
+            source.c.content,
+            distance_expr.label('distance')
+        )
+
+        if max_distance is not None:
+            nearest = nearest.where(distance_expr < max_distance)
+
+        nearest = nearest.order_by(order_expr).limit(k_sections).cte('nearest_sections')
+
+        ranked = select(
+            nearest.c.screen_id,
+            func.min(nearest.c.distance).label('distance'),
+            func.array_agg(aggregate_order_by(nearest.c.content, nearest.c.ordinal)).label('sections')
+        ).group_by(nearest.c.screen_id).order_by(func.min(nearest.c.distance)).limit(k).cte('ranked')
+
+        imgs = select(
+            func.array_agg(aggregate_order_by(ImageModel.img_url, ImageModel.id))
+        ).where(ImageModel.screen_id == ScreenModel.id).scalar_subquery()
+
+        return select(
+            ScreenModel.id,
+            ScreenModel.name,
+            ScreenModel.details,
+            ScreenModel.summary,
+            ScreenModel.summary_hash,
+            ranked.c.distance,
+            ranked.c.sections,
+            imgs.label('imgs')
+        ).join(ranked, ranked.c.screen_id == ScreenModel.id).order_by(ranked.c.distance)
+
+    def text_query(self, query: str, title_query: str, k: int):
+        """
+        Screens whose title is trigram similar to `title_query` or whose text matches `query`,
+        with both scores so callers can take an exact title hit or rank by full text relevance.
+        """
+        tsquery = func.websearch_to_tsquery(literal_column("'english'"), query)
+        title = func.lower(ScreenModel.name)
+        title_similarity = func.similarity(title, title_query)
+        text_rank = func.ts_rank_cd(ScreenModel.search_tsv, tsquery)
+
+        imgs = select(
+            func.array_agg(aggregate_order_by(ImageModel.img_url, ImageModel.id))
+        ).where(ImageModel.screen_id == ScreenModel.id).scalar_subquery()
+
+        return select(
+            ScreenModel.id,
+            ScreenModel.name,
+            ScreenModel.details,
+            ScreenModel.summary,
+            ScreenModel.summary_hash,
+            (1 - title_similarity).label('distance'),
+            title_similarity.label('title_similarity'),
+            text_rank.label('text_rank'),
+            imgs.label('imgs')
+        ).where(
+            or_(title.op('%')(title_query), ScreenModel.search_tsv.op('@@')(tsquery))
+        ).order_by(title_similarity.desc(), text_rank.desc()).limit(k)
+
+    @timed(DB_QUERY_SECONDS, 'find_by_text')
+    def find_by_text(self, query: str, title_query: str, k: Optional[int] = None) -> List[ScreenProjection]:
+        k = k or config.SEARCH_HYBRID_CANDIDATES
+
+        with Session(pg_engine) as session:
+            try:
+                session.execute(self._search_settings())
+
+                return [self._to_projection(r) for r in session.execute(self.text_query(query, title_query, k))]
+            except Exception as e:
+                logger.error(f'Exception occurred while text searching: {e}')
+
+            return []
+
+    @timed(DB_QUERY_SECONDS, 'afind_by_text')
+    async def afind_by_text(self, query: str, title_query: str, k: Optional[int] = None) -> List[ScreenProjection]:
+        k = k or config.SEARCH_HYBRID_CANDIDATES
+
+        async with pg_async_session() as session:
+            try:
+                await session.execute(self._search_settings())
+
+                return [self._to_projection(r) for r in await session.execute(self.text_query(query, title_query, k))]
+            except Exception as e:
+                logger.error(f'Exception occurred while text searching: {e}')
+
+            return []
+
+    @timed(DB_QUERY_SECONDS, 'load_vectors')
+    def load_vectors(self, after_id: int = 0) -> Tuple[List, List]:
+        """
+        Screens with id greater than `after_id` (with embedding and image urls) and their sections,
+        both in id order, for building an in-process copy of the vector index.
+        """
+        imgs = select(
+            func.array_agg(aggregate_order_by(ImageModel.img_url, ImageModel.id))
+        ).where(ImageModel.screen_id == ScreenModel.id).scalar_subquery()
+
+        with Session(pg_engine) as session:
+            screens = session.execute(
+                select(
                     ScreenModel.id,
                     ScreenModel.name,
                     ScreenModel.details,
-                    distance_col
-                ).order_by(
-                    ScreenModel.embedding.cosine_distance(query_embedding)
-                ).limit(3)
+                    ScreenModel.summary,
+                    ScreenModel.summary_hash,
+                    ScreenModel.embedding,
+                    imgs.label('imgs')
+                ).where(ScreenModel.id > after_id).order_by(ScreenModel.id)
+            ).all()
+
+            sections = session.execute(
+                select(
+                    SectionModel.screen_id,
+                    SectionModel.ordinal,
+                    SectionModel.content,
+                    SectionModel.embedding
+                ).where(SectionModel.screen_id > after_id).order_by(SectionModel.screen_id, SectionModel.ordinal)
+            ).all()
+
+        return screens, sections
 
-                results = session.execute(query)
+    def _to_projection(self, row) -> ScreenProjection:
+        return ScreenProjection(
+            id=row.id,
+            name=row.name,
+            details=row.details,
+            distance=row.distance,
+            imgs=list(row.imgs or []),
+            summary=row.summary,
+            summary_hash=row.summary_hash,
+            sections=list(getattr(row, 'sections', None) or []),
+            title_similarity=getattr(row, 'title_similarity', 0.0),
+            text_rank=getattr(row, 'text_rank', 0.0)
+        )
 
-                projections = [ScreenProjection(id=r.id, name=r.name, details=r.details, distance=r.distance, imgs=[]) for r in results]
+    @timed(DB_QUERY_SECONDS, 'find_by_similarity')
+    def find_by_similarity(self, query_embedding: List[float], k: Optional[int] = None, max_distance: Optional[float] = None) -> List[ScreenProjection]:
+        query_embedding = self.fit_query(query_embedding)
+        k = k or config.SEARCH_TOP_K
+        max_distance = config.SEARCH_MAX_DISTANCE if max_distance is None else max_distance
 
-                screen_dict = {}
+        with Session(pg_engine) as session:
+            try:
+                session.execute(self._search_settings())
+
+                if not config.SEARCH_SECTIONS:
+                    return [self._to_projection(r) for r in session.execute(self.similarity_query(query_embedding, k, max_distance))]
+
+                section_hits = session.execute(self.section_similarity_query(query_embedding, k, max_distance, config.SEARCH_SECTIONS_K))
+                # Screens ingested before sections existed are only reachable as a whole
+                screen_hits = session.execute(self.similarity_query(query_embedding, k, max_distance, without_sections=True))
 
-                for p in projections:
-                    screen_dict[p.id] = p
+                return merge_nearest([self._to_projection(r) for r in section_hits], [self._to_projection(r) for r in screen_hits], k)
+            except Exception as e:
+                logger.error(f'Exception occurred while querying : {e}')
 
-                image_query = select(ImageModel.screen_id, ImageModel.img_url).where(ImageModel.screen_id.in_(screen_dict.keys())).order_by(ImageModel.screen_id)
+        # A failing search may be the first one after the catalog moved to another size
+        try:
+            self.reload_dimensions()
+        except Exception as e:
+            logger.error(f'Exception occurred while reading embedding dimensions: {e}')
 
-                imgs_results = session.execute(image_query)
+        return []
 
-                imgs_for_screen = defaultdict(list)
+    @timed(DB_QUERY_SECONDS, 'afind_by_similarity')
+    async def afind_by_similarity(self, query_embedding: List[float], k: Optional[int] = None, max_distance: Optional[float] = None) -> List[ScreenProjection]:
+        """`find_by_similarity` on the async engine, waiting on the DB does not hold a thread"""
+        query_embedding = self.fit_query(query_embedding)
+        k = k or config.SEARCH_TOP_K
+        max_distance = config.SEARCH_MAX_DISTANCE if max_distance is None else max_distance
 
-                for img_result in imgs_results:
-                    imgs_for_screen[img_result.screen_id].append(img_result.img_url)
+        async with pg_async_session() as session:
+            try:
+                await session.execute(self._search_settings())
 
-                final_projections = []
+                if not config.SEARCH_SECTIONS:
+                    return [self._to_projection(r) for r in await session.execute(self.similarity_query(query_embedding, k, max_distance))]
 
-                for id, p in screen_dict.items():
-                    p.imgs = imgs_for_screen[id]
-                    final_projections.append(p)
+                section_hits = await session.execute(self.section_similarity_query(query_embedding, k, max_distance, config.SEARCH_SECTIONS_K))
+                screen_hits = await session.execute(self.similarity_query(query_embedding, k, max_distance, without_sections=True))
 
-                return final_projections
+                return merge_nearest([self._to_projection(r) for r in section_hits], [self._to_projection(r) for r in screen_hits], k)
             except Exception as e:
-                logger.error('Exception occurred while querying', e)
-            
-            return []
+                logger.error(f'Exception occurred while querying: {e}')
+
+        try:
+            await self.areload_dimensions()
+        except Exception as e:
+            logger.error(f'Exception occurred while reading embedding dimensions: {e}')
 
-            
+        return []
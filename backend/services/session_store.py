@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.agents.session_store import SessionEntry, SessionStore
+from app.core.logging import get_logger
+from app.core.migrations import ensure_schema
+from app.core.pg import pg_engine
+from services.conversation_service import CONVERSATION_MIGRATIONS
+
+logger = get_logger(__name__)
+
+
+class PostgresSessionStore(SessionStore):
+    """
+    Session store shared by all workers, backed by the `conversations` table. The agent state lives
+    under the `state` key of `conversations.metadata` and `updated_at` is the last write time.
+    Expiring a session only drops its state, the conversation row and its messages are kept.
+    """
+
+    def __init__(self):
+        ensure_schema('conversations', CONVERSATION_MIGRATIONS)
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        with Session(pg_engine) as session:
+            row = session.execute(
+                text("select metadata -> 'state' as state, updated_at from conversations where session_id = :session_id"),
+                {'session_id': session_id}
+            ).first()
+
+        if row is None or row.state is None:
+            return None
+
+        return row.state, row.updated_at
+
+    def put(self, session_id: str, state: Dict[str, Any], timestamp: datetime):
+        with Session(pg_engine) as session:
+            session.begin()
+            try:
+                session.execute(text(
+                    '''
+                    insert into conversations (id, session_id, created_at, updated_at, metadata)
+                    values (gen_random_uuid(), :session_id, :timestamp, :timestamp, jsonb_build_object('state', cast(:state as jsonb)))
+                    on conflict (session_id) do update
+                    set updated_at = excluded.updated_at,
+                        metadata = coalesce(conversations.metadata, '{}'::jsonb) || excluded.metadata
+                    '''
+                ), {'session_id': session_id, 'timestamp': timestamp, 'state': json.dumps(state)})
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def delete(self, session_id: str):
+        with Session(pg_engine) as session:
+            session.begin()
+            try:
+                session.execute(
+                    text("update conversations set metadata = metadata - 'state' where session_id = :session_id"),
+                    {'session_id': session_id}
+                )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def expire(self, ttl: timedelta) -> int:
+        with Session(pg_engine) as session:
+            session.begin()
+            try:
+                result = session.execute(
+                    text("update conversations set metadata = metadata - 'state' where updated_at < :cutoff and metadata ? 'state'"),
+                    {'cutoff': datetime.now() - ttl}
+                )
+                session.commit()
+                return result.rowcount
+            except Exception as e:
+                session.rollback()
+                raise e
+
+    def edited_images(self) -> Set[str]:
+        with Session(pg_engine) as session:
+            rows = session.execute(text(
+                "select distinct metadata -> 'state' ->> 'edited_img' as digest from conversations where metadata -> 'state' ->> 'edited_img' is not null"
+            ))
+            return {row.digest for row in rows}
+
+    async def aget(self, session_id: str) -> Optional[SessionEntry]:
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aput(self, session_id: str, state: Dict[str, Any], timestamp: datetime):
+        await asyncio.to_thread(self.put, session_id, state, timestamp)
+
+    async def adelete(self, session_id: str):
+        await asyncio.to_thread(self.delete, session_id)
+
+    async def aexpire(self, ttl: timedelta) -> int:
+        return await asyncio.to_thread(self.expire, ttl)
+
+    async def aedited_images(self) -> Set[str]:
+        return await asyncio.to_thread(self.edited_images)
@@ -0,0 +1,61 @@
+import threading
+
+from services.conversation_writer import ConversationWriter
+
+
+class FakeConversationService:
+    def __init__(self, fail_times: int = 0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.release = threading.Event()
+        self.release.set()
+
+    def add_messages(self, records):
+        self.release.wait()
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError('database unavailable')
+        self.batches.append([(r.session_id, r.role, r.content) for r in records])
+
+
+def test_messages_queued_while_writing_are_flushed_as_one_batch():
+    service = FakeConversationService()
+    service.release.clear()
+    writer = ConversationWriter(service, max_queue=100, batch_size=50)
+
+    writer.record('s1', 'user', 'first')
+    for i in range(10):
+        writer.record('s1', 'user', f'msg {i}')
+    service.release.set()
+    writer.close(timeout=5)
+
+    assert sum(len(b) for b in service.batches) == 11
+    assert len(service.batches) <= 2
+    assert service.batches[-1][-1] == ('s1', 'user', 'msg 9')
+    assert writer.stats.written == 11
+
+
+def test_full_queue_drops_instead_of_blocking():
+    service = FakeConversationService()
+    service.release.clear()
+    writer = ConversationWriter(service, max_queue=2, batch_size=1)
+
+    accepted = [writer.record('s1', 'user', f'msg {i}') for i in range(10)]
+    service.release.set()
+    writer.close(timeout=5)
+
+    assert not all(accepted)
+    assert writer.stats.dropped == accepted.count(False)
+    assert writer.stats.written == accepted.count(True)
+
+
+def test_failed_batches_are_retried():
+    service = FakeConversationService(fail_times=1)
+    writer = ConversationWriter(service, retry_delay=0.01)
+
+    writer.record('s1', 'assistant', 'spec')
+    writer.close(timeout=5)
+
+    assert service.batches == [[('s1', 'assistant', 'spec')]]
+    assert writer.stats.retries == 1
+    assert writer.stats.failed == 0
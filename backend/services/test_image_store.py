@@ -0,0 +1,57 @@
+import os
+import time
+
+from io import BytesIO
+
+from PIL import Image
+
+from services.image_store import ImageStore
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (200, 10, 10, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_put_bytes_is_content_addressed(tmp_path):
+    store = ImageStore(str(tmp_path))
+    data = _png(800, 600)
+
+    first = store.put_bytes(data)
+    second = store.put_bytes(data)
+
+    assert first == second
+    assert first.url == f'/images/{first.digest}'
+    assert (first.mime_type, first.width, first.height) == ('image/png', 800, 600)
+    assert store.path_for(first.digest).read_bytes() == data
+    assert ImageStore(str(tmp_path)).get(first.digest) == first
+
+
+def test_variant_generates_cached_webp_thumbnail(tmp_path):
+    store = ImageStore(str(tmp_path))
+    stored = store.put_bytes(_png(800, 600))
+
+    path, mime_type, etag = store.variant(stored.digest, 'webp', 200)
+
+    with Image.open(path) as img:
+        assert img.format == 'WEBP'
+        assert img.size == (256, 192)
+    assert mime_type == 'image/webp'
+    assert etag == f'"{stored.digest}.256.webp"'
+    assert store.variant(stored.digest, 'webp', 256)[0] == path
+
+
+def test_collect_removes_expired_unreferenced_blobs(tmp_path):
+    store = ImageStore(str(tmp_path))
+    expired, referenced, recent = (store.put_bytes(_png(w, 10)) for w in (10, 20, 30))
+
+    for stored in (expired, referenced):
+        os.utime(store.path_for(stored.digest), (time.time() - 3600, time.time() - 3600))
+
+    assert store.collect(max_age=60, keep={referenced.digest}) == 1
+
+    assert store.get(expired.digest) is None
+    assert not list(tmp_path.glob(f'*/{expired.digest}*'))
+    assert store.get(referenced.digest) == referenced
+    assert store.get(recent.digest) == recent
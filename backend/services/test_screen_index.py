@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+
+from app.core.config import config
+from services.screen_index import ScreenVectorIndex
+
+
+def screen(id, embedding, name=None):
+    return SimpleNamespace(id=id, name=name or f'S{id}', details='', summary=None, summary_hash=None, embedding=embedding, imgs=[f'{id}.png'])
+
+
+def section(screen_id, ordinal, content, embedding):
+    return SimpleNamespace(screen_id=screen_id, ordinal=ordinal, content=content, embedding=embedding)
+
+
+class FakeScreenService:
+    def __init__(self):
+        self.screens = []
+        self.sections = []
+        self.loads = []
+        self.dimensions = 3
+
+    def reload_dimensions(self):
+        return self.dimensions
+
+    def load_vectors(self, after_id=0):
+        self.loads.append(after_id)
+        return [s for s in self.screens if s.id > after_id], [s for s in self.sections if s.screen_id > after_id]
+
+
+def test_sections_rank_their_screens_and_come_back_in_document_order(monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS', True)
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS_K', 3)
+
+    service = FakeScreenService()
+    service.screens = [screen(1, [1, 0, 0]), screen(2, [0, 1, 0])]
+    service.sections = [
+        section(1, 0, 'intro', [0.8, 0.6, 0]),
+        section(1, 1, 'totals', [1, 0, 0]),
+        section(2, 0, 'filters', [0.6, 0.8, 0]),
+        section(2, 1, 'unrelated', [0, 0, 1]),
+    ]
+    index = ScreenVectorIndex(service)
+    index.load()
+
+    results = index.find_by_similarity([1, 0, 0], k=2, max_distance=0.5)
+
+    assert [r.id for r in results] == [1, 2]
+    assert results[0].sections == ['intro', 'totals']
+    assert results[0].distance == 0.0 and results[0].imgs == ['1.png']
+    assert results[1].sections == ['filters']
+
+
+def test_screen_level_search_when_sections_are_off(monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS', False)
+
+    service = FakeScreenService()
+    service.screens = [screen(i, [1, i / 10, 0]) for i in range(1, 6)]
+    index = ScreenVectorIndex(service)
+    index.load()
+
+    results = index.find_by_similarity([1, 0, 0], k=2, max_distance=1.0)
+
+    assert [r.id for r in results] == [1, 2]
+    assert results[0].sections == []
+
+
+def test_refresh_only_loads_newer_screens():
+    service = FakeScreenService()
+    service.screens = [screen(1, [1, 0, 0])]
+    index = ScreenVectorIndex(service)
+    index.load()
+
+    service.screens.append(screen(2, [0, 1, 0]))
+    assert index.refresh() == 1
+    assert index.refresh() == 0
+    assert service.loads == [0, 1, 2]
+    assert len(index) == 2
+
+
+def test_snapshot_is_memory_mapped_and_topped_up_from_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS', True)
+
+    service = FakeScreenService()
+    service.screens = [screen(1, [1, 0, 0]), screen(2, [0, 1, 0])]
+    service.sections = [section(1, 0, 'only', [1, 0, 0])]
+    ScreenVectorIndex(service, snapshot_path=str(tmp_path)).load()
+
+    service.screens.append(screen(3, [0, 0, 1]))
+    restored = ScreenVectorIndex(service, snapshot_path=str(tmp_path))
+    restored.load()
+
+    assert service.loads[-1] == 2
+    assert len(restored) == 3
+    assert [r.sections for r in restored.find_by_similarity([1, 0, 0], k=1)] == [['only']]
+    assert [r.id for r in restored.find_by_similarity([0, 0, 1], k=1)] == [3]
+
+
+def test_catalog_moved_to_another_size_is_reloaded():
+    service = FakeScreenService()
+    service.screens = [screen(1, [1, 0, 0])]
+    index = ScreenVectorIndex(service)
+    index.load()
+
+    service.dimensions = 2
+    service.screens = [screen(1, [1, 0]), screen(2, [0, 1])]
+    index.refresh()
+
+    assert len(index) == 2 and index.dimensions == 2
+    # Queries embedded at the previous size are truncated and re-normalized
+    assert [r.id for r in index.find_by_similarity([0, 1, 0], k=1, max_distance=0.5)] == [2]
+
+
+def test_screens_without_sections_are_found_next_to_sectioned_ones(monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS', True)
+    monkeypatch.setattr(config, 'SEARCH_SECTIONS_K', 3)
+
+    service = FakeScreenService()
+    # Screen 1 was ingested before sections existed, screen 2 after
+    service.screens = [screen(1, [1, 0, 0]), screen(2, [0.6, 0.8, 0])]
+    service.sections = [section(2, 0, 'filters', [0.8, 0.6, 0])]
+    index = ScreenVectorIndex(service)
+    index.load()
+
+    results = index.find_by_similarity([1, 0, 0], k=2, max_distance=0.5)
+
+    assert [r.id for r in results] == [1, 2]
+    assert results[0].sections == [] and results[1].sections == ['filters']
+
+
+def test_titles_are_matched_like_title_queries(tmp_path):
+    service = FakeScreenService()
+    service.screens = [screen(1, [1, 0, 0], name='Product List'), screen(2, [0, 1, 0], name='Orders Page')]
+    index = ScreenVectorIndex(service, snapshot_path=str(tmp_path))
+    index.load()
+
+    assert [r.id for r in index.find_by_title('product list')] == [1]
+    assert index.find_by_title('product list')[0].title_similarity == 1.0
+    assert index.find_by_title('product') == []
+
+    restarted = ScreenVectorIndex(service, snapshot_path=str(tmp_path))
+    restarted.load()
+
+    assert [r.id for r in restarted.find_by_title('orders')] == [2]
@@ -0,0 +1,57 @@
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from services.screen_service import ScreenProjection, ScreenService, VectorIndexConfig, merge_nearest
+
+
+def compiled(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def service_with(**index_config) -> ScreenService:
+    # Skips __init__, which migrates the database
+    service = ScreenService.__new__(ScreenService)
+    service.index_config = VectorIndexConfig(**index_config)
+    return service
+
+
+def test_quantized_index_names_and_validation():
+    assert VectorIndexConfig(quantization='halfvec', metric='inner_product').quantized_index_name == 'idx_screens_qhalfvec_d1536_hnsw_inner_product_m16_ef64'
+    assert 'bit_hamming_ops' in VectorIndexConfig(quantization='binary').create_quantized_index_sql()
+
+    with pytest.raises(ValueError):
+        VectorIndexConfig(quantization='int8')
+    with pytest.raises(ValueError):
+        VectorIndexConfig(quantization='binary', index_type='none')
+
+
+def test_quantized_search_reranks_candidates_on_full_vectors():
+    sql = compiled(service_with(quantization='binary', rerank_candidates=40).similarity_query([0.0] * 1536, 3, 0.5))
+
+    assert 'WITH screens_candidates AS' in sql
+    assert 'binary_quantize(screens.embedding) AS BIT(1536)) <~>' in sql
+    assert 'screens_candidates.embedding <#>' in sql
+
+    assert 'candidates' not in compiled(service_with(quantization='none').similarity_query([0.0] * 1536, 3, 0.5))
+
+
+def test_queries_embedded_at_a_larger_size_are_shortened():
+    service = service_with()
+    service.dimensions = 2
+
+    assert service.fit_query([3.0, 4.0, 12.0]) == [0.6, 0.8]
+    assert service.fit_query([0.6, 0.8]) == [0.6, 0.8]
+
+
+def test_sectioned_and_legacy_screens_are_merged_by_distance():
+    sql = compiled(service_with().similarity_query([0.0] * 1536, 3, 0.5, without_sections=True))
+    assert 'NOT (EXISTS (SELECT *' in sql and 'screen_sections.screen_id = screens.id' in sql
+
+    quantized = compiled(service_with(quantization='binary').similarity_query([0.0] * 1536, 3, 0.5, without_sections=True))
+    assert 'WITH screens_candidates AS' in quantized and 'NOT (EXISTS' in quantized
+
+    sectioned = [ScreenProjection(id=2, name='Orders', details='', distance=0.2, imgs=[], sections=['filters'])]
+    legacy = [ScreenProjection(id=1, name='Dashboard', details='', distance=0.1, imgs=[]), ScreenProjection(id=3, name='Users', details='', distance=0.4, imgs=[])]
+
+    assert [r.id for r in merge_nearest(sectioned, legacy, 2)] == [1, 2]
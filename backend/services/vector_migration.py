@@ -0,0 +1,265 @@
+"""
+Online migrations of the vector indexes, run while the API keeps serving.
+
+    python -m services.vector_migration reembed --dimensions 512
+
+moves the catalog to embeddings of another size. A shadow `embedding_next`
+column is filled in batches (screens ingested meanwhile are picked up by later
+batches), indexed concurrently and swapped in under a short table lock once
+every row has a value. Searches keep using the old embeddings until the swap,
+running API processes notice the new size on their next search. Ingestion
+processes must be restarted with the new EMBEDDING_DIMENSIONS. With
+`--truncate` a smaller size is derived from the stored vectors (text-embedding-3
+embeddings shortened and re-normalized) instead of calling OpenAI.
+
+    python -m services.vector_migration quantize --level halfvec
+
+builds the quantized expression index of the `screens` and `screen_sections`
+embeddings with CREATE INDEX CONCURRENTLY, so ingestion is not blocked, and
+drops quantized indexes of other levels. Afterwards set VECTOR_QUANTIZATION to
+the same level, API processes then find the index in place instead of building
+it concurrently in the background after startup.
+
+    python -m services.vector_migration index
+
+builds the vector indexes of the configured VECTOR_INDEX_* settings and drops
+managed indexes built with other settings, before the API is rolled out. API
+processes otherwise build them in the background after startup.
+"""
+import argparse
+import time
+
+from dataclasses import replace
+from typing import List, Optional
+
+from openai import OpenAI
+from sqlalchemy import text
+
+from app.agents.tools.knowledgebase import EMBEDDING_MODEL, section_text
+from app.agents.tools.models import embedding_clients
+from app.core.logging import get_logger
+from app.core.pg import pg_engine
+from app.core.vectors import l2_normalize
+from services.screen_service import QUANTIZATION_LEVELS, ScreenService, VectorIndexConfig
+
+logger = get_logger(__name__)
+
+TABLES = ('screens', 'screen_sections')
+
+NEXT_COLUMN = 'embedding_next'
+
+# Texts to embed per batch, a screen's embedding is its details, a section of a multi-section
+# screen is embedded under its heading path (single sections share the screen embedding)
+_PENDING_TEXTS = {
+    'screens': 'select id, details as text from screens where embedding_next is null order by id limit :n',
+    'screen_sections': '''
+        select s.id, sc.name, s.path, s.content, sc.details,
+            (select count(*) from screen_sections o where o.screen_id = s.screen_id) as siblings
+        from screen_sections s join screens sc on sc.id = s.screen_id
+        where s.embedding_next is null order by s.id limit :n
+    ''',
+}
+
+
+def _index_size(conn, index_name: str) -> int:
+    return conn.execute(text('select pg_relation_size(cast(:name as regclass))'), {'name': index_name}).scalar()
+
+
+def quantize(level: str, base: VectorIndexConfig):
+    with pg_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in TABLES:
+            index_config = replace(base, table=table, quantization=level)
+
+            quantized = conn.execute(
+                text('''
+                    select c.relname, i.indisvalid from pg_index i
+                    join pg_class c on c.oid = i.indexrelid
+                    join pg_class t on t.oid = i.indrelid
+                    where t.relname = :table and c.relname like :prefix
+                '''),
+                {'table': table, 'prefix': f'idx_{table}_q%'}
+            ).all()
+
+            for index_name, valid in quantized:
+                # An interrupted concurrent build leaves an invalid index that `if not exists` would keep
+                if level == 'none' or index_name != index_config.quantized_index_name or not valid:
+                    logger.info(f'Dropping quantized vector index {index_name}')
+                    conn.execute(text(f'drop index concurrently if exists {index_name}'))
+
+            if level == 'none':
+                continue
+
+            started = time.perf_counter()
+            conn.execute(text(index_config.create_quantized_index_sql(concurrently=True)))
+            logger.info(
+                f'{index_config.quantized_index_name}: built in {time.perf_counter() - started:.1f}s, '
+                f'{_index_size(conn, index_config.quantized_index_name) / 2 ** 20:.1f} MiB'
+            )
+
+
+def _column_dimensions(conn, table: str, column: str) -> Optional[int]:
+    return conn.execute(
+        text('select atttypmod from pg_attribute where attrelid = cast(:table as regclass) and attname = :column and not attisdropped'),
+        {'table': table, 'column': column}
+    ).scalar()
+
+
+def _next_index_name(table: str) -> str:
+    # Outside the idx_<table>_embedding prefix so ScreenService startup doesn't drop it as stale
+    return f'idx_{table}_next_embedding'
+
+
+def _embed(client: OpenAI, texts: List[str], dimensions: int) -> List[List[float]]:
+    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts, dimensions=dimensions)
+    return [l2_normalize(d.embedding) for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def _backfill(conn, table: str, dimensions: int, batch_size: int, client: Optional[OpenAI]) -> int:
+    """Fill `embedding_next` of every row without one, each batch commits on its own"""
+    filled = 0
+
+    while True:
+        if client is None:
+            count = conn.execute(
+                text(f'''
+                    update {table} set {NEXT_COLUMN} = l2_normalize(subvector(embedding, 1, :dims))
+                    where id in (select id from {table} where {NEXT_COLUMN} is null limit :n)
+                '''),
+                {'dims': dimensions, 'n': batch_size}
+            ).rowcount
+        else:
+            rows = conn.execute(text(_PENDING_TEXTS[table]), {'n': batch_size}).all()
+            if table == 'screens':
+                texts = [r.text or '' for r in rows]
+            else:
+                texts = [(r.details or '') if r.siblings == 1 else section_text(r.name, r.path, r.content) for r in rows]
+
+            if rows:
+                embeddings = _embed(client, texts, dimensions)
+                conn.execute(
+                    text(f'update {table} set {NEXT_COLUMN} = cast(:embedding as vector) where id = :id'),
+                    [{'id': r.id, 'embedding': str(e)} for r, e in zip(rows, embeddings)]
+                )
+            count = len(rows)
+
+        if not count:
+            return filled
+
+        filled += count
+        logger.info(f'{table}: re-embedded {filled} rows')
+
+
+def _swap(table_conn, index_config: VectorIndexConfig) -> bool:
+    """Replace `embedding` by `embedding_next` on both tables, False when rows were added since the last backfill"""
+    tx = table_conn.begin()
+    try:
+        # Holds back ingestion while the last rows are checked, the column swap itself briefly blocks searches too
+        table_conn.execute(text(f'lock table {", ".join(TABLES)} in share row exclusive mode'))
+
+        for table in TABLES:
+            if table_conn.execute(text(f'select exists (select 1 from {table} where {NEXT_COLUMN} is null)')).scalar():
+                tx.rollback()
+                return False
+
+        for table in TABLES:
+            managed = table_conn.execute(
+                text("select indexname from pg_indexes where tablename = :table and (indexname like :full or indexname like :quantized)"),
+                {'table': table, 'full': f'idx_{table}_embedding%', 'quantized': f'idx_{table}_q%'}
+            ).scalars().all()
+
+            for index_name in managed:
+                table_conn.execute(text(f'drop index {index_name}'))
+
+            table_conn.execute(text(f'alter table {table} drop column embedding'))
+            table_conn.execute(text(f'alter table {table} rename column {NEXT_COLUMN} to embedding'))
+            table_conn.execute(text(f'alter table {table} alter column embedding set not null'))
+
+            if index_config.index_type != 'none':
+                table_conn.execute(text(f'alter index if exists {_next_index_name(table)} rename to {replace(index_config, table=table).index_name}'))
+
+        tx.commit()
+    except Exception:
+        tx.rollback()
+        raise
+
+    return True
+
+
+def reembed(dimensions: int, base: VectorIndexConfig, batch_size: int = 256, truncate: bool = False, max_swap_attempts: int = 10):
+    index_config = replace(base, dimensions=dimensions)
+
+    with pg_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        current = _column_dimensions(conn, 'screens', 'embedding')
+        if current == dimensions:
+            logger.info(f'Catalog already has {dimensions} dimensional embeddings')
+            return
+        if truncate and dimensions > current:
+            raise ValueError(f'Cannot truncate {current} dimensional embeddings to {dimensions} dimensions')
+
+        client = None if truncate else embedding_clients()[0]
+
+        for table in TABLES:
+            # Left over by an earlier run towards another size
+            if _column_dimensions(conn, table, NEXT_COLUMN) not in (None, dimensions):
+                conn.execute(text(f'drop index concurrently if exists {_next_index_name(table)}'))
+                conn.execute(text(f'alter table {table} drop column {NEXT_COLUMN}'))
+
+            conn.execute(text(f'alter table {table} add column if not exists {NEXT_COLUMN} vector({int(dimensions)})'))
+
+        started = time.perf_counter()
+        for table in TABLES:
+            _backfill(conn, table, dimensions, batch_size, client)
+        logger.info(f'Backfilled {dimensions} dimensional embeddings in {time.perf_counter() - started:.1f}s')
+
+        if index_config.index_type != 'none':
+            for table in TABLES:
+                # An interrupted concurrent build leaves an invalid index that `if not exists` would keep
+                conn.execute(text(f'drop index concurrently if exists {_next_index_name(table)}'))
+
+                started = time.perf_counter()
+                conn.execute(text(
+                    replace(index_config, table=table).create_index_sql(NEXT_COLUMN, _next_index_name(table), concurrently=True)
+                ))
+                logger.info(f'{_next_index_name(table)}: built in {time.perf_counter() - started:.1f}s')
+
+    with pg_engine.connect() as table_conn:
+        for _ in range(max_swap_attempts):
+            with pg_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                for table in TABLES:
+                    _backfill(conn, table, dimensions, batch_size, client)
+
+            if _swap(table_conn, index_config):
+                logger.info(f'Catalog moved to {dimensions} dimensional embeddings, set EMBEDDING_DIMENSIONS={dimensions}')
+                break
+        else:
+            raise RuntimeError(f'Screens kept arriving, gave up swapping after {max_swap_attempts} attempts')
+
+    if index_config.quantization != 'none':
+        quantize(index_config.quantization, index_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    quantize_parser = commands.add_parser('quantize', help='build the quantized index of a level, drop the others')
+    quantize_parser.add_argument('--level', choices=QUANTIZATION_LEVELS, required=True)
+
+    commands.add_parser('index', help='build the configured vector indexes, drop managed indexes of other settings')
+
+    reembed_parser = commands.add_parser('reembed', help='move the catalog to embeddings of another size')
+    reembed_parser.add_argument('--dimensions', type=int, required=True)
+    reembed_parser.add_argument('--batch-size', type=int, default=256)
+    reembed_parser.add_argument('--truncate', action='store_true', help='shorten the stored vectors instead of calling OpenAI')
+    args = parser.parse_args()
+
+    if args.command == 'quantize':
+        quantize(args.level, VectorIndexConfig())
+    elif args.command == 'index':
+        ScreenService().ensure_vector_indexes()
+    elif args.command == 'reembed':
+        reembed(args.dimensions, VectorIndexConfig(), batch_size=args.batch_size, truncate=args.truncate)
+
+
+if __name__ == '__main__':
+    main()